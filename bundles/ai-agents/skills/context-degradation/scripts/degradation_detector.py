@@ -14,42 +14,26 @@ PRODUCTION NOTES:
 """
 
 import numpy as np
-from typing import List, Dict
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from typing import List, Dict, Optional, Tuple, Union
 import re
 
 
-def measure_attention_distribution(context_tokens: List[str], query: str) -> List[Dict]:
+def attention_profile(n: int, rng: Optional[np.random.Generator] = None,
+                      length: Optional[int] = None) -> Dict[str, np.ndarray]:
     """
-    Measure how attention varies across context positions.
-    
-    Returns distribution showing attention weight by position.
-    """
-    n = len(context_tokens)
-    attention_by_position = []
-    
-    for position in range(n):
-        is_beginning = position < n * 0.1
-        is_end = position > n * 0.9
-        
-        # Simulated attention measurement
-        # In production, this would use actual model attention weights
-        attention = _estimate_attention(position, n, is_beginning, is_end)
-        
-        attention_by_position.append({
-            "position": position,
-            "attention": attention,
-            "region": "attention_favored" if (is_beginning or is_end) else "attention_degraded",
-            "tokens": context_tokens[position][:50] if position < 5 or position > n - 5 else None
-        })
+    Estimate attention weight for every position of an ``n``-token context.
     
-    return attention_by_position
-
-
-def _estimate_attention(position: int, total: int, is_beginning: bool, is_end: bool) -> float:
-    """
-    Estimate attention weight for position.
+    ``length`` limits the arrays to the first positions, for callers that
+    only look up a few early positions of a long context. Returns arrays
+    rather than per-position records, so a 200k-token context costs a
+    handful of vectorized operations:
+    - "attention": float weight per position
+    - "favored": True where the position is in the attention-favored region
+      (first and last 10% of the context)
     
-    Simulates U-shaped attention curve based on research findings.
+    Pass a seeded ``np.random.Generator`` for reproducible weights.
     
     IMPORTANT: This is a simulation for demonstration purposes.
     Production systems should:
@@ -62,45 +46,81 @@ def _estimate_attention(position: int, total: int, is_beginning: bool, is_end: b
     - End tokens receive high attention (recency effect)
     - Middle tokens receive degraded attention (lost-in-middle)
     """
-    if is_beginning:
-        return 0.8 + np.random.random() * 0.2
-    elif is_end:
-        return 0.7 + np.random.random() * 0.3
-    else:
-        # Middle positions get reduced attention
-        middle_progress = (position - total * 0.1) / (total * 0.8)
-        base_attention = 0.3 * (1 - middle_progress) + 0.1 * middle_progress
-        return base_attention + np.random.random() * 0.1
+    rng = rng if rng is not None else np.random.default_rng()
+    positions = np.arange(n if length is None else min(length, n), dtype=np.float64)
+    is_beginning = positions < n * 0.1
+    is_end = positions > n * 0.9
+    noise = rng.random(len(positions))
+    
+    # Middle positions get reduced attention, falling from 0.3 to 0.1
+    middle_progress = (positions - n * 0.1) / max(n * 0.8, 1e-9)
+    attention = 0.3 * (1 - middle_progress) + 0.1 * middle_progress + noise * 0.1
+    attention[is_beginning] = 0.8 + noise[is_beginning] * 0.2
+    attention[is_end] = 0.7 + noise[is_end] * 0.3
+    
+    return {"attention": attention, "favored": is_beginning | is_end}
+
+
+def measure_attention_distribution(context_tokens: List[str], query: str,
+                                   rng: Optional[np.random.Generator] = None) -> List[Dict]:
+    """
+    Measure how attention varies across context positions.
+    
+    Returns distribution showing attention weight by position. Use
+    ``attention_profile`` directly when per-position records are not needed.
+    """
+    n = len(context_tokens)
+    # Simulated attention measurement
+    # In production, this would use actual model attention weights
+    profile = attention_profile(n, rng)
+    
+    return [
+        {
+            "position": position,
+            "attention": attention,
+            "region": "attention_favored" if favored else "attention_degraded",
+            "tokens": context_tokens[position][:50] if position < 5 or position > n - 5 else None
+        }
+        for position, (attention, favored) in enumerate(
+            zip(profile["attention"].tolist(), profile["favored"].tolist())
+        )
+    ]
 
 
 # Lost-in-Middle Detection
 
 def detect_lost_in_middle(critical_positions: List[int], 
-                          attention_distribution: List[Dict]) -> Dict:
+                          attention_distribution: Union[List[Dict], Dict[str, np.ndarray]]) -> Dict:
     """
     Check if critical information is in attention-degraded positions.
     
-    Returns detection results and recommendations.
+    Accepts either the records from ``measure_attention_distribution`` or
+    the arrays from ``attention_profile``. Returns detection results and
+    recommendations; "attention" holds the weight at each in-range critical
+    position as a list of floats, so the result stays JSON-serializable.
     """
+    if isinstance(attention_distribution, dict):
+        favored = attention_distribution["favored"]
+        weights = attention_distribution["attention"]
+    else:
+        favored = np.array([p["region"] == "attention_favored" for p in attention_distribution],
+                           dtype=bool)
+        weights = np.array([p["attention"] for p in attention_distribution], dtype=np.float64)
+    
+    positions = np.asarray(critical_positions, dtype=np.int64).reshape(-1)
+    positions = positions[positions < len(favored)]
+    degraded = ~favored[positions]
+    
+    at_risk_count = int(degraded.sum())
+    total_critical = len(critical_positions)
     results = {
-        "at_risk": [],
-        "safe": [],
+        "at_risk": positions[degraded].tolist(),
+        "safe": positions[~degraded].tolist(),
+        "attention": weights[positions].tolist(),
         "recommendations": [],
         "degradation_score": 0.0
     }
     
-    at_risk_count = 0
-    total_critical = len(critical_positions)
-    
-    for pos in critical_positions:
-        if pos < len(attention_distribution):
-            region = attention_distribution[pos]["region"]
-            if region == "attention_degraded":
-                results["at_risk"].append(pos)
-                at_risk_count += 1
-            else:
-                results["safe"].append(pos)
-    
     # Calculate degradation score
     if total_critical > 0:
         results["degradation_score"] = at_risk_count / total_critical
@@ -160,24 +180,188 @@ def analyze_context_structure(context: str) -> Dict:
     }
 
 
+# Marker Scanning
+
+# Code points fit in 21 bits, so up to three of them pack into one uint64
+_CODE_POINTS = 0x110000
+_EXAMPLE_LIMIT = 200  # sentences this long or longer are not quoted
+_MAX_GRAM = 3
+
+
+class MarkerScanner:
+    """
+    Find every occurrence of a set of literal phrases in one pass.
+    
+    Phrases are matched case-insensitively. The lowercased text is turned
+    into an array of character q-grams in one vectorized pass, q-grams that
+    open some phrase mark the only candidate offsets, and phrases are
+    verified just there - so the cost stays close to a single scan however
+    many phrases there are. Sentence boundaries ('.') come out of the same
+    array.
+    """
+    
+    def __init__(self, phrases: Dict[str, List[str]]):
+        # phrase -> the kinds (e.g. "error", "hedge") it was registered under
+        self.kinds: Dict[str, Tuple[str, ...]] = {}
+        for kind, group in phrases.items():
+            for phrase in group:
+                phrase = phrase.lower()
+                if phrase and kind not in self.kinds.get(phrase, ()):
+                    self.kinds[phrase] = self.kinds.get(phrase, ()) + (kind,)
+        
+        self.gram = min([_MAX_GRAM] + [len(phrase) for phrase in self.kinds])
+        self.longest = max([len(phrase) for phrase in self.kinds], default=0)
+        self._openers: Dict[int, List[str]] = {}
+        for phrase in self.kinds:
+            self._openers.setdefault(self._key(phrase[:self.gram]), []).append(phrase)
+        self._keys = np.array(sorted(self._openers), dtype=np.uint64)
+    
+    @staticmethod
+    def _key(gram: str) -> int:
+        key = 0
+        for char in gram:
+            key = key * _CODE_POINTS + ord(char)
+        return key
+    
+    def scan(self, text: str) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """
+        Scan ``text`` once.
+        
+        Returns the offsets of every sentence boundary and, for each phrase
+        that occurs, the offsets of all its occurrences (overlapping ones
+        included).
+        """
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            # Keep offsets aligned with the original text
+            lowered = "".join(c if len(c.lower()) != 1 else c.lower() for c in text)
+        
+        # Lone surrogates pass through as one code unit each
+        codes = np.frombuffer(lowered.encode("utf-32-le", errors="surrogatepass"),
+                              dtype=np.uint32)
+        boundaries = np.flatnonzero(codes == ord("."))
+        
+        occurrences: Dict[str, np.ndarray] = {}
+        span = len(codes) - self.gram + 1
+        if not self._openers or span <= 0:
+            return boundaries, occurrences
+        
+        grams = codes[:span].astype(np.uint64)
+        for k in range(1, self.gram):
+            grams *= np.uint64(_CODE_POINTS)
+            grams += codes[k:span + k]
+        slots = np.searchsorted(self._keys, grams)
+        np.minimum(slots, len(self._keys) - 1, out=slots)
+        candidates = np.flatnonzero(self._keys[slots] == grams)
+        opened = grams[candidates]
+        
+        # Verify the rest of each phrase at its candidate offsets only
+        for key, phrases in self._openers.items():
+            starts = candidates[opened == key]
+            for phrase in phrases:
+                matched = starts[starts + len(phrase) <= len(codes)]
+                for k in range(self.gram, len(phrase)):
+                    matched = matched[codes[matched + k] == ord(phrase[k])]
+                if len(matched):
+                    occurrences[phrase] = matched
+        
+        return boundaries, occurrences
+
+
+def _sentence(text: str, boundaries: np.ndarray, index: int) -> str:
+    """Sentence ``index`` of ``text.split('.')`` given the boundary offsets."""
+    start = boundaries[index - 1] + 1 if index > 0 else 0
+    end = boundaries[index] if index < len(boundaries) else len(text)
+    return text[start:end]
+
+
+def _example(sentence: str) -> Optional[str]:
+    """How a sentence is quoted as a contradiction example, if it is."""
+    sentence = sentence.strip()
+    return sentence[:100] if sentence and len(sentence) < _EXAMPLE_LIMIT else None
+
+
 # Context Poisoning Detection
 
 class PoisoningDetector:
+    """
+    Flags error, conflict and hedge markers in a context.
+    
+    ``error_patterns``, ``conflict_patterns`` and ``hallucination_markers``
+    may be replaced or extended, but every entry is a literal phrase (see
+    ``MarkerScanner``), not a regular expression.
+    """
+    
     def __init__(self):
         self.claims = []
+        # Marker phrases are plain text, matched literally and
+        # case-insensitively; regex syntax in them is not interpreted
         self.error_patterns = [
-            r"error",
-            r"failed",
-            r"exception",
-            r"cannot",
-            r"unable",
-            r"invalid",
-            r"not found"
+            "error",
+            "failed",
+            "exception",
+            "cannot",
+            "unable",
+            "invalid",
+            "not found"
+        ]
+        # Look for conflict markers
+        self.conflict_patterns = [
+            ("however", "but"),
+            ("on the other hand", "instead"),
+            ("although", "yet"),
+            ("despite", "nevertheless")
         ]
+        self.hallucination_markers = [
+            "may have been",
+            "might have",
+            "could potentially",
+            "possibly",
+            "apparently",
+            "reportedly",
+            "it is said that",
+            "sources suggest",
+            "believed to be",
+            "thought to be"
+        ]
+        self._scanner = None
+        self._scanner_key = None
+    
+    @property
+    def scanner(self) -> MarkerScanner:
+        """Scanner over the current marker lists, rebuilt if they change."""
+        key = (tuple(self.error_patterns), tuple(self.conflict_patterns),
+               tuple(self.hallucination_markers))
+        if key != self._scanner_key:
+            self._scanner = MarkerScanner({
+                "error": self.error_patterns,
+                "conflict": [p for pair in self.conflict_patterns for p in pair],
+                "hedge": self.hallucination_markers
+            })
+            self._scanner_key = key
+        return self._scanner
+    
+    def scan(self, text: str) -> Tuple[np.ndarray, Dict[str, Dict[str, List[int]]]]:
+        """
+        Find all error, conflict and hedge markers in one pass.
+        
+        Returns sentence boundary offsets and, per kind, the indices (into
+        ``text.split('.')``) of the sentences each marker phrase occurs in.
+        """
+        scanner = self.scanner
+        boundaries, occurrences = scanner.scan(text)
+        found: Dict[str, Dict[str, List[int]]] = {"error": {}, "conflict": {}, "hedge": {}}
+        for phrase, starts in occurrences.items():
+            sentences = np.searchsorted(boundaries, starts).tolist()
+            for kind in scanner.kinds[phrase]:
+                found[kind][phrase] = sentences
+        return boundaries, found
     
     def extract_claims(self, text: str) -> List[Dict]:
         """Extract claims from text for verification tracking."""
         # Simple claim extraction - in production use NER and fact extraction
+        _, found = self.scan(text)
+        flagged = {i for sentences in found["error"].values() for i in sentences}
         sentences = text.split('.')
         claims = []
         
@@ -190,10 +374,7 @@ class PoisoningDetector:
                 "id": i,
                 "text": sentence,
                 "verified": None,
-                "has_error_indicator": any(
-                    re.search(pattern, sentence, re.IGNORECASE) 
-                    for pattern in self.error_patterns
-                )
+                "has_error_indicator": i in flagged
             })
         
         self.claims.extend(claims)
@@ -203,14 +384,19 @@ class PoisoningDetector:
         """
         Detect potential context poisoning indicators.
         """
+        scan = self.scan(context)
+        return self._assess(
+            error_count=len(scan[1]["error"]),
+            contradictions=self._detect_contradictions(context, scan),
+            hallucination_markers=self._detect_hallucination_markers(context, scan)
+        )
+    
+    def _assess(self, error_count: int, contradictions: List[str],
+                hallucination_markers: List[str]) -> Dict:
+        """Turn marker findings into poisoning indicators."""
         indicators = []
         
         # Check for error accumulation
-        error_count = sum(
-            1 for pattern in self.error_patterns 
-            if re.search(pattern, context, re.IGNORECASE)
-        )
-        
         if error_count > 3:
             indicators.append({
                 "type": "error_accumulation",
@@ -220,7 +406,6 @@ class PoisoningDetector:
             })
         
         # Check for contradiction patterns
-        contradictions = self._detect_contradictions(context)
         if contradictions:
             indicators.append({
                 "type": "contradictions",
@@ -231,7 +416,6 @@ class PoisoningDetector:
             })
         
         # Check for hallucination markers
-        hallucination_markers = self._detect_hallucination_markers(context)
         if hallucination_markers:
             indicators.append({
                 "type": "hallucination_markers",
@@ -246,84 +430,75 @@ class PoisoningDetector:
             "overall_risk": "high" if len(indicators) > 2 else "medium" if len(indicators) > 0 else "low"
         }
     
-    def _detect_contradictions(self, text: str) -> List[str]:
+    def _detect_contradictions(self, text: str, scan: Tuple = None) -> List[str]:
         """Detect potential contradictions in text."""
+        boundaries, found = scan or self.scan(text)
+        conflicts = found["conflict"]
         contradictions = []
         
-        # Look for conflict markers
-        conflict_patterns = [
-            (r"however", r"but"),
-            (r"on the other hand", r"instead"),
-            (r"although", r"yet"),
-            (r"despite", r"nevertheless")
-        ]
-        
-        for pattern1, pattern2 in conflict_patterns:
-            if re.search(pattern1, text, re.IGNORECASE) and re.search(pattern2, text, re.IGNORECASE):
-                # Find sentences containing these patterns
-                sentences = text.split('.')
-                for sentence in sentences:
-                    if re.search(pattern1, sentence, re.IGNORECASE) or \
-                       re.search(pattern2, sentence, re.IGNORECASE):
-                        if sentence.strip() and len(sentence.strip()) < 200:
-                            contradictions.append(sentence.strip()[:100])
+        for pattern1, pattern2 in self.conflict_patterns:
+            first, second = conflicts.get(pattern1.lower()), conflicts.get(pattern2.lower())
+            if first and second:
+                # Sentences containing either marker, in text order
+                for index in sorted(set(first) | set(second)):
+                    example = _example(_sentence(text, boundaries, index))
+                    if example:
+                        contradictions.append(example)
+                        if len(contradictions) == 5:
+                            return contradictions
         
-        return contradictions[:5]
+        return contradictions
     
-    def _detect_hallucination_markers(self, text: str) -> List[str]:
+    def _detect_hallucination_markers(self, text: str, scan: Tuple = None) -> List[str]:
         """Detect phrases associated with uncertain or hallucinated claims."""
-        markers = [
-            "may have been",
-            "might have",
-            "could potentially",
-            "possibly",
-            "apparently",
-            "reportedly",
-            "it is said that",
-            "sources suggest",
-            "believed to be",
-            "thought to be"
-        ]
-        
-        found = []
-        for marker in markers:
-            if marker in text.lower():
-                found.append(marker)
-        
-        return found
+        _, found = scan or self.scan(text)
+        return [marker for marker in self.hallucination_markers
+                if marker.lower() in found["hedge"]]
 
 
 # Context Health Score
 
 class ContextHealthAnalyzer:
-    def __init__(self, context_limit: int = 100000):
+    def __init__(self, context_limit: int = 100000, seed: Optional[int] = None,
+                 history_size: int = 100):
         self.context_limit = context_limit
-        self.metrics_history = []
+        self.rng = np.random.default_rng(seed)
+        # Compact metric records of the most recent analyses
+        self.metrics_history = deque(maxlen=history_size)
     
     def analyze(self, context: str, critical_positions: List[int] = None) -> Dict:
         """
         Perform comprehensive context health analysis.
-        """
-        tokens = context.split()
         
+        Re-analyzes the whole context; use ``session`` for a context that
+        grows turn by turn.
+        """
         # Basic metrics
-        token_count = len(tokens)
-        utilization = token_count / self.context_limit
+        token_count = len(context.split())
         
-        # Attention analysis
-        attention_dist = measure_attention_distribution(
-            tokens[:1000],  # Sample for efficiency
-            "current_task"
-        )
+        # Attention analysis over the full context
+        attention = attention_profile(token_count, self.rng)
         
         degradation = detect_lost_in_middle(
             critical_positions or list(range(10)),
-            attention_dist
+            attention
         )
         
         # Poisoning check
         poisoning = PoisoningDetector().detect_poisoning(context)
         
+        return self._report(token_count, degradation, poisoning,
+                            analyze_context_structure(context))
+    
+    def session(self, critical_positions: List[int] = None) -> "ContextHealthSession":
+        """Start an incremental analysis of a context that only grows."""
+        return ContextHealthSession(self, critical_positions)
+    
+    def _report(self, token_count: int, degradation: Dict, poisoning: Dict,
+                structure: Dict) -> Dict:
+        """Score the findings, record them in the history and build the result."""
+        utilization = token_count / self.context_limit
+        
         # Calculate health score
         health_score = self._calculate_health_score(
             utilization=utilization,
@@ -338,7 +513,9 @@ class ContextHealthAnalyzer:
                 "token_count": token_count,
                 "utilization": utilization,
                 "degradation_score": degradation["degradation_score"],
-                "poisoning_risk": poisoning["overall_risk"]
+                "poisoning_risk": poisoning["overall_risk"],
+                "middle_content_ratio": structure["middle_content_ratio"],
+                "structure_risk": structure["degradation_risk"]
             },
             "issues": {
                 "lost_in_middle": degradation,
@@ -349,7 +526,11 @@ class ContextHealthAnalyzer:
             )
         }
         
-        self.metrics_history.append(result)
+        self.metrics_history.append({
+            "health_score": health_score,
+            "status": result["status"],
+            **result["metrics"]
+        })
         return result
     
     def _calculate_health_score(self, utilization: float, 
@@ -399,6 +580,231 @@ class ContextHealthAnalyzer:
         return recommendations
 
 
+class ContextHealthSession:
+    """
+    Incremental health analysis of a context that grows by appended chunks.
+    
+    Keeps running counters - token count, markers found so far, section
+    structure - so each ``append`` costs time proportional to the new
+    text. Only the last (longest marker - 1) characters are carried into
+    the next scan, for markers split across chunks; the open sentence is
+    kept as the conflict markers it contains and a capped head for quoting
+    it. Results match ``ContextHealthAnalyzer.analyze`` on the full
+    context.
+    """
+    
+    def __init__(self, analyzer: ContextHealthAnalyzer = None,
+                 critical_positions: List[int] = None):
+        self.analyzer = analyzer or ContextHealthAnalyzer()
+        self.critical_positions = critical_positions or list(range(10))
+        self.detector = PoisoningDetector()
+        
+        # Tokens as counted by str.split()
+        self.token_count = 0
+        self._in_word = False
+        
+        # Markers found so far, and the text carried into the next scan
+        self._present: Dict[str, set] = {"error": set(), "conflict": set(), "hedge": set()}
+        self._tail = ""
+        # Earliest sentences quoted as contradiction examples, per conflict marker
+        self._conflict_examples: Dict[str, List[Tuple[int, str]]] = {}
+        # Quotes of the finished sentences that overlap the carried text
+        self._recent: List[Tuple[int, Optional[str]]] = []
+        
+        # The open sentence: its index, conflict markers, and its first
+        # _EXAMPLE_LIMIT characters after leading whitespace
+        self._sentence_index = 0
+        self._open_conflicts: set = set()
+        self._open_head = ""
+        self._open_long = False
+        
+        # Section structure as in analyze_context_structure
+        self._lines = 1
+        self._line_empty = True
+        self._open_header: Optional[str] = None
+        self._sections: List[Dict] = []
+        self._section_starts: List[int] = []
+        self._length_prefix = [0]
+        self._current = {"start": 0, "type": "unknown", "length": 1}
+    
+    def append(self, chunk: str) -> Dict:
+        """Add text to the context and return the updated analysis."""
+        self._count_tokens(chunk)
+        self._scan_markers(chunk)
+        self._track_structure(chunk)
+        return self.analyze()
+    
+    def analyze(self) -> Dict:
+        """Analysis of the context appended so far."""
+        positions = self.critical_positions
+        # Only the positions up to the last critical one are looked up
+        length = self.token_count if min(positions, default=0) < 0 else max(positions, default=-1) + 1
+        attention = attention_profile(self.token_count, self.analyzer.rng, length=length)
+        degradation = detect_lost_in_middle(positions, attention)
+        return self.analyzer._report(self.token_count, degradation, self._poisoning(),
+                                     self.structure(include_sections=False))
+    
+    def structure(self, include_sections: bool = True) -> Dict:
+        """Equivalent of ``analyze_context_structure`` on the context so far."""
+        n = self._lines
+        middle_start = int(n * 0.3)
+        middle_end = int(n * 0.7)
+        
+        lo = bisect_left(self._section_starts, middle_start)
+        hi = bisect_right(self._section_starts, middle_end)
+        middle_content = self._length_prefix[hi] - self._length_prefix[lo]
+        if middle_start <= self._current["start"] <= middle_end:
+            middle_content += self._current["length"]
+        
+        result = {
+            "total_lines": n,
+            "middle_content_ratio": middle_content / n,
+            "degradation_risk": "high" if middle_content / n > 0.5 else "medium" if middle_content / n > 0.3 else "low"
+        }
+        if include_sections:
+            result["sections"] = [dict(s) for s in self._sections] + [dict(self._current)]
+        else:
+            result["section_count"] = len(self._sections) + 1
+        return result
+    
+    def _count_tokens(self, chunk: str):
+        if not chunk:
+            return
+        self.token_count += len(chunk.split())
+        if self._in_word and not chunk[0].isspace():
+            self.token_count -= 1  # the word continues across chunks
+        self._in_word = not chunk[-1].isspace()
+    
+    def _scan_markers(self, chunk: str):
+        scanner = self.detector.scanner
+        carried = len(self._tail)
+        text = self._tail + chunk
+        boundaries, occurrences = scanner.scan(text)
+        carried_dots = int(np.searchsorted(boundaries, carried))
+        first = self._sentence_index - carried_dots  # sentence index at text[0]
+        
+        # Markers reaching into the new text; those within the carried
+        # text were counted by the previous scan
+        conflicts: Dict[int, set] = {}  # sentence index -> conflict markers
+        for phrase, starts in occurrences.items():
+            starts = starts[starts + len(phrase) > carried]
+            if not len(starts):
+                continue
+            for kind in scanner.kinds[phrase]:
+                self._present[kind].add(phrase)
+            if "conflict" in scanner.kinds[phrase]:
+                for index in np.unique(np.searchsorted(boundaries, starts)).tolist():
+                    conflicts.setdefault(first + index, set()).add(phrase)
+        
+        # A marker with a '.' in it may start in an already finished sentence
+        for index, example in self._recent:
+            for phrase in conflicts.pop(index, ()):
+                self._add_example(phrase, index, example)
+        self._open_conflicts |= conflicts.pop(self._sentence_index, set())
+        
+        # Sentences finished by this chunk, the open one first
+        finished = []
+        previous = carried
+        for boundary in boundaries[carried_dots:].tolist():
+            if not finished:
+                self._extend_open(text[previous:boundary])
+                example, phrases = self._open_example(), self._open_conflicts
+            else:
+                example = _example(text[previous:boundary])
+                phrases = conflicts.get(self._sentence_index + len(finished), ())
+            for phrase in phrases:
+                self._add_example(phrase, self._sentence_index + len(finished), example)
+            finished.append((self._sentence_index + len(finished), example))
+            previous = boundary + 1
+        
+        if finished:
+            self._sentence_index += len(finished)
+            self._open_conflicts = conflicts.get(self._sentence_index, set())
+            self._open_head, self._open_long = "", False
+        self._extend_open(text[previous:])
+        
+        keep = scanner.longest - 1
+        self._tail = text[-keep:] if keep > 0 else ""
+        tail_dots = len(boundaries) - int(np.searchsorted(boundaries, len(text) - len(self._tail)))
+        self._recent = (self._recent + finished)[len(self._recent) + len(finished) - tail_dots:]
+    
+    def _extend_open(self, piece: str):
+        """Append text to the open sentence's capped head."""
+        if not self._open_head:
+            piece = piece.lstrip()
+        room = _EXAMPLE_LIMIT - len(self._open_head)
+        self._open_head += piece[:room]
+        if not self._open_long and len(self._open_head) == _EXAMPLE_LIMIT:
+            # Too long to quote once anything but whitespace reaches the limit
+            self._open_long = (not self._open_head[-1].isspace()) or bool(piece[room:].strip())
+    
+    def _open_example(self) -> Optional[str]:
+        return None if self._open_long else _example(self._open_head)
+    
+    def _add_example(self, phrase: str, index: int, example: Optional[str]):
+        """Keep the five earliest quotable sentences per conflict marker."""
+        examples = self._conflict_examples.setdefault(phrase, [])
+        if example is None or any(i == index for i, _ in examples):
+            return
+        if len(examples) < 5 or index < examples[-1][0]:
+            insort(examples, (index, example))
+            del examples[5:]
+    
+    def _poisoning(self) -> Dict:
+        present = self._present
+        open_example = self._open_example()
+        open_example = [(self._sentence_index, open_example)] if open_example else []
+        
+        contradictions = []
+        for pattern1, pattern2 in self.detector.conflict_patterns:
+            pattern1, pattern2 = pattern1.lower(), pattern2.lower()
+            if pattern1 in present["conflict"] and pattern2 in present["conflict"]:
+                examples = dict(self._conflict_examples.get(pattern1, []))
+                examples.update(self._conflict_examples.get(pattern2, []))
+                if pattern1 in self._open_conflicts or pattern2 in self._open_conflicts:
+                    examples.update(open_example)
+                for index in sorted(examples):
+                    contradictions.append(examples[index])
+                    if len(contradictions) == 5:
+                        break
+            if len(contradictions) == 5:
+                break
+        
+        return self.detector._assess(
+            error_count=len(present["error"]),
+            contradictions=contradictions,
+            hallucination_markers=[m for m in self.detector.hallucination_markers
+                                   if m.lower() in present["hedge"]]
+        )
+    
+    def _track_structure(self, chunk: str):
+        lines = chunk.split("\n")
+        self._extend_line(lines[0])
+        for line in lines[1:]:
+            self._open_header = None
+            self._lines += 1
+            self._line_empty = True
+            self._current["length"] += 1  # counted as body until a '#' arrives
+            self._extend_line(line)
+    
+    def _extend_line(self, text: str):
+        if not text:
+            return
+        if self._line_empty:
+            self._line_empty = False
+            if text[0] == "#":
+                self._current["length"] -= 1
+                if self._current["length"] > 0:
+                    self._sections.append(self._current)
+                    self._section_starts.append(self._current["start"])
+                    self._length_prefix.append(self._length_prefix[-1] + self._current["length"])
+                self._current = {"start": self._lines - 1, "type": "header", "length": 1}
+                self._open_header = ""
+        if self._open_header is not None:
+            self._open_header += text
+            self._current["header"] = self._open_header.lstrip("#").strip()
+
+
 # Usage Example
 
 def analyze_agent_context(context: str) -> Dict:
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Compaction Benchmarks
+
+Times ``summarize_batch`` over a synthetic overnight workload (many
+sessions of tool output, conversation and retrieved documents) with a
+growing number of worker processes, and checks that every run returns
+exactly the summaries of the sequential path. Before timing, it checks
+that an observation masked by ``compact_jsonl`` can be read back from the
+spill directory by a fresh ``ObservationStore``.
+
+Usage:
+    python benchmark_compaction.py
+    python benchmark_compaction.py --sessions 2000 --workers 1 2 4 8 --chunk-size 128
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from typing import List, Tuple
+
+from compaction import ObservationStore, compact_jsonl, iter_jsonl, summarize_batch
+
+CATEGORIES = ("tool_output", "conversation", "retrieved_document", "other")
+
+
+def build_workload(sessions: int, messages: int, seed: int = 0) -> List[Tuple[str, str]]:
+    """``(content, category)`` pairs for every message of every session."""
+    rng = random.Random(seed)
+    items = []
+    for session in range(sessions):
+        for i in range(messages):
+            category = CATEGORIES[i % len(CATEGORIES)]
+            lines = [
+                f"step_{j}: {rng.random() * 1000:.2f} total: {rng.randrange(10_000)} "
+                f"result {'found' if rng.random() < 0.3 else 'pending'} for session {session}. "
+                f"We decided: retry {j}? question: why step {j} failed."
+                for j in range(rng.randint(20, 80))
+            ]
+            items.append(("\n".join(lines), category))
+    return items
+
+
+def check_spill_roundtrip():
+    """A ref written by ``compact_jsonl`` resolves through a new store."""
+    output = "\n".join(f"row {i}: value {i * 7}" for i in range(400))
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "session.jsonl")
+        destination = os.path.join(tmp, "compacted.jsonl")
+        with open(source, "w") as f:
+            f.write(json.dumps({"role": "assistant", "type": "tool_use", "content": output}) + "\n")
+        compact_jsonl(source, destination, keep_recent=0)
+        
+        refs = [msg["observation_ref"] for msg in iter_jsonl(destination)
+                if msg.get("observation_ref")]
+        assert len(refs) == 1, refs
+        store = ObservationStore(spill_dir=f"{destination}.observations")
+        assert store.retrieve(refs[0]) == output, "spilled observation not recoverable"
+    print("compact_jsonl spill round-trip: ok\n")
+
+
+def run(sessions: int, messages: int, workers: List[int], chunk_size: int):
+    check_spill_roundtrip()
+    items = build_workload(sessions, messages)
+    megabytes = sum(len(content) for content, _ in items) / 1e6
+    print(f"{len(items):,} messages, {megabytes:.1f} MB\n")
+    print(f"{'workers':>8}  {'seconds':>8}  {'msgs/s':>10}  {'speedup':>8}  {'identical':>9}")
+
+    baseline, reference = None, None
+    for count in workers:
+        begin = time.perf_counter()
+        summaries = summarize_batch(items, workers=count, chunk_size=chunk_size)
+        elapsed = time.perf_counter() - begin
+        if reference is None:
+            baseline, reference = elapsed, summaries
+        print(f"{count:>8}  {elapsed:8.2f}  {len(items) / elapsed:>10,.0f}  "
+              f"{baseline / elapsed:>7.2f}x  {str(summaries == reference):>9}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parallel summarization")
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=40,
+                        help="Messages per session")
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument("--chunk-size", type=int, default=64)
+    args = parser.parse_args()
+    run(args.sessions, args.messages, args.workers, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Concurrency check for MCPConnectionPool against the local echo server.
+
+Times a burst of blocking tool calls over one session and over a pool,
+then kills every pooled server process and checks that a call made while
+the pool is restarting them waits for a fresh session instead of failing.
+
+Usage:
+    python check_pool.py
+    python check_pool.py --size 8 --calls 16 --delay 0.2
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import sys
+import time
+from pathlib import Path
+
+from connections import create_connection, create_connection_pool
+
+SERVER = str(Path(__file__).with_name("echo_server.py"))
+
+
+async def burst(connection, calls: int, delay: float) -> float:
+    """Seconds to run ``calls`` blocking echoes at once; checks every reply."""
+    begin = time.perf_counter()
+    results = await asyncio.gather(
+        *(connection.call_tool("block", {"text": str(i), "delay": delay}) for i in range(calls))
+    )
+    assert [result[0].text for result in results] == [str(i) for i in range(calls)]
+    return time.perf_counter() - begin
+
+
+async def check_throughput(size: int, calls: int, delay: float):
+    async with create_connection("stdio", command=sys.executable, args=[SERVER]) as connection:
+        single = await burst(connection, calls, delay)
+    async with create_connection_pool("stdio", size=size, command=sys.executable, args=[SERVER]) as pool:
+        pooled = await burst(pool, calls, delay)
+        busiest = max(pool.stats()["calls"])
+    print(f"{calls} calls of {delay}s: one session {single:.2f}s, "
+          f"pool of {size} {pooled:.2f}s ({single / pooled:.1f}x)")
+    assert pooled < single, "pooled calls did not overlap"
+    assert busiest < calls, "calls were not spread over the pool"
+
+
+async def check_restart_wait(size: int):
+    async with create_connection_pool(
+        "stdio", size=size, command=sys.executable, args=[SERVER], health_check_interval=0
+    ) as pool:
+        pids = {(await pool.call_tool("pid", {}))[0].text for _ in range(size * 2)}
+        for pid in pids:
+            os.kill(int(pid), signal.SIGKILL)
+
+        restarting = asyncio.create_task(pool.health_check())
+        while pool.stats()["healthy"]:
+            await asyncio.sleep(0.01)
+        result = await pool.call_tool("echo", {"text": "after restart"})
+        await restarting
+        assert result[0].text == "after restart"
+        print(f"call during restart of {len(pids)} sessions: ok, {pool.stats()['restarts']} restarts")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Check MCPConnectionPool against echo_server.py")
+    parser.add_argument("--size", type=int, default=4, help="Pool size (default: 4)")
+    parser.add_argument("--calls", type=int, default=8, help="Calls per burst (default: 8)")
+    parser.add_argument("--delay", type=float, default=0.3, help="Seconds each call blocks the server (default: 0.3)")
+    args = parser.parse_args()
+
+    await check_throughput(args.size, args.calls, args.delay)
+    await check_restart_wait(args.size)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -4,71 +4,375 @@ Memory System Implementation
 This module provides utilities for implementing memory systems.
 """
 
+import asyncio
 import numpy as np
-from typing import List, Dict, Any, Optional
+import threading
+from abc import ABC, abstractmethod
+from array import array
+from collections import OrderedDict, deque
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache
+from itertools import count
+from typing import List, Dict, Any, Hashable, Iterator, Optional, Tuple
 import json
 import hashlib
-from datetime import datetime
+import operator
+import os
+import re
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
 
 
-class VectorStore:
-    """Simple vector store with metadata indexing."""
+class Embedder(ABC):
+    """Interface for embedding models used by VectorStore.
+    
+    Implementations embed a whole batch per call so bulk ingestion makes one
+    model request per batch instead of one per document.
+    """
+    
+    dimension: int
+    
+    @abstractmethod
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        """Return a ``(len(texts), dimension)`` float32 array."""
+    
+    def embed(self, text: str) -> np.ndarray:
+        return self.embed_batch([text])[0]
+
+
+@lru_cache(maxsize=65536)
+def _hash_token(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+
+
+class HashingEmbedder(Embedder):
+    """Deterministic offline embedder based on signed feature hashing.
+    
+    Word unigrams and bigrams are hashed into ``dimension`` buckets with a
+    hash-derived sign, so texts sharing words get similar vectors. Results
+    are stable across processes and need no model or global RNG state.
+    """
+    
+    TOKEN_PATTERN = re.compile(r"\w+")
     
     def __init__(self, dimension: int = 768):
         self.dimension = dimension
-        self.vectors: List[np.ndarray] = []
+    
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        rows, hashes = [], []
+        for row, text in enumerate(texts):
+            tokens = self.TOKEN_PATTERN.findall(text.lower())
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            rows.extend([row] * len(features))
+            hashes.extend(_hash_token(feature) for feature in features)
+        
+        embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        if hashes:
+            hashes = np.asarray(hashes, dtype=np.uint64)
+            columns = (hashes % np.uint64(self.dimension)).astype(np.int64)
+            signs = np.where(hashes >> np.uint64(63), -1.0, 1.0).astype(np.float32)
+            np.add.at(embeddings, (np.asarray(rows), columns), signs)
+        return embeddings
+
+
+class EmbeddingCache:
+    """Bounded LRU cache of embeddings keyed by a hash of the text.
+    
+    Safe to share between threads: searches update it while holding only
+    a read lock on the store.
+    """
+    
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._mutex = threading.Lock()
+    
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha1(text.encode()).hexdigest()
+    
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._mutex:
+            embedding = self._entries.get(key)
+            if embedding is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+    
+    def put(self, key: str, embedding: np.ndarray):
+        with self._mutex:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+class IVFIndex:
+    """Inverted-file ANN index with a spherical k-means coarse quantizer.
+    
+    Rows are assigned to their nearest centroid by cosine similarity. A
+    search probes the ``nprobe`` closest inverted lists and returns their
+    rows as candidates for exact re-ranking, so raising ``nprobe`` trades
+    latency for recall. The index trains itself once ``train_size`` rows
+    exist and assigns later rows incrementally.
+    """
+    
+    def __init__(self, nlist: int = 256, nprobe: int = 8,
+                 train_size: Optional[int] = None, kmeans_iters: int = 20,
+                 seed: int = 0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_size = train_size or nlist * 39
+        self.kmeans_iters = kmeans_iters
+        self.centroids: Optional[np.ndarray] = None
+        self.lists: List[List[int]] = []
+        self.assignments = array("i")  # row id -> list id, in row order
+        
+        self._rng = np.random.default_rng(seed)
+        self._arrays: Dict[int, np.ndarray] = {}  # list id -> cached row ids
+    
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+    
+    def sample_rows(self, total: int) -> np.ndarray:
+        """Sorted row ids to train on, at most 256 per list."""
+        size = min(total, self.nlist * 256)
+        return np.sort(self._rng.choice(total, size, replace=False))
+    
+    def train(self, vectors: np.ndarray):
+        """Fit centroids on a sample of unit-normalized vectors."""
+        sample = np.asarray(vectors, dtype=np.float32)
+        nlist = min(self.nlist, len(sample))
+        
+        centroids = sample[self._rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(self.kmeans_iters):
+            assignment = self._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            counts = np.bincount(assignment, minlength=nlist)
+            
+            # Reseed empty clusters from random sample points
+            empty = np.flatnonzero(counts == 0)
+            sums[empty] = sample[self._rng.choice(len(sample), len(empty))]
+            centroids = sums / (np.linalg.norm(sums, axis=1, keepdims=True) + 1e-8)
+        
+        self.centroids = centroids.astype(np.float32)
+        self.lists = [[] for _ in range(nlist)]
+        self.assignments = array("i")
+        self._arrays = {}
+    
+    def restore(self, centroids: np.ndarray, assignments: np.ndarray,
+                lists: Optional[List[List[int]]] = None):
+        """Rebuild a trained index from saved centroids and row assignments.
+        
+        ``lists`` skips regrouping the rows when it was done already (see
+        ``build_lists``).
+        """
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.assignments = array("i", np.asarray(assignments, dtype=np.int32).tobytes())
+        self.lists = lists if lists is not None else self.build_lists(assignments, len(self.centroids))
+        self._arrays = {}
+    
+    @staticmethod
+    def build_lists(assignments: np.ndarray, nlist: int) -> List[List[int]]:
+        """Row ids grouped by assigned list, ascending within each list."""
+        assignments = np.asarray(assignments)
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(nlist + 1))
+        return [order[bounds[i]:bounds[i + 1]].tolist() for i in range(nlist)]
+    
+    def add(self, first_row: int, vectors: np.ndarray):
+        """Assign unit-normalized vectors for rows ``first_row...`` to lists."""
+        assignment = self._assign(vectors, self.centroids)
+        for offset, list_id in enumerate(assignment.tolist()):
+            self.lists[list_id].append(first_row + offset)
+        self.assignments.frombytes(assignment.astype(np.int32).tobytes())
+        for list_id in np.unique(assignment).tolist():
+            self._arrays.pop(list_id, None)
+    
+    def params(self) -> Dict[str, int]:
+        """Constructor arguments, for persisting the index configuration."""
+        return {"nlist": self.nlist, "nprobe": self.nprobe,
+                "train_size": self.train_size, "kmeans_iters": self.kmeans_iters}
+    
+    def candidates(self, query: np.ndarray,
+                   nprobe: Optional[int] = None) -> np.ndarray:
+        """Sorted row ids from the inverted lists closest to the query."""
+        nprobe = min(nprobe or self.nprobe, len(self.lists))
+        closeness = self.centroids @ query
+        probe = np.argpartition(-closeness, nprobe - 1)[:nprobe]
+        rows = np.concatenate([self._list_array(list_id) for list_id in probe.tolist()])
+        rows.sort()
+        return rows
+    
+    def _list_array(self, list_id: int) -> np.ndarray:
+        if list_id not in self._arrays:
+            self._arrays[list_id] = np.asarray(self.lists[list_id], dtype=np.int64)
+        return self._arrays[list_id]
+    
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray,
+                batch: int = 65536) -> np.ndarray:
+        """Index of the most similar centroid for each vector."""
+        assignment = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), batch):
+            block = vectors[start:start + batch]
+            assignment[start:start + batch] = np.argmax(block @ centroids.T, axis=1)
+        return assignment
+
+
+class VectorStore:
+    """Simple vector store with metadata indexing.
+
+    Embeddings live in one preallocated float32 matrix that grows by
+    doubling, with row norms cached at insert time, so a search is a single
+    matrix-vector product followed by an ``argpartition`` top-k selection.
+    
+    Texts are embedded through a pluggable batch ``Embedder`` (a local
+    ``HashingEmbedder`` by default) behind an LRU ``EmbeddingCache``, so
+    repeated texts and queries are embedded once.
+    
+    Filtered searches are planned against the entity, time-bucket and
+    metadata field indexes first, so only candidate rows are scored.
+    Unfiltered searches can go through an optional ANN ``index`` (such as
+    ``IVFIndex``) that narrows the rows before exact re-ranking.
+    
+    ``save(path)`` writes the store to a directory and keeps it attached:
+    vectors and norms become memory-mapped raw float32 files that grow in
+    place, and ``flush()`` only appends rows added since the last flush.
+    ``VectorStore.load(path)`` maps the files instead of re-embedding.
+    
+    ``delete`` tombstones rows by giving them an infinite norm, so they score
+    zero, drop out of results and stay deleted through the norms file;
+    ``compact`` later copies the live rows down and renumbers the indexes.
+    """
+    
+    # Files an attached directory gets rewritten by ``compact``
+    _COMPACTION_FILES = ("vectors.f32", "norms.f32", "metadata.jsonl", "ivf_assignments.i32")
+    
+    def __init__(self, dimension: int = 768, initial_capacity: int = 1024,
+                 indexed_fields: Optional[List[str]] = None,
+                 index: Optional[IVFIndex] = None,
+                 embedder: Optional[Embedder] = None,
+                 cache_size: int = 10000):
+        if embedder is not None and embedder.dimension != dimension:
+            raise ValueError(
+                f"Embedder dimension {embedder.dimension} does not match "
+                f"store dimension {dimension}"
+            )
+        self.dimension = dimension
+        self.index = index
+        self.embedder = embedder or HashingEmbedder(dimension)
+        self.embedding_cache = EmbeddingCache(cache_size) if cache_size else None
         self.metadata: List[Dict] = []
         self.entity_index: Dict[str, List[int]] = {}
         self.time_index: Dict[str, List[int]] = {}
+        # field -> value -> row ids, for metadata keys used as filters
+        self.field_index: Dict[str, Dict[Any, List[int]]] = {
+            field: {} for field in (indexed_fields or ["session_id"])
+        }
+        
+        self._matrix = np.zeros((max(initial_capacity, 1), dimension),
+                                dtype=np.float32)
+        self._norms = np.zeros(max(initial_capacity, 1), dtype=np.float32)
+        self._size = 0
+        self._deleted = 0  # tombstoned rows not yet compacted away
+        self._deletions = 0  # rows ever tombstoned, to spot deletes during a compaction
+        self._generation = 0  # compactions so far
+        
+        self._path: Optional[str] = None  # directory when persisted
+        self._persisted = 0  # rows whose metadata is on disk
+    
+    @property
+    def vectors(self) -> np.ndarray:
+        """View of the stored embeddings, one row per document."""
+        return self._matrix[:self._size]
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    @property
+    def deleted_count(self) -> int:
+        """Tombstoned rows still holding space until the next ``compact``."""
+        return self._deleted
     
     def add(self, text: str, metadata: Dict[str, Any] = None) -> int:
         """Add document to store."""
-        embedding = self._embed(text)
-        index = len(self.vectors)
+        return self.add_many([text], [metadata])[0]
+    
+    def add_many(self, texts: List[str],
+                 metadatas: Optional[List[Optional[Dict[str, Any]]]] = None) -> List[int]:
+        """Add documents with a single embedding call for the whole batch."""
+        if metadatas is None:
+            metadatas = [None] * len(texts)
+        if len(metadatas) != len(texts):
+            raise ValueError("texts and metadatas must have the same length")
+        if not texts:
+            return []
         
-        self.vectors.append(embedding)
-        self.metadata.append(metadata or {})
+        start = self._append_rows(self._embed_batch(texts))
         
-        # Index by entity
-        if "entity" in metadata:
-            entity = metadata["entity"]
-            if entity not in self.entity_index:
-                self.entity_index[entity] = []
-            self.entity_index[entity].append(index)
-        
-        # Index by time
-        if "valid_from" in metadata:
-            time_key = self._time_key(metadata["valid_from"])
-            if time_key not in self.time_index:
-                self.time_index[time_key] = []
-            self.time_index[time_key].append(index)
+        for offset, metadata in enumerate(metadatas):
+            metadata = metadata or {}
+            self.metadata.append(metadata)
+            self._index_metadata(start + offset, metadata)
         
-        return index
+        return list(range(start, start + len(texts)))
     
     def search(self, query: str, limit: int = 5, 
-               filters: Dict[str, Any] = None) -> List[Dict]:
-        """Search for similar documents."""
+               filters: Dict[str, Any] = None,
+               nprobe: Optional[int] = None) -> List[Dict]:
+        """Search for similar documents.
+        
+        ``nprobe`` overrides the ANN index's probe count for this query.
+        """
+        if self._size == 0 or limit <= 0:
+            return []
+        
         query_embedding = self._embed(query)
         
-        scores = []
-        for i, vec in enumerate(self.vectors):
-            score = np.dot(query_embedding, vec) / (
-                np.linalg.norm(query_embedding) * np.linalg.norm(vec) + 1e-8
-            )
-            
-            # Apply filters
-            if filters and not self._matches_filters(self.metadata[i], filters):
-                score = -1
-            
-            scores.append((i, score))
+        if filters:
+            rows = self._candidate_rows(filters)
+        elif self.index is not None and self.index.is_trained:
+            query_unit = np.asarray(query_embedding, dtype=np.float32)
+            query_unit = query_unit / (np.linalg.norm(query_unit) + 1e-8)
+            rows = self.index.candidates(query_unit, nprobe)
+        else:
+            rows = None
         
-        scores.sort(key=lambda x: x[1], reverse=True)
+        if rows is not None and len(rows) == self._size:
+            rows = None  # every row matched; skip the gather
+        
+        if rows is not None:
+            if len(rows) == 0:
+                return []
+            scores = self._cosine_scores(query_embedding, rows)
+            top = [(rows[j], scores[j]) for j in self._top_k(scores, limit)]
+        else:
+            scores = self._cosine_scores(query_embedding)
+            top = [(i, scores[i]) for i in self._top_k(scores, limit)]
         
         results = []
-        for idx, score in scores[:limit]:
+        for idx, score in top:
+            score = float(score)
             if score > 0:
                 results.append({
-                    "index": idx,
+                    "index": int(idx),
                     "score": score,
                     "text": self.metadata[idx].get("text", ""),
                     "metadata": self.metadata[idx]
@@ -80,32 +384,491 @@ class VectorStore:
                          limit: int = 5) -> List[Dict]:
         """Search within specific entity."""
         indices = self.entity_index.get(entity, [])
+        if self._deleted and indices:
+            indices = self._live(np.asarray(indices, dtype=np.int64)).tolist()
         
         if not indices:
             return []
         
         if query:
-            query_embedding = self._embed(query)
-            scored = []
-            for i in indices:
-                vec = self.vectors[i]
-                score = np.dot(query_embedding, vec) / (
-                    np.linalg.norm(query_embedding) * np.linalg.norm(vec) + 1e-8
-                )
-                scored.append((i, score, self.metadata[i]))
-            
-            scored.sort(key=lambda x: x[1], reverse=True)
-            return [{"index": i, "score": s, "metadata": m} 
-                    for i, s, m in scored[:limit]]
+            rows = np.asarray(indices, dtype=np.int64)
+            scores = self._cosine_scores(self._embed(query), rows)
+            return [{"index": int(rows[j]), "score": float(scores[j]),
+                     "metadata": self.metadata[rows[j]]}
+                    for j in self._top_k(scores, limit)]
         else:
             return [{"index": i, "score": 1.0, "metadata": self.metadata[i]} 
                     for i in indices[:limit]]
     
+    def delete(self, rows: List[int]) -> int:
+        """Tombstone rows so searches skip them; return how many were live."""
+        rows = np.unique(np.asarray(rows, dtype=np.int64))
+        if len(rows) and (rows[0] < 0 or rows[-1] >= self._size):
+            raise ValueError(f"Row ids must be in [0, {self._size})")
+        
+        rows = self._live(rows)
+        self._norms[rows] = np.inf
+        self._deleted += len(rows)
+        self._deletions += len(rows)
+        return len(rows)
+    
+    def compact(self) -> int:
+        """Drop tombstoned rows, renumbering the rest; return how many went.
+        
+        Rows keep their relative order. The matrix, metadata, indexes and
+        ANN assignments are rebuilt with vectorized copies and posting-list
+        remaps, and an attached directory is rewritten.
+        
+        Runs as ``_prepare_compaction``, which only reads the store, then
+        ``_apply_compaction``, which swaps the result in; a caller with a
+        readers-writer lock can hold the write lock for the second step only.
+        """
+        return self._apply_compaction(self._prepare_compaction())
+    
+    def _prepare_compaction(self) -> Optional[Dict[str, Any]]:
+        """Build the compacted store next to the live one, or None if nothing is deleted.
+        
+        New arrays, metadata, postings and ANN lists are built from the rows
+        present now; an attached directory gets the new files under
+        ``.compact`` names. The store itself is not modified.
+        """
+        if not self._deleted:
+            return None
+        
+        size = self._size
+        live = np.isfinite(self._norms[:size])
+        keep = np.flatnonzero(live)
+        remap = np.cumsum(live) - 1  # old row -> new row, for live rows
+        
+        shape = (max(len(keep), 1), self.dimension)
+        if self._path is not None:
+            matrix = self._map_file(self._path, "vectors.f32.compact", shape, "w+")
+            norms = self._map_file(self._path, "norms.f32.compact", shape[:1], "w+")
+        else:
+            matrix = np.zeros(shape, dtype=np.float32)
+            norms = np.zeros(shape[:1], dtype=np.float32)
+        matrix[:len(keep)] = self._matrix[keep]
+        norms[:len(keep)] = self._norms[keep]
+        metadata = [self.metadata[i] for i in keep.tolist()]
+        
+        def remapped(postings: Dict[Any, List[int]]) -> Dict[Any, List[int]]:
+            result = {}
+            for key, rows in postings.items():
+                rows = np.asarray(rows, dtype=np.int64)
+                rows = remap[rows[live[rows]]]
+                if len(rows):
+                    result[key] = rows.tolist()
+            return result
+        
+        plan = {
+            "generation": self._generation,
+            "deletions": self._deletions,
+            "size": size,
+            "keep": keep,
+            "remap": remap,
+            "matrix": matrix,
+            "norms": norms,
+            "metadata": metadata,
+            "entity_index": remapped(self.entity_index),
+            "time_index": remapped(self.time_index),
+            "field_index": {field: remapped(postings)
+                            for field, postings in self.field_index.items()},
+            "ivf": None,
+        }
+        if self.index is not None and self.index.is_trained:
+            assignments = np.frombuffer(self.index.assignments, dtype=np.int32)[keep]
+            plan["ivf"] = (assignments, IVFIndex.build_lists(assignments, len(self.index.centroids)))
+        
+        if self._path is not None:
+            matrix.flush()
+            norms.flush()
+            with open(os.path.join(self._path, "metadata.jsonl.compact"), "w") as f:
+                for row in metadata:
+                    f.write(json.dumps(row, default=str) + "\n")
+            if plan["ivf"] is not None:
+                with open(os.path.join(self._path, "ivf_assignments.i32.compact"), "wb") as f:
+                    f.write(plan["ivf"][0].tobytes())
+        return plan
+    
+    def _apply_compaction(self, plan: Optional[Dict[str, Any]]) -> int:
+        """Swap in a prepared compaction; return how many rows it dropped.
+        
+        Rows added or deleted since the plan was made are carried over, so
+        this costs time in proportion to those changes rather than to the
+        store. A plan overtaken by another compaction, or by the ANN index
+        training in between, is discarded and 0 returned.
+        """
+        if plan is None:
+            return 0
+        trained = self.index is not None and self.index.is_trained
+        if plan["generation"] != self._generation or trained != (plan["ivf"] is not None):
+            self._discard_compaction(plan)
+            return 0
+        
+        size, keep = plan["size"], plan["keep"]
+        old_matrix, old_norms = self._matrix, self._norms
+        old_metadata, old_size = self.metadata, self._size
+        
+        deleted = 0
+        if self._deletions != plan["deletions"]:
+            gone = keep[~np.isfinite(old_norms[keep])]
+            plan["norms"][plan["remap"][gone]] = np.inf
+            deleted = len(gone)
+        
+        if self._path is not None:
+            for name in self._COMPACTION_FILES:
+                staged = os.path.join(self._path, name + ".compact")
+                if os.path.exists(staged):
+                    os.replace(staged, os.path.join(self._path, name))
+        
+        self._matrix, self._norms = plan["matrix"], plan["norms"]
+        self.metadata = plan["metadata"]
+        self.entity_index, self.time_index = plan["entity_index"], plan["time_index"]
+        self.field_index = plan["field_index"]
+        if plan["ivf"] is not None:
+            self.index.restore(self.index.centroids, *plan["ivf"])
+        self._size, self._deleted, self._persisted = len(keep), deleted, len(keep)
+        self._generation += 1
+        
+        # Rows added since the plan was made, with any deleted among them
+        if old_size > size:
+            first = self._append_rows(old_matrix[size:old_size])
+            for offset, metadata in enumerate(old_metadata[size:old_size]):
+                self.metadata.append(metadata)
+                self._index_metadata(first + offset, metadata)
+            dead = first + np.flatnonzero(~np.isfinite(old_norms[size:old_size]))
+            self._norms[dead] = np.inf
+            self._deleted += len(dead)
+        
+        self.flush()
+        return size - len(keep)
+    
+    def _discard_compaction(self, plan: Dict[str, Any]):
+        """Remove the files a stale plan staged."""
+        if self._path is None:
+            return
+        for name in self._COMPACTION_FILES:
+            staged = os.path.join(self._path, name + ".compact")
+            if os.path.exists(staged):
+                os.remove(staged)
+    
+    def save(self, path: str):
+        """Write the store to directory ``path`` and attach it there."""
+        if self._path == path:
+            self.flush()
+            return
+        
+        os.makedirs(path, exist_ok=True)
+        capacity = max(self._size, 1)
+        matrix = self._map_file(path, "vectors.f32", (capacity, self.dimension), "w+")
+        norms = self._map_file(path, "norms.f32", (capacity,), "w+")
+        matrix[:self._size] = self.vectors
+        norms[:self._size] = self._norms[:self._size]
+        
+        open(os.path.join(path, "metadata.jsonl"), "w").close()
+        for name in ("ivf_centroids.npy", "ivf_assignments.i32"):
+            if os.path.exists(os.path.join(path, name)):
+                os.remove(os.path.join(path, name))
+        
+        self._path, self._persisted = path, 0
+        self._matrix, self._norms = matrix, norms
+        self.flush()
+    
+    def flush(self):
+        """Append rows added since the last flush and update the manifest."""
+        if self._path is None:
+            return
+        
+        self._matrix.flush()
+        self._norms.flush()
+        with open(os.path.join(self._path, "metadata.jsonl"), "a") as f:
+            for metadata in self.metadata[self._persisted:self._size]:
+                f.write(json.dumps(metadata, default=str) + "\n")
+        self._persisted = self._size
+        
+        if self.index is not None and self.index.is_trained:
+            centroids = os.path.join(self._path, "ivf_centroids.npy")
+            if not os.path.exists(centroids):
+                np.save(centroids, self.index.centroids)
+            assignments = os.path.join(self._path, "ivf_assignments.i32")
+            written = os.path.getsize(assignments) // 4 if os.path.exists(assignments) else 0
+            with open(assignments, "ab") as f:
+                f.write(self.index.assignments[written:self._size].tobytes())
+        
+        # Manifest is replaced last, so its size is the committed row count
+        manifest = {
+            "dimension": self.dimension,
+            "size": self._size,
+            "capacity": len(self._matrix),
+            "indexed_fields": list(self.field_index),
+            "ivf": self.index.params() if self.index is not None else None,
+        }
+        tmp = os.path.join(self._path, "manifest.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, os.path.join(self._path, "manifest.json"))
+    
+    @classmethod
+    def load(cls, path: str, embedder: Optional[Embedder] = None) -> "VectorStore":
+        """Open a store written by ``save`` without re-embedding anything.
+        
+        Pass the ``embedder`` the store was built with if it is not the default.
+        """
+        with open(os.path.join(path, "manifest.json")) as f:
+            manifest = json.load(f)
+        
+        index = IVFIndex(**manifest["ivf"]) if manifest["ivf"] else None
+        store = cls(dimension=manifest["dimension"], initial_capacity=1,
+                    indexed_fields=manifest["indexed_fields"], index=index,
+                    embedder=embedder)
+        size, capacity = manifest["size"], manifest["capacity"]
+        store._path, store._size, store._persisted = path, size, size
+        store._matrix = cls._map_file(path, "vectors.f32", (capacity, store.dimension))
+        store._norms = cls._map_file(path, "norms.f32", (capacity,))
+        store._deleted = int(np.count_nonzero(np.isinf(store._norms[:size])))
+        
+        # Decode all committed metadata lines in one call, drop any lines past
+        # the manifest left by an interrupted flush, then rebuild the indexes
+        with open(os.path.join(path, "metadata.jsonl"), "r+b") as f:
+            lines = f.read().split(b"\n", size)[:size]
+            f.truncate(sum(len(line) + 1 for line in lines))
+        store.metadata = json.loads(b"[" + b",".join(lines) + b"]")
+        for row, metadata in enumerate(store.metadata):
+            store._index_metadata(row, metadata)
+        
+        centroids = os.path.join(path, "ivf_centroids.npy")
+        if index is not None and os.path.exists(centroids):
+            assignments = os.path.join(path, "ivf_assignments.i32")
+            index.restore(np.load(centroids),
+                          np.fromfile(assignments, dtype=np.int32, count=size))
+            with open(assignments, "r+b") as f:
+                f.truncate(size * 4)
+        
+        return store
+    
+    @staticmethod
+    def _map_file(path: str, name: str, shape: tuple, mode: str = "r+") -> np.memmap:
+        """Memory-map a raw float32 file, extending it to ``shape`` if needed."""
+        filename = os.path.join(path, name)
+        nbytes = int(np.prod(shape)) * 4
+        if mode == "r+" and os.path.getsize(filename) < nbytes:
+            with open(filename, "r+b") as f:
+                f.truncate(nbytes)
+        return np.memmap(filename, dtype=np.float32, mode=mode, shape=shape)
+    
+    def _index_metadata(self, index: int, metadata: Dict[str, Any]):
+        """Add a row to the entity, time and field indexes."""
+        # Index by entity
+        if "entity" in metadata:
+            entity = metadata["entity"]
+            if entity not in self.entity_index:
+                self.entity_index[entity] = []
+            self.entity_index[entity].append(index)
+        
+        # Index by time
+        if "valid_from" in metadata:
+            time_key = self._time_key(metadata["valid_from"])
+            if time_key not in self.time_index:
+                self.time_index[time_key] = []
+            self.time_index[time_key].append(index)
+        
+        # Index configured metadata fields
+        for field, postings in self.field_index.items():
+            if field not in metadata:
+                continue  # an explicit None is indexed, a missing key never matches
+            try:
+                postings.setdefault(metadata[field], []).append(index)
+            except TypeError:  # unhashable values are left to filter checks
+                pass
+    
+    def _postings(self, key: str, value: Any) -> Optional[List[List[int]]]:
+        """Posting lists that cover rows where ``metadata[key]`` could match.
+        
+        Returns None when no index covers the key. Time postings are bucketed,
+        so candidates are always re-checked against the filters.
+        """
+        values = value if isinstance(value, list) else [value]
+        if key == "entity":
+            index, to_key = self.entity_index, lambda v: v
+        elif key == "valid_from":
+            index, to_key = self.time_index, self._time_key
+        elif key in self.field_index:
+            index, to_key = self.field_index[key], lambda v: v
+        else:
+            return None
+        
+        postings = []
+        for v in values:
+            if not isinstance(v, Hashable):
+                return None
+            postings.append(index.get(to_key(v), []))
+        return postings
+    
+    def _candidate_rows(self, filters: Dict[str, Any]) -> np.ndarray:
+        """Plan a filtered search: return sorted row ids that match ``filters``.
+        
+        The smallest indexed posting set seeds the candidates; other indexed
+        keys are intersected while their postings are of comparable size,
+        and whatever remains is verified row by row on the candidates.
+        Entity and field postings are exact, so keys answered by them are
+        not re-checked; time postings are bucketed and always are.
+        """
+        planned = []
+        for key, value in filters.items():
+            postings = self._postings(key, value)
+            if postings is not None:
+                planned.append((sum(len(p) for p in postings), key, postings))
+        
+        remaining = dict(filters)
+        if not planned:
+            rows = np.arange(self._size)
+        else:
+            planned.sort(key=lambda item: item[0])
+            rows = self._merge_postings(planned[0][2])
+            answered = [planned[0][1]]
+            for size, key, postings in planned[1:]:
+                if len(rows) == 0 or size > 4 * len(rows):
+                    break
+                rows = np.intersect1d(rows, self._merge_postings(postings),
+                                      assume_unique=True)
+                answered.append(key)
+            for key in answered:
+                if key != "valid_from":
+                    del remaining[key]
+        
+        if not remaining:
+            return rows.astype(np.int64, copy=False)
+        return np.asarray(
+            [i for i in rows if self._matches_filters(self.metadata[i], remaining)],
+            dtype=np.int64
+        )
+    
+    def _live(self, rows: np.ndarray) -> np.ndarray:
+        """The rows that have not been deleted."""
+        return rows[np.isfinite(self._norms[rows])]
+    
+    @staticmethod
+    def _merge_postings(postings: List[List[int]]) -> np.ndarray:
+        """Union of ascending posting lists as a sorted array."""
+        if len(postings) == 1:
+            return np.asarray(postings[0], dtype=np.int64)
+        return np.unique(np.concatenate(
+            [np.asarray(p, dtype=np.int64) for p in postings]
+        ))
+    
+    def _append_rows(self, embeddings: np.ndarray) -> int:
+        """Copy embeddings into the matrix, cache their norms, return first row."""
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dimension)
+        start, end = self._size, self._size + len(embeddings)
+        if end > len(self._matrix):
+            self._grow(end)
+        
+        self._matrix[start:end] = embeddings
+        self._norms[start:end] = np.linalg.norm(embeddings, axis=1)
+        self._size = end
+        self._update_index(start)
+        return start
+    
+    def _update_index(self, start: int):
+        """Feed rows from ``start`` onwards to the ANN index, training it first if due."""
+        if self.index is None:
+            return
+        if not self.index.is_trained:
+            if self._size < self.index.train_size:
+                return
+            self.index.train(self._unit_rows(self.index.sample_rows(self._size)))
+            start = 0
+        for first in range(start, self._size, 65536):
+            rows = np.arange(first, min(first + 65536, self._size))
+            self.index.add(first, self._unit_rows(rows))
+    
+    def _unit_rows(self, rows: np.ndarray) -> np.ndarray:
+        """Unit-normalized copy of the given rows."""
+        return self._matrix[rows] / (self._norms[rows, None] + 1e-8)
+    
+    def _grow(self, min_capacity: int):
+        """Double matrix capacity until it holds ``min_capacity`` rows."""
+        capacity = len(self._matrix)
+        while capacity < min_capacity:
+            capacity *= 2
+        
+        if self._path is not None:
+            # Extend the mapped files in place; existing rows are not rewritten
+            self._matrix.flush()
+            self._norms.flush()
+            self._matrix = self._map_file(self._path, "vectors.f32",
+                                          (capacity, self.dimension))
+            self._norms = self._map_file(self._path, "norms.f32", (capacity,))
+            return
+        
+        matrix = np.zeros((capacity, self.dimension), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        norms = np.zeros(capacity, dtype=np.float32)
+        norms[:self._size] = self._norms[:self._size]
+        self._matrix, self._norms = matrix, norms
+    
+    def _cosine_scores(self, query_embedding: np.ndarray,
+                       rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Cosine similarity of the query against all rows (or a subset)."""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = np.linalg.norm(query)
+        
+        if rows is None:
+            matrix, norms = self.vectors, self._norms[:self._size]
+        else:
+            matrix, norms = self._matrix[rows], self._norms[rows]
+        if query_norm == 0:
+            # A zero query matches nothing; avoid 0 * inf on removed rows
+            return np.zeros(len(norms), dtype=np.float32)
+        
+        return (matrix @ query) / (query_norm * norms + 1e-8)
+    
+    @staticmethod
+    def _top_k(scores: np.ndarray, limit: int) -> np.ndarray:
+        """Positions of the ``limit`` best scores, highest first.
+        
+        Ties are broken by position so the order matches a stable
+        descending sort of the full score list.
+        """
+        n = len(scores)
+        if limit <= 0 or n == 0:
+            return np.empty(0, dtype=np.int64)
+        
+        if limit < n:
+            kth = scores[np.argpartition(-scores, limit - 1)[limit - 1]]
+            candidates = np.flatnonzero(scores >= kth)
+        else:
+            candidates = np.arange(n)
+        
+        order = np.lexsort((candidates, -scores[candidates]))
+        return candidates[order[:limit]]
+    
     def _embed(self, text: str) -> np.ndarray:
         """Generate embedding for text."""
-        # In production, use actual embedding model
-        np.random.seed(hash(text) % (2**32))
-        return np.random.randn(self.dimension)
+        return self._embed_batch([text])[0]
+    
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        """Embed texts, calling the embedder once for all cache misses."""
+        if self.embedding_cache is None:
+            return self.embedder.embed_batch(texts)
+        
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        missing: Dict[str, List[int]] = {}  # key -> positions in this batch
+        keys = [EmbeddingCache.key(text) for text in texts]
+        for position, key in enumerate(keys):
+            cached = None if key in missing else self.embedding_cache.get(key)
+            if cached is None:
+                missing.setdefault(key, []).append(position)
+            else:
+                embeddings[position] = cached
+        
+        if missing:
+            fresh = self.embedder.embed_batch([texts[p[0]] for p in missing.values()])
+            for (key, positions), embedding in zip(missing.items(), fresh):
+                embeddings[positions] = embedding
+                self.embedding_cache.put(key, embedding)
+        
+        return embeddings
     
     def _time_key(self, timestamp: Any) -> str:
         """Create time key for indexing."""
@@ -127,18 +890,56 @@ class VectorStore:
 
 
 class PropertyGraph:
-    """Simple property graph storage."""
+    """Simple property graph storage.
+    
+    Each node keeps outgoing and incoming adjacency lists, so relationship
+    lookups and traversals (``neighborhood``, ``bfs``, ``dfs``,
+    ``shortest_path``) cost time proportional to the edges they touch.
+    ``match`` runs multi-hop patterns with property predicates, starting
+    from the most selective node or edge and streaming results.
+    
+    ``delete_relationships`` drops edges from the adjacency lists at once;
+    a type's edge list keeps their ids until removed edges outnumber live
+    ones, then is rebuilt, so removal costs amortized O(1) per edge.
+    
+    ``save(path)`` writes nodes and edges as append-only JSONL logs and
+    attaches the graph to ``path``; ``flush()`` then appends only records
+    created or removed since the last flush. ``PropertyGraph.load(path)``
+    replays the logs and rebuilds the indexes.
+    """
     
     def __init__(self):
         self.nodes: Dict[str, Dict] = {}
         self.edges: Dict[str, Dict] = {}
         self.node_index: Dict[str, List[str]] = {}  # label -> node_ids
         self.edge_index: Dict[str, List[str]] = {}  # type -> edge_ids
+        self.out_edges: Dict[str, List[str]] = {}  # node_id -> edge_ids
+        self.in_edges: Dict[str, List[str]] = {}  # node_id -> edge_ids
+        self._edge_order: Dict[str, int] = {}  # edge_id -> creation sequence
+        self._removed_edges: Dict[str, int] = {}  # type -> removed ids still in edge_index
+        # property key -> value -> node_ids, for keys passed to create_property_index
+        self.property_index: Dict[str, Dict[Any, List[str]]] = {}
+        
+        self._ids = count()  # keeps ids unique within one clock tick
+        self._sequence = count()  # edge creation order
+        self._path: Optional[str] = None  # directory when persisted
+        self._unsaved_nodes: List[str] = []
+        self._unsaved_edges: List[str] = []
+        self._unsaved_removals: List[str] = []
+        self._logged_removals = 0  # removal records in the edge log
     
-    def create_node(self, label: str, properties: Dict = None) -> str:
-        """Create node with label and properties."""
-        import time
-        node_id = hashlib.md5(f"{label}{time.time()}".encode()).hexdigest()[:16]
+    def create_node(self, label: str, properties: Dict = None,
+                    node_id: Optional[str] = None) -> str:
+        """Create node with label and properties.
+        
+        ``node_id`` gives the node a caller-chosen id, such as an entity name.
+        """
+        if node_id is None:
+            node_id = hashlib.md5(
+                f"{label}{time.time()}{next(self._ids)}".encode()
+            ).hexdigest()[:16]
+        elif node_id in self.nodes:
+            raise ValueError(f"Node already exists: {node_id}")
         
         self.nodes[node_id] = {
             "id": node_id,
@@ -146,23 +947,26 @@ class PropertyGraph:
             "properties": properties or {},
             "created_at": time.time()
         }
-        
-        if label not in self.node_index:
-            self.node_index[label] = []
-        self.node_index[label].append(node_id)
+        self._index_node(self.nodes[node_id])
         
         return node_id
     
     def create_relationship(self, source_id: str, rel_type: str, 
                            target_id: str, properties: Dict = None) -> str:
         """Create directed relationship between nodes."""
-        import time
+        return self._create_edge(source_id, rel_type, target_id, properties)
+    
+    def _create_edge(self, source_id: str, rel_type: str, target_id: str,
+                     properties: Dict = None, fields: Dict = None) -> str:
+        """Create and index an edge; ``fields`` are extra top-level keys."""
         if source_id not in self.nodes:
             raise ValueError(f"Unknown source node: {source_id}")
         if target_id not in self.nodes:
             raise ValueError(f"Unknown target node: {target_id}")
         
-        edge_id = hashlib.md5(f"{source_id}{rel_type}{target_id}{time.time()}".encode()).hexdigest()[:16]
+        edge_id = hashlib.md5(
+            f"{source_id}{rel_type}{target_id}{time.time()}{next(self._ids)}".encode()
+        ).hexdigest()[:16]
         
         self.edges[edge_id] = {
             "id": edge_id,
@@ -170,44 +974,355 @@ class PropertyGraph:
             "target": target_id,
             "type": rel_type,
             "properties": properties or {},
-            "created_at": time.time()
+            "created_at": time.time(),
+            **(fields or {})
         }
-        
-        if rel_type not in self.edge_index:
-            self.edge_index[rel_type] = []
-        self.edge_index[rel_type].append(edge_id)
+        self._index_edge(self.edges[edge_id])
         
         return edge_id
     
+    def delete_relationships(self, edge_ids: List[str]) -> int:
+        """Remove relationships; return how many existed."""
+        removed = [self.edges.pop(edge_id) for edge_id in dict.fromkeys(edge_ids)
+                   if edge_id in self.edges]
+        if not removed:
+            return 0
+        
+        gone = {edge["id"] for edge in removed}
+        for adjacency, end in ((self.out_edges, "source"), (self.in_edges, "target")):
+            for node_id in {edge[end] for edge in removed}:
+                adjacency[node_id] = [eid for eid in adjacency[node_id] if eid not in gone]
+        
+        for edge in removed:
+            del self._edge_order[edge["id"]]
+            self._removed_edges[edge["type"]] = self._removed_edges.get(edge["type"], 0) + 1
+        for rel_type in {edge["type"] for edge in removed}:
+            if 2 * self._removed_edges[rel_type] > len(self.edge_index[rel_type]):
+                self._compact_edge_type(rel_type)
+        
+        if self._path is not None:
+            self._unsaved_removals.extend(edge["id"] for edge in removed)
+        return len(removed)
+    
+    def _compact_edge_type(self, rel_type: str):
+        """Drop the ids of removed edges from a type's edge list."""
+        self.edge_index[rel_type] = [eid for eid in self.edge_index[rel_type]
+                                     if eid in self.edges]
+        self._removed_edges.pop(rel_type, None)
+    
+    def save(self, path: str):
+        """Write the graph to directory ``path`` and attach it there."""
+        if self._path == path:
+            self.flush()
+            return
+        
+        os.makedirs(path, exist_ok=True)
+        for name in ("nodes.jsonl", "edges.jsonl"):
+            open(os.path.join(path, name), "w").close()
+        
+        self._path = path
+        self._unsaved_nodes = list(self.nodes)
+        self._unsaved_edges = list(self.edges)
+        self._unsaved_removals, self._logged_removals = [], 0
+        self.flush()
+    
+    def flush(self):
+        """Append nodes, edges and edge removals since the last flush.
+        
+        Once removal records would outnumber the live edges, the edge log
+        is rewritten from the live edges instead.
+        """
+        if self._path is None:
+            return
+        
+        edge_log = os.path.join(self._path, "edges.jsonl")
+        removals = self._unsaved_removals
+        if removals and self._logged_removals + len(removals) > len(self.edges):
+            with open(edge_log + ".tmp", "w") as f:
+                for edge in self.edges.values():
+                    f.write(json.dumps(edge, default=str) + "\n")
+            os.replace(edge_log + ".tmp", edge_log)
+            self._unsaved_edges, removals, self._logged_removals = [], [], 0
+        
+        for name, ids, records in (("nodes.jsonl", self._unsaved_nodes, self.nodes),
+                                   ("edges.jsonl", self._unsaved_edges, self.edges)):
+            with open(os.path.join(self._path, name), "a") as f:
+                for record_id in ids:
+                    if record_id in records:  # edges removed before a flush are never written
+                        f.write(json.dumps(records[record_id], default=str) + "\n")
+        with open(edge_log, "a") as f:
+            for edge_id in removals:
+                f.write(json.dumps({"id": edge_id, "deleted": True}) + "\n")
+        self._logged_removals += len(removals)
+        
+        self._unsaved_nodes = []
+        self._unsaved_edges = []
+        self._unsaved_removals = []
+    
+    @classmethod
+    def load(cls, path: str) -> "PropertyGraph":
+        """Replay a graph written by ``save`` and attach it to ``path``."""
+        graph = cls()
+        with open(os.path.join(path, "nodes.jsonl")) as f:
+            for line in f:
+                node = json.loads(line)
+                graph.nodes[node["id"]] = node
+                graph._index_node(node)
+        edges: Dict[str, Dict] = {}
+        with open(os.path.join(path, "edges.jsonl")) as f:
+            for line in f:
+                edge = json.loads(line)
+                if edge.get("deleted"):
+                    edges.pop(edge["id"], None)
+                    graph._logged_removals += 1
+                else:
+                    edges[edge["id"]] = edge
+        for edge in edges.values():
+            graph.edges[edge["id"]] = edge
+            graph._index_edge(edge)
+        
+        graph._path = path
+        return graph
+    
+    def _index_node(self, node: Dict):
+        """Add a node to the label index and queue it for the next flush."""
+        if node["label"] not in self.node_index:
+            self.node_index[node["label"]] = []
+        self.node_index[node["label"]].append(node["id"])
+        
+        for key, postings in self.property_index.items():
+            self._index_property(postings, node, key)
+        
+        if self._path is not None:
+            self._unsaved_nodes.append(node["id"])
+    
+    def create_property_index(self, key: str):
+        """Index node property ``key`` so pattern predicates on it can seed a match."""
+        if key in self.property_index:
+            return
+        postings: Dict[Any, List[str]] = {}
+        for node in self.nodes.values():
+            self._index_property(postings, node, key)
+        self.property_index[key] = postings
+    
+    @staticmethod
+    def _index_property(postings: Dict[Any, List[str]], node: Dict, key: str):
+        value = node["properties"].get(key)
+        if value is None:
+            return
+        try:
+            postings.setdefault(value, []).append(node["id"])
+        except TypeError:  # unhashable values are only checked by predicates
+            pass
+    
+    def _index_edge(self, edge: Dict):
+        """Add an edge to the type and adjacency indexes and queue it for the next flush."""
+        if edge["type"] not in self.edge_index:
+            self.edge_index[edge["type"]] = []
+        self.edge_index[edge["type"]].append(edge["id"])
+        self._edge_order[edge["id"]] = next(self._sequence)
+        self.out_edges.setdefault(edge["source"], []).append(edge["id"])
+        self.in_edges.setdefault(edge["target"], []).append(edge["id"])
+        
+        if self._path is not None:
+            self._unsaved_edges.append(edge["id"])
+    
     def query(self, pattern: Dict) -> List[Dict]:
-        """Query graph with simple pattern matching."""
-        results = []
+        """Query graph with simple pattern matching.
+        
+        ``{"type", "source_label", "target_label"}`` patterns return
+        source/edge/target dicts in edge creation order; compound patterns
+        (see ``match``) return its results as a list, in planner order.
+        """
+        if "nodes" in pattern or "edges" in pattern:
+            return list(self.match(pattern))
         
         # Match by edge type
-        if "type" in pattern:
-            edge_ids = self.edge_index.get(pattern["type"], [])
-            for eid in edge_ids:
-                edge = self.edges[eid]
-                source = self.nodes.get(edge["source"], {})
-                target = self.nodes.get(edge["target"], {})
-                
-                # Match source label
-                if "source_label" in pattern:
-                    if source.get("label") != pattern["source_label"]:
+        if "type" not in pattern:
+            return []
+        
+        compound = {
+            "nodes": [{"label": pattern["source_label"]} if "source_label" in pattern else {},
+                      {"label": pattern["target_label"]} if "target_label" in pattern else {}],
+            "edges": [{"type": pattern["type"]}]
+        }
+        matches = sorted(self.match(compound),
+                         key=lambda m: self._edge_order[m["edges"][0]["id"]])
+        return [{"source": m["nodes"][0], "edge": m["edges"][0], "target": m["nodes"][1]}
+                for m in matches]
+    
+    def _match_edge(self, edge: Dict, pattern: Dict) -> Optional[Dict]:
+        """Apply a pattern's label constraints to one edge."""
+        source = self.nodes.get(edge["source"], {})
+        target = self.nodes.get(edge["target"], {})
+        
+        # Match source label
+        if "source_label" in pattern:
+            if source.get("label") != pattern["source_label"]:
+                return None
+        
+        # Match target label
+        if "target_label" in pattern:
+            if target.get("label") != pattern["target_label"]:
+                return None
+        
+        return {
+            "source": source,
+            "edge": edge,
+            "target": target
+        }
+    
+    # Pattern matching
+    
+    _OPERATORS = {
+        "=": operator.eq, "!=": operator.ne,
+        ">": operator.gt, ">=": operator.ge,
+        "<": operator.lt, "<=": operator.le,
+        "in": lambda value, options: value in options,
+    }
+    
+    def match(self, pattern: Dict) -> Iterator[Dict]:
+        """Lazily match a path pattern, yielding ``{"nodes": [...], "edges": [...]}``.
+        
+        ``pattern["nodes"]`` lists node specs (``id``, ``label``, ``where``)
+        and ``pattern["edges"]`` the hops between consecutive nodes (``type``,
+        ``direction``, ``where``). ``where`` maps property keys to a value or
+        to ``{operator: operand}`` with operators from ``_OPERATORS``. The
+        match starts at the node or edge with the smallest candidate set,
+        judged by ids, property indexes and label/type cardinalities, and
+        expands outwards through the adjacency lists. An edge is used at most
+        once per path.
+        """
+        edge_specs = pattern.get("edges", [])
+        node_specs = pattern.get("nodes") or [{} for _ in range(len(edge_specs) + 1)]
+        if len(node_specs) != len(edge_specs) + 1:
+            raise ValueError("A pattern needs exactly one more node than edges")
+        
+        kind, position, _, candidates = self._plan(node_specs, edge_specs)
+        nodes: List[Optional[Dict]] = [None] * len(node_specs)
+        edges: List[Optional[Dict]] = [None] * len(edge_specs)
+        
+        if kind == "node":
+            for node_id in candidates:
+                node = self.nodes.get(node_id)
+                if node is None or not self._node_matches(node, node_specs[position]):
+                    continue
+                nodes[position] = node
+                yield from self._extend(node_specs, edge_specs, nodes, edges,
+                                        position, position)
+        else:
+            spec = edge_specs[position]
+            for edge_id in candidates:
+                edge = self.edges.get(edge_id)
+                if edge is None or not self._matches_where(edge["properties"], spec.get("where")):
+                    continue
+                for left, right in self._orientations(edge, spec.get("direction", "outgoing")):
+                    if not (self._node_matches(self.nodes[left], node_specs[position]) and
+                            self._node_matches(self.nodes[right], node_specs[position + 1])):
                         continue
-                
-                # Match target label
-                if "target_label" in pattern:
-                    if target.get("label") != pattern["target_label"]:
+                    nodes[position], nodes[position + 1] = self.nodes[left], self.nodes[right]
+                    edges[position] = edge
+                    yield from self._extend(node_specs, edge_specs, nodes, edges,
+                                            position, position + 1)
+                edges[position] = None
+    
+    def explain(self, pattern: Dict) -> Dict[str, Any]:
+        """Describe where ``match`` would start for this pattern."""
+        edge_specs = pattern.get("edges", [])
+        node_specs = pattern.get("nodes") or [{} for _ in range(len(edge_specs) + 1)]
+        kind, position, estimate, _ = self._plan(node_specs, edge_specs)
+        return {"start": kind, "position": position, "estimated_rows": estimate}
+    
+    def _plan(self, node_specs: List[Dict], edge_specs: List[Dict]) -> Tuple[str, int, int, Any]:
+        """Choose the most selective anchor: ``(kind, position, estimate, candidates)``."""
+        best = None
+        for position, spec in enumerate(node_specs):
+            options = [(len(self.nodes), self.nodes)]
+            if "id" in spec:
+                options.append((1, [spec["id"]]))
+            if "label" in spec:
+                postings = self.node_index.get(spec["label"], [])
+                options.append((len(postings), postings))
+            for key, condition in (spec.get("where") or {}).items():
+                if key in self.property_index and not isinstance(condition, dict):
+                    try:
+                        postings = self.property_index[key].get(condition, [])
+                    except TypeError:
                         continue
-                
-                results.append({
-                    "source": source,
-                    "edge": edge,
-                    "target": target
-                })
+                    options.append((len(postings), postings))
+            estimate, candidates = min(options, key=lambda option: option[0])
+            if best is None or estimate < best[2]:
+                best = ("node", position, estimate, candidates)
         
-        return results
+        for position, spec in enumerate(edge_specs):
+            candidates = self.edge_index.get(spec["type"], []) if "type" in spec else self.edges
+            if len(candidates) < best[2]:
+                best = ("edge", position, len(candidates), candidates)
+        
+        return best
+    
+    def _extend(self, node_specs: List[Dict], edge_specs: List[Dict],
+                nodes: List[Optional[Dict]], edges: List[Optional[Dict]],
+                lo: int, hi: int) -> Iterator[Dict]:
+        """Grow a partial match covering nodes ``lo..hi``, right side first."""
+        if hi < len(edge_specs):
+            step, node_id, position = edge_specs[hi], nodes[hi]["id"], hi + 1
+            direction = step.get("direction", "outgoing")
+        elif lo > 0:
+            step, node_id, position = edge_specs[lo - 1], nodes[lo]["id"], lo - 1
+            direction = {"outgoing": "incoming", "incoming": "outgoing"}.get(
+                step.get("direction", "outgoing"), "both")
+        else:
+            yield {"nodes": list(nodes), "edges": list(edges)}
+            return
+        
+        edge_position = hi if position > hi else position
+        rel_types = [step["type"]] if "type" in step else None
+        for edge, neighbor_id in self.neighbors(node_id, direction, rel_types):
+            if any(bound is edge for bound in edges):
+                continue
+            if not self._matches_where(edge["properties"], step.get("where")):
+                continue
+            neighbor = self.nodes[neighbor_id]
+            if not self._node_matches(neighbor, node_specs[position]):
+                continue
+            nodes[position], edges[edge_position] = neighbor, edge
+            if position > hi:
+                yield from self._extend(node_specs, edge_specs, nodes, edges, lo, position)
+            else:
+                yield from self._extend(node_specs, edge_specs, nodes, edges, position, hi)
+            nodes[position], edges[edge_position] = None, None
+    
+    @staticmethod
+    def _orientations(edge: Dict, direction: str) -> List[Tuple[str, str]]:
+        """Ways an edge can bind (left, right) nodes of a hop."""
+        forward, backward = (edge["source"], edge["target"]), (edge["target"], edge["source"])
+        if direction == "outgoing":
+            return [forward]
+        if direction == "incoming":
+            return [backward]
+        return [forward] if forward == backward else [forward, backward]
+    
+    def _node_matches(self, node: Dict, spec: Dict) -> bool:
+        if "id" in spec and node["id"] != spec["id"]:
+            return False
+        if "label" in spec and node["label"] != spec["label"]:
+            return False
+        return self._matches_where(node["properties"], spec.get("where"))
+    
+    def _matches_where(self, properties: Dict, where: Optional[Dict]) -> bool:
+        """Check property predicates; incomparable values do not match."""
+        for key, condition in (where or {}).items():
+            if key not in properties:
+                return False
+            checks = condition.items() if isinstance(condition, dict) else [("=", condition)]
+            try:
+                if not all(self._OPERATORS[op](properties[key], operand)
+                           for op, operand in checks):
+                    return False
+            except TypeError:
+                return False
+        return True
     
     def get_node(self, node_id: str) -> Optional[Dict]:
         """Get node by ID."""
@@ -215,28 +1330,341 @@ class PropertyGraph:
     
     def get_relationships(self, node_id: str, 
                           direction: str = "both") -> List[Dict]:
-        """Get relationships for a node."""
-        relationships = []
+        """Get relationships for a node, outgoing ones first."""
+        return list(self._iter_relationships(node_id, direction))
+    
+    def get_relationships_many(self, node_ids: List[str], direction: str = "both",
+                               limit: Optional[int] = None,
+                               depth: int = 1) -> Dict[str, List[Dict]]:
+        """Relationships for each distinct node in ``node_ids``.
+        
+        Every relationship within ``depth`` hops is listed once, nearest
+        first and outgoing before incoming at each hop, with its hop count
+        under ``"depth"``. ``limit`` caps the list per node and stops the
+        walk as soon as it is reached.
+        """
+        if depth < 1:
+            raise ValueError("depth must be at least 1")
         
-        for edge in self.edges.values():
-            if direction in ["outgoing", "both"] and edge["source"] == node_id:
-                relationships.append({
+        result: Dict[str, List[Dict]] = {}
+        for node_id in node_ids:
+            if node_id not in result:
+                result[node_id] = self._collect_relationships(node_id, direction,
+                                                              limit, depth)
+        return result
+    
+    def _collect_relationships(self, node_id: str, direction: str,
+                               limit: Optional[int], depth: int) -> List[Dict]:
+        """Breadth-first walk listing each relationship once, up to ``limit``."""
+        relationships = []
+        seen, visited, frontier = set(), {node_id}, [node_id]
+        for hop in range(1, depth + 1):
+            next_frontier = []
+            for current in frontier:
+                for rel in self._iter_relationships(current, direction):
+                    edge = rel["edge"]
+                    if edge["id"] in seen:
+                        continue
+                    if limit is not None and len(relationships) >= limit:
+                        return relationships
+                    seen.add(edge["id"])
+                    rel["depth"] = hop
+                    relationships.append(rel)
+                    other = edge["target"] if rel["direction"] == "outgoing" else edge["source"]
+                    if other not in visited:
+                        visited.add(other)
+                        next_frontier.append(other)
+            frontier = next_frontier
+        return relationships
+    
+    def _iter_relationships(self, node_id: str, direction: str) -> Iterator[Dict]:
+        if direction in ["outgoing", "both"]:
+            for eid in self.out_edges.get(node_id, []):
+                edge = self.edges[eid]
+                yield {
                     "edge": edge,
                     "target": self.nodes.get(edge["target"]),
                     "direction": "outgoing"
-                })
-            if direction in ["incoming", "both"] and edge["target"] == node_id:
-                relationships.append({
+                }
+        if direction in ["incoming", "both"]:
+            for eid in self.in_edges.get(node_id, []):
+                edge = self.edges[eid]
+                yield {
                     "edge": edge,
                     "source": self.nodes.get(edge["source"]),
                     "direction": "incoming"
-                })
+                }
+    
+    # Traversal
+    
+    def neighbors(self, node_id: str, direction: str = "outgoing",
+                  rel_types: Optional[List[str]] = None,
+                  node_labels: Optional[List[str]] = None) -> Iterator[Tuple[Dict, str]]:
+        """Yield ``(edge, neighbor_id)`` pairs, optionally filtered by type."""
+        sides = []
+        if direction in ["outgoing", "both"]:
+            sides.append((self.out_edges.get(node_id, []), "target"))
+        if direction in ["incoming", "both"]:
+            sides.append((self.in_edges.get(node_id, []), "source"))
         
-        return relationships
+        for edge_ids, end in sides:
+            for eid in edge_ids:
+                edge = self.edges[eid]
+                if rel_types and edge["type"] not in rel_types:
+                    continue
+                if direction == "both" and end == "source" and edge["source"] == edge["target"]:
+                    continue  # self-loop, already yielded as an outgoing edge
+                neighbor = edge[end]
+                if node_labels and self.nodes[neighbor]["label"] not in node_labels:
+                    continue
+                yield edge, neighbor
+    
+    def bfs(self, start_id: str, max_depth: Optional[int] = None,
+            direction: str = "outgoing", rel_types: Optional[List[str]] = None,
+            node_labels: Optional[List[str]] = None) -> Iterator[Tuple[str, int]]:
+        """Breadth-first traversal yielding ``(node_id, depth)``, start included."""
+        if start_id not in self.nodes:
+            return
+        seen = {start_id}
+        queue = deque([(start_id, 0)])
+        while queue:
+            node_id, depth = queue.popleft()
+            yield node_id, depth
+            if max_depth is not None and depth >= max_depth:
+                continue
+            for _, neighbor in self.neighbors(node_id, direction, rel_types, node_labels):
+                if neighbor not in seen:
+                    seen.add(neighbor)
+                    queue.append((neighbor, depth + 1))
+    
+    def dfs(self, start_id: str, max_depth: Optional[int] = None,
+            direction: str = "outgoing", rel_types: Optional[List[str]] = None,
+            node_labels: Optional[List[str]] = None) -> Iterator[Tuple[str, int]]:
+        """Depth-first (pre-order) traversal yielding ``(node_id, depth)``."""
+        if start_id not in self.nodes:
+            return
+        seen = set()
+        stack = [(start_id, 0)]
+        while stack:
+            node_id, depth = stack.pop()
+            if node_id in seen:
+                continue
+            seen.add(node_id)
+            yield node_id, depth
+            if max_depth is not None and depth >= max_depth:
+                continue
+            neighbors = [n for _, n in self.neighbors(node_id, direction, rel_types, node_labels)]
+            stack.extend((n, depth + 1) for n in reversed(neighbors) if n not in seen)
+    
+    def neighborhood(self, node_id: str, hops: int = 1, direction: str = "both",
+                     rel_types: Optional[List[str]] = None,
+                     node_labels: Optional[List[str]] = None) -> Dict[str, int]:
+        """Nodes within ``hops`` of ``node_id`` mapped to their distance."""
+        return {n: depth for n, depth in self.bfs(
+            node_id, hops, direction, rel_types, node_labels
+        ) if n != node_id}
+    
+    def shortest_path(self, source_id: str, target_id: str,
+                      direction: str = "outgoing",
+                      rel_types: Optional[List[str]] = None,
+                      max_depth: Optional[int] = None) -> Optional[List[Dict]]:
+        """Fewest-hop path as a list of edges, or None if unreachable.
+        
+        Runs a bidirectional BFS, always expanding the smaller frontier.
+        """
+        if source_id not in self.nodes or target_id not in self.nodes:
+            return None
+        if source_id == target_id:
+            return []
+        
+        reverse = {"outgoing": "incoming", "incoming": "outgoing"}.get(direction, direction)
+        forward: Dict[str, Optional[Dict]] = {source_id: None}
+        backward: Dict[str, Optional[Dict]] = {target_id: None}
+        forward_frontier, backward_frontier = [source_id], [target_id]
+        depth = 0
+        
+        while forward_frontier and backward_frontier:
+            if max_depth is not None and depth >= max_depth:
+                return None
+            depth += 1
+            expand_forward = len(forward_frontier) <= len(backward_frontier)
+            frontier = forward_frontier if expand_forward else backward_frontier
+            parents, others = (forward, backward) if expand_forward else (backward, forward)
+            
+            next_frontier, meetings = [], []
+            for node_id in frontier:
+                for edge, neighbor in self.neighbors(
+                    node_id, direction if expand_forward else reverse, rel_types
+                ):
+                    if neighbor in parents:
+                        continue
+                    parents[neighbor] = edge
+                    if neighbor in others:
+                        meetings.append(neighbor)
+                    next_frontier.append(neighbor)
+            
+            # Finish the level before choosing, so the shortest meeting wins
+            if meetings:
+                return min((self._unwind_path(forward, source_id, node)
+                            + self._unwind_path(backward, target_id, node)[::-1]
+                            for node in meetings), key=len)
+            
+            if expand_forward:
+                forward_frontier = next_frontier
+            else:
+                backward_frontier = next_frontier
+        
+        return None
+    
+    @staticmethod
+    def _unwind_path(parents: Dict[str, Optional[Dict]], root_id: str,
+                     node_id: str) -> List[Dict]:
+        """Edges between ``root_id`` and ``node_id`` along BFS parent links."""
+        path = []
+        while node_id != root_id:
+            edge = parents[node_id]
+            path.append(edge)
+            node_id = edge["source"] if edge["target"] == node_id else edge["target"]
+        path.reverse()
+        return path
+
+
+class _IntervalNode:
+    """Node of a centered interval tree."""
+    
+    __slots__ = ("center", "by_start", "by_end", "starts", "neg_ends", "left", "right")
+    
+    def __init__(self, intervals: List[Tuple[float, float, int]]):
+        starts = sorted(interval[0] for interval in intervals)
+        self.center = starts[len(starts) // 2]
+        
+        here, left, right = [], [], []
+        for interval in intervals:
+            if interval[1] < self.center:
+                left.append(interval)
+            elif interval[0] > self.center:
+                right.append(interval)
+            else:
+                here.append(interval)
+        
+        # Intervals spanning the center, sorted both ways for prefix scans
+        self.by_start = sorted(here, key=lambda interval: interval[0])
+        self.by_end = sorted(here, key=lambda interval: -interval[1])
+        self.starts = [interval[0] for interval in self.by_start]
+        self.neg_ends = [-interval[1] for interval in self.by_end]
+        self.left = _IntervalNode(left) if left else None
+        self.right = _IntervalNode(right) if right else None
+
+
+class IntervalIndex:
+    """Validity intervals ``[start, end)`` supporting stabbing and overlap queries.
+    
+    Intervals are kept in a logarithmic set of levels merged like a binary
+    counter; each level gets a static centered interval tree the first time
+    it is queried. Adds are amortized O(log n) list work and queries cost
+    O(log^2 n + k) once the trees exist. Items are opaque integers.
+    """
+    
+    def __init__(self):
+        self._levels: List[Optional[List[Tuple[float, float, int]]]] = []
+        self._trees: List[Optional[_IntervalNode]] = []
+    
+    def __len__(self) -> int:
+        return sum(len(level) for level in self._levels if level)
+    
+    def add(self, start: float, end: float, item: int):
+        """Index ``[start, end)``; inverted intervals are not stored.
+        
+        A zero-length interval is kept as a point: it meets the ranges
+        that contain it, but no instant stabs it.
+        """
+        if end < start:
+            return
+        carry = [(start, end, item)]
+        for level, intervals in enumerate(self._levels):
+            if intervals is None:
+                self._levels[level] = carry
+                return
+            carry = carry + intervals
+            self._levels[level] = None
+            self._trees[level] = None
+        self._levels.append(carry)
+        self._trees.append(None)
+    
+    def intervals(self) -> Iterator[Tuple[float, float, int]]:
+        for intervals in self._levels:
+            if intervals:
+                yield from intervals
+    
+    def stab(self, t: float) -> List[int]:
+        """Items whose interval contains ``t`` (start <= t < end)."""
+        found = []
+        for node in self._built_trees():
+            while node is not None:
+                if t < node.center:
+                    # Everything here ends at or after center > t
+                    found.extend(iv[2] for iv in node.by_start[:self._count_le(node.starts, t)])
+                    node = node.left
+                else:
+                    # Everything here starts at or before center <= t
+                    count_gt = bisect_left(node.neg_ends, -t)
+                    found.extend(iv[2] for iv in node.by_end[:count_gt])
+                    node = node.right if t > node.center else None
+        return found
+    
+    def overlap(self, lo: float, hi: float) -> List[int]:
+        """Items whose interval meets ``[lo, hi]`` (end >= lo and start <= hi)."""
+        found = []
+        stack = list(self._built_trees())
+        while stack:
+            node = stack.pop()
+            if hi < node.center:
+                found.extend(iv[2] for iv in node.by_start[:self._count_le(node.starts, hi)])
+                if node.left:
+                    stack.append(node.left)
+            elif lo > node.center:
+                count_ge = self._count_le(node.neg_ends, -lo)
+                found.extend(iv[2] for iv in node.by_end[:count_ge])
+                if node.right:
+                    stack.append(node.right)
+            else:
+                found.extend(iv[2] for iv in node.by_start)
+                stack.extend(child for child in (node.left, node.right) if child)
+        return found
+    
+    def _built_trees(self) -> List[_IntervalNode]:
+        """Trees for all non-empty levels, building any that are missing."""
+        for level, intervals in enumerate(self._levels):
+            if intervals and self._trees[level] is None:
+                self._trees[level] = _IntervalNode(intervals)
+        return [tree for tree in self._trees if tree is not None]
+    
+    @staticmethod
+    def _count_le(values: List[float], x: float) -> int:
+        """Number of entries <= x in an ascending list."""
+        return bisect_right(values, x)
+
+
+def _timestamp(value: Any) -> float:
+    """Seconds since the epoch; naive datetimes are treated as UTC."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
 
 
 class TemporalKnowledgeGraph(PropertyGraph):
-    """Property graph with temporal validity for facts."""
+    """Property graph with temporal validity for facts.
+    
+    Validity periods are kept as numeric intervals in an ``IntervalIndex``
+    per relationship type, so ``query_at_time`` and ``query_time_range``
+    touch only the matching edges. ``iter_snapshots`` replays the changes.
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self.validity_index: Dict[str, IntervalIndex] = {}  # type -> intervals
     
     def create_temporal_relationship(
         self, 
@@ -248,138 +1676,522 @@ class TemporalKnowledgeGraph(PropertyGraph):
         properties: Dict = None
     ) -> str:
         """Create relationship with temporal validity."""
-        edge_id = super().create_relationship(
-            source_id, rel_type, target_id, properties
-        )
-        
-        # Add temporal properties
-        self.edges[edge_id]["valid_from"] = valid_from.isoformat()
-        self.edges[edge_id]["valid_until"] = (
-            valid_until.isoformat() if valid_until else None
-        )
-        
-        return edge_id
+        return self._create_edge(source_id, rel_type, target_id, properties, {
+            "valid_from": valid_from.isoformat(),
+            "valid_until": valid_until.isoformat() if valid_until else None
+        })
     
     def query_at_time(self, query: Dict, query_time: datetime) -> List[Dict]:
         """Query graph state at specific time."""
-        results = []
-        
-        # Get base query results
-        base_results = self.query(query)
-        
-        for result in base_results:
-            edge = result["edge"]
-            valid_from = datetime.fromisoformat(edge.get("valid_from", "1970-01-01"))
-            valid_until = edge.get("valid_until")
-            
-            # Check temporal validity
-            if valid_from <= query_time:
-                if valid_until is None or datetime.fromisoformat(valid_until) > query_time:
-                    results.append({
-                        **result,
-                        "valid_from": valid_from,
-                        "valid_until": valid_until
-                    })
+        if "type" not in query:
+            return []
         
-        return results
+        intervals = self.validity_index.get(query["type"])
+        if intervals is None:
+            return []
+        return self._temporal_results(query, intervals.stab(_timestamp(query_time)))
     
     def query_time_range(self, query: Dict, 
                          start_time: datetime, 
                          end_time: datetime) -> List[Dict]:
         """Query facts valid during time range."""
+        if "type" not in query:
+            return []
+        
+        intervals = self.validity_index.get(query["type"])
+        if intervals is None:
+            return []
+        return self._temporal_results(
+            query, intervals.overlap(_timestamp(start_time), _timestamp(end_time))
+        )
+    
+    def iter_snapshots(self, rel_types: Optional[List[str]] = None,
+                       start_time: Optional[datetime] = None,
+                       end_time: Optional[datetime] = None) -> Iterator[Dict]:
+        """Replay validity changes in time order.
+        
+        Yields ``{"time", "added", "removed", "active"}`` for every instant
+        at which some edge becomes valid or stops being valid. ``active`` is
+        the live set of edge ids valid as of that instant; copy it to keep it.
+        Changes before ``start_time`` are folded into the first snapshot.
+        """
+        events = []  # (timestamp, is_start, edge_id)
+        for rel_type, intervals in self.validity_index.items():
+            if rel_types and rel_type not in rel_types:
+                continue
+            edge_ids = self.edge_index[rel_type]
+            for start, end, position in intervals.intervals():
+                if end <= start or edge_ids[position] not in self.edges:
+                    continue  # never valid, or removed
+                events.append((start, 1, edge_ids[position]))
+                if end != float("inf"):
+                    events.append((end, 0, edge_ids[position]))
+        events.sort()
+        
+        lo = _timestamp(start_time) if start_time else float("-inf")
+        hi = _timestamp(end_time) if end_time else float("inf")
+        active = set()
+        i = 0
+        while i < len(events) and events[i][0] <= hi:
+            moment = max(events[i][0], lo)
+            added, removed = [], []
+            while i < len(events) and max(events[i][0], lo) == moment and events[i][0] <= hi:
+                _, is_start, edge_id = events[i]
+                if is_start:
+                    active.add(edge_id)
+                    added.append(edge_id)
+                else:
+                    active.discard(edge_id)
+                    removed.append(edge_id)
+                i += 1
+            # Only the folded first snapshot can add and remove the same edge
+            transient = set(added) & set(removed)
+            yield {
+                "time": datetime.fromtimestamp(moment, timezone.utc).replace(tzinfo=None),
+                "added": [self.edges[eid] for eid in added if eid not in transient],
+                "removed": [self.edges[eid] for eid in removed if eid not in transient],
+                "active": active
+            }
+    
+    def _temporal_results(self, query: Dict, positions: List[int]) -> List[Dict]:
+        """Build query results for matching positions, in creation order."""
         results = []
+        edge_ids = self.edge_index[query["type"]]
+        for position in sorted(positions):
+            edge = self.edges.get(edge_ids[position])
+            match = None if edge is None else self._match_edge(edge, query)
+            if match is not None:
+                edge = match["edge"]
+                results.append({
+                    **match,
+                    "valid_from": datetime.fromisoformat(edge.get("valid_from", "1970-01-01")),
+                    "valid_until": edge.get("valid_until")
+                })
+        return results
+    
+    def _index_edge(self, edge: Dict):
+        """Also record the edge's validity interval under its type."""
+        super()._index_edge(edge)
+        
+        if edge["type"] not in self.validity_index:
+            self.validity_index[edge["type"]] = IntervalIndex()
+        self.validity_index[edge["type"]].add(
+            *self._validity(edge), len(self.edge_index[edge["type"]]) - 1
+        )
+    
+    def _compact_edge_type(self, rel_type: str):
+        """Also renumber the type's validity intervals to the new positions."""
+        super()._compact_edge_type(rel_type)
         
-        base_results = self.query(query)
+        intervals = IntervalIndex()
+        for position, edge_id in enumerate(self.edge_index[rel_type]):
+            intervals.add(*self._validity(self.edges[edge_id]), position)
+        self.validity_index[rel_type] = intervals
+    
+    @staticmethod
+    def _validity(edge: Dict) -> Tuple[float, float]:
+        """Numeric ``[start, end)`` of an edge's validity."""
+        valid_until = edge.get("valid_until")
+        return (_timestamp(edge.get("valid_from", "1970-01-01")),
+                _timestamp(valid_until) if valid_until else float("inf"))
+
+
+# Concurrency
+
+class ReadWriteLock:
+    """Writer-preferring readers-writer lock.
+    
+    Any number of readers may hold the lock together; a writer waits for
+    them to drain and blocks new readers while it waits. Not reentrant.
+    """
+    
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+    
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+    
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class _NoLock:
+    """Stand-in for ReadWriteLock when concurrent access is not enabled."""
+    
+    def read(self):
+        return nullcontext()
+    
+    def write(self):
+        return nullcontext()
+
+
+class MemoryConsolidator:
+    """Incremental, time-sliced consolidation of an IntegratedMemorySystem.
+    
+    Each ``tick`` scans vector-store rows in batches from a cursor that
+    wraps around, for up to half of ``budget_ms``. It deletes facts whose
+    ``valid_until`` has passed and later near-duplicates of an earlier fact
+    (same entity, session and ``valid_until``, cosine similarity of at
+    least ``similarity_threshold``), comparing each row with at most
+    ``duplicate_window`` of the entity's closest earlier rows, so a tick's
+    cost does not grow with the entity's history. The budget is checked
+    after every row. Once ``compact_ratio`` of the rows are tombstones
+    the store is compacted.
+    
+    The rest of the budget walks the graph one source node at a time from
+    a second cursor, removing relationships whose fact has expired
+    (``expires_at``, set by ``store_fact``) and repeats of an identical
+    earlier relationship (same type, target, properties and validity).
+    
+    Batches are scanned, and the compacted copy built, under the read
+    lock; deletes and the swap to the compacted copy take short write
+    locks, so retrieval keeps running.
+    """
+    
+    def __init__(self, system: "IntegratedMemorySystem",
+                 similarity_threshold: float = 0.95, batch_size: int = 256,
+                 budget_ms: float = 20.0, compact_ratio: float = 0.25,
+                 duplicate_window: int = 256, now=datetime.now):
+        self.system = system
+        self.similarity_threshold = similarity_threshold
+        self.batch_size = batch_size
+        self.budget_ms = budget_ms
+        self.compact_ratio = compact_ratio
+        self.duplicate_window = duplicate_window
+        self.now = now
+        self.totals = {"scanned": 0, "expired": 0, "merged": 0, "compacted": 0,
+                       "edges_expired": 0, "edges_merged": 0}
+        
+        self._cursor = 0  # next row to scan
+        self._graph_nodes: List[str] = []  # source nodes of the current graph pass
+        self._graph_cursor = 0  # next of those to scan
+        self._mutex = threading.Lock()  # one tick at a time
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def tick(self, budget_ms: Optional[float] = None) -> Dict[str, int]:
+        """Run one bounded consolidation step and return what it did."""
+        stats = dict.fromkeys(self.totals, 0)
+        budget = (budget_ms or self.budget_ms) / 1000
+        deadline = time.perf_counter() + budget
+        rows_deadline = deadline - budget / 2
+        lock = self.system._lock
         
-        for result in base_results:
-            edge = result["edge"]
-            valid_from = datetime.fromisoformat(edge.get("valid_from", "1970-01-01"))
-            valid_until = edge.get("valid_until")
+        with self._mutex:
+            while True:
+                with lock.read():
+                    store = self.system.vector_store
+                    size = len(store)
+                    if self._cursor >= size:
+                        self._cursor = 0
+                    start, end = self._cursor, min(self._cursor + self.batch_size, size)
+                    expired, merged, end = self._scan(store, start, end, rows_deadline)
+                
+                if expired or merged:
+                    with lock.write():
+                        if store is self.system.vector_store:
+                            stats["expired"] += store.delete(expired)
+                            stats["merged"] += store.delete(merged)
+                
+                stats["scanned"] += end - start
+                self._cursor = end
+                if stats["scanned"] >= size or time.perf_counter() >= rows_deadline:
+                    break
             
-            # Check if overlaps with query range
-            until_dt = datetime.fromisoformat(valid_until) if valid_until else datetime.max
+            with lock.read():
+                graph = self.system.graph
+                expired_edges, merged_edges = self._scan_graph(graph, deadline)
+            if expired_edges or merged_edges:
+                with lock.write():
+                    if graph is self.system.graph:
+                        stats["edges_expired"] += graph.delete_relationships(expired_edges)
+                        stats["edges_merged"] += graph.delete_relationships(merged_edges)
             
-            if until_dt >= start_time and valid_from <= end_time:
-                results.append({
-                    **result,
-                    "valid_from": valid_from,
-                    "valid_until": valid_until
-                })
+            if store.deleted_count and store.deleted_count >= self.compact_ratio * len(store):
+                # Build the compacted copy while searches continue, then
+                # hold the write lock only to swap it in
+                with lock.read():
+                    plan = store._prepare_compaction()
+                with lock.write():
+                    if store is self.system.vector_store:
+                        stats["compacted"] = store._apply_compaction(plan)
+                    elif plan is not None:
+                        store._discard_compaction(plan)
+                self._cursor = 0
         
-        return results
+        for key, value in stats.items():
+            self.totals[key] += value
+        return stats
+    
+    def start(self, interval: float = 1.0):
+        """Call ``tick`` every ``interval`` seconds on a daemon thread."""
+        if not isinstance(self.system._lock, ReadWriteLock):
+            raise ValueError(
+                "Background consolidation needs IntegratedMemorySystem(concurrent=True)"
+            )
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,),
+                                        name="memory-consolidator", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Stop the background thread after its current tick."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+    
+    def _run(self, interval: float):
+        while not self._stop.wait(interval):
+            self.tick()
+    
+    def _scan(self, store: VectorStore, start: int, end: int,
+              deadline: float) -> Tuple[List[int], List[int], int]:
+        """Rows in ``[start, end)`` that have expired or duplicate an earlier row.
+        
+        Stops early once ``deadline`` passes, always after at least one row;
+        the third value is the row the scan stopped before.
+        """
+        now = _timestamp(self.now())
+        expired, merged = [], []
+        dropped = set()
+        for row in range(start, end):
+            if row > start and time.perf_counter() >= deadline:
+                return expired, merged, row
+            if not np.isfinite(store._norms[row]):
+                continue
+            metadata = store.metadata[row]
+            valid_until = metadata.get("valid_until")
+            if valid_until is not None and _timestamp(valid_until) <= now:
+                expired.append(row)
+                dropped.add(row)
+            elif self._duplicate_of(store, row, metadata, dropped) is not None:
+                merged.append(row)
+                dropped.add(row)
+        return expired, merged, end
+    
+    def _scan_graph(self, graph: PropertyGraph, deadline: float) -> Tuple[List[str], List[str]]:
+        """Edges of expired facts and repeats of an earlier identical edge.
+        
+        Walks source nodes from the graph cursor until ``deadline``, always
+        at least one; a new pass starts from the nodes present when it begins.
+        """
+        if self._graph_cursor >= len(self._graph_nodes):
+            self._graph_nodes, self._graph_cursor = list(graph.out_edges), 0
+        
+        now = _timestamp(self.now())
+        expired, merged = [], []
+        first = self._graph_cursor
+        while self._graph_cursor < len(self._graph_nodes):
+            if self._graph_cursor > first and time.perf_counter() >= deadline:
+                break
+            seen = set()
+            for edge_id in graph.out_edges.get(self._graph_nodes[self._graph_cursor], []):
+                edge = graph.edges[edge_id]
+                expires_at = edge.get("expires_at")
+                if expires_at is not None and _timestamp(expires_at) <= now:
+                    expired.append(edge_id)
+                    continue
+                key = json.dumps({k: v for k, v in edge.items() if k not in ("id", "created_at")},
+                                 sort_keys=True, default=str)
+                if key in seen:
+                    merged.append(edge_id)
+                else:
+                    seen.add(key)
+            self._graph_cursor += 1
+        return expired, merged
+    
+    def _duplicate_of(self, store: VectorStore, row: int, metadata: Dict,
+                      dropped: set) -> Optional[int]:
+        """An earlier live row this one can be merged into, if any."""
+        entity = metadata.get("entity")
+        if entity is None:
+            return None
+        
+        # Entity postings are ascending, so earlier rows are a prefix; only
+        # the last duplicate_window of them are compared
+        postings = store.entity_index.get(entity, [])
+        stop = bisect_left(postings, row)
+        peers = store._live(np.asarray(postings[max(stop - self.duplicate_window, 0):stop],
+                                       dtype=np.int64))
+        if len(peers) == 0:
+            return None
+        
+        scores = store._cosine_scores(store._matrix[row], peers)
+        for j in np.flatnonzero(scores >= self.similarity_threshold).tolist():
+            peer = int(peers[j])
+            other = store.metadata[peer]
+            if (peer not in dropped
+                    and other.get("session_id") == metadata.get("session_id")
+                    and other.get("valid_until") == metadata.get("valid_until")):
+                return peer
+        return None
 
 
 # Memory System Integration
 
 class IntegratedMemorySystem:
-    """Integrated memory system combining vector store and graph."""
+    """Integrated memory system combining vector store and graph.
     
-    def __init__(self):
+    With ``concurrent=True`` every public method runs under a
+    readers-writer lock: searches from many threads proceed in parallel
+    while writers append one at a time. Pass ``session_id`` per call when
+    several agent sessions share one system.
+    
+    ``consolidate`` runs one bounded ``MemoryConsolidator`` step;
+    ``start_consolidation`` keeps doing so on a background thread.
+    """
+    
+    def __init__(self, concurrent: bool = False):
         self.vector_store = VectorStore()
         self.graph = TemporalKnowledgeGraph()
         self.session_id: str = ""
+        self._lock = ReadWriteLock() if concurrent else _NoLock()
+        self.consolidator = MemoryConsolidator(self)
     
     def start_session(self, session_id: str):
         """Start a new memory session."""
         self.session_id = session_id
     
+    def save(self, path: str):
+        """Persist the vector store and graph under ``path``.
+        
+        Once saved, later calls only append what changed since the last one.
+        """
+        with self._lock.write():
+            self.vector_store.save(os.path.join(path, "vectors"))
+            self.graph.save(os.path.join(path, "graph"))
+    
+    @classmethod
+    def load(cls, path: str, concurrent: bool = False) -> "IntegratedMemorySystem":
+        """Restore a memory system written by ``save``."""
+        system = cls(concurrent=concurrent)
+        system.vector_store = VectorStore.load(os.path.join(path, "vectors"))
+        system.graph = TemporalKnowledgeGraph.load(os.path.join(path, "graph"))
+        return system
+    
     def store_fact(self, fact: str, entity: str, 
                    timestamp: datetime = None, 
-                   relationships: List[Dict] = None):
-        """Store a fact with entity and relationships."""
-        # Store in vector store
-        self.vector_store.add(fact, {
+                   relationships: List[Dict] = None,
+                   session_id: Optional[str] = None,
+                   valid_until: datetime = None):
+        """Store a fact with entity and relationships.
+        
+        A fact with ``valid_until`` is removed by consolidation once it
+        passes; its relationships carry it as ``expires_at`` and go with it.
+        """
+        metadata = {
             "text": fact,
             "entity": entity,
             "valid_from": (timestamp or datetime.now()).isoformat(),
-            "session_id": self.session_id
-        })
+            "session_id": self.session_id if session_id is None else session_id
+        }
+        if valid_until is not None:
+            metadata["valid_until"] = valid_until.isoformat()
+        
+        # Embed outside the lock so writers hold it only to append; the
+        # cache is thread-safe
+        if self.vector_store.embedding_cache is not None:
+            self.vector_store._embed_batch([fact])
         
-        # Create entity node if not exists
-        entity_node = self.graph.get_node(entity)
-        if not entity_node:
-            self.graph.create_node("Entity", {"id": entity, "name": entity})
-        
-        # Create relationships
-        if relationships:
-            for rel in relationships:
-                self.graph.create_relationship(
-                    entity,
-                    rel["type"],
-                    rel["target"],
-                    properties=rel.get("properties", {})
-                )
+        with self._lock.write():
+            # Store in vector store
+            self.vector_store.add(fact, metadata)
+            
+            # Create entity node if not exists, keyed by the entity name so
+            # lookups go straight to its adjacency lists
+            self._ensure_entity(entity)
+            
+            # Create relationships
+            if relationships:
+                for rel in relationships:
+                    self._ensure_entity(rel["target"])
+                    self.graph._create_edge(
+                        entity,
+                        rel["type"],
+                        rel["target"],
+                        properties=rel.get("properties", {}),
+                        fields={"expires_at": metadata["valid_until"]} if valid_until else None
+                    )
+    
+    def _ensure_entity(self, entity: str):
+        if not self.graph.get_node(entity):
+            self.graph.create_node("Entity", {"id": entity, "name": entity},
+                                   node_id=entity)
     
     def retrieve_memories(self, query: str, 
                           entity_filter: str = None,
                           time_filter: Dict = None,
-                          limit: int = 5) -> List[Dict]:
-        """Retrieve memories matching query."""
+                          limit: int = 5,
+                          session_id: Optional[str] = None,
+                          max_relationships: Optional[int] = None,
+                          relationship_depth: int = 1) -> List[Dict]:
+        """Retrieve memories matching query.
+        
+        Hits are enriched with the relationships of their entity, fetched
+        once per distinct entity: at most ``max_relationships`` of them,
+        reaching ``relationship_depth`` hops out. Hits on the same entity
+        share one list.
+        """
         # Vector search
-        filters = {"session_id": self.session_id}
+        filters = {"session_id": self.session_id if session_id is None else session_id}
         if entity_filter:
             filters["entity"] = entity_filter
         
-        results = self.vector_store.search(query, limit=limit, filters=filters)
-        
-        # Enrich with graph relationships
-        for result in results:
-            entity = result["metadata"].get("entity")
-            if entity:
-                result["relationships"] = self.graph.get_relationships(entity)
+        with self._lock.read():
+            results = self.vector_store.search(query, limit=limit, filters=filters)
+            
+            # Enrich with graph relationships, once per distinct entity
+            entities = [result["metadata"].get("entity") for result in results]
+            relationships = self.graph.get_relationships_many(
+                [entity for entity in entities if entity],
+                limit=max_relationships, depth=relationship_depth
+            )
+            for result, entity in zip(results, entities):
+                if entity:
+                    result["relationships"] = relationships[entity]
         
         return results
     
     def retrieve_entity_context(self, entity: str) -> Dict:
         """Retrieve complete context for an entity."""
-        # Get entity node
-        entity_node = self.graph.get_node(entity)
-        
-        # Get relationships
-        relationships = self.graph.get_relationships(entity)
-        
-        # Get vector memories
-        memories = self.vector_store.search_by_entity(entity, limit=10)
+        with self._lock.read():
+            # Get entity node
+            entity_node = self.graph.get_node(entity)
+            
+            # Get relationships
+            relationships = self.graph.get_relationships(entity)
+            
+            # Get vector memories
+            memories = self.vector_store.search_by_entity(entity, limit=10)
         
         return {
             "entity": entity_node,
@@ -387,10 +2199,49 @@ class IntegratedMemorySystem:
             "memories": memories
         }
     
-    def consolidate(self):
-        """Consolidate memories and remove outdated information."""
-        # In production, implement actual consolidation logic
-        # - Merge related facts
-        # - Update validity periods
-        # - Archive obsolete facts
-        pass
+    def consolidate(self, budget_ms: Optional[float] = None) -> Dict[str, int]:
+        """Consolidate memories and remove outdated information.
+        
+        Runs a single step bounded by ``budget_ms``; call it repeatedly (or
+        use ``start_consolidation``) to work through a large store.
+        """
+        return self.consolidator.tick(budget_ms)
+    
+    def start_consolidation(self, interval: float = 1.0):
+        """Consolidate in the background every ``interval`` seconds."""
+        self.consolidator.start(interval)
+    
+    def stop_consolidation(self):
+        """Stop background consolidation."""
+        self.consolidator.stop()
+
+
+class AsyncMemorySystem:
+    """asyncio facade over a concurrent IntegratedMemorySystem.
+    
+    Each call runs in a worker thread so the event loop never blocks on a
+    search or on a writer holding the lock.
+    """
+    
+    def __init__(self, system: Optional[IntegratedMemorySystem] = None, executor=None):
+        self.system = system or IntegratedMemorySystem(concurrent=True)
+        self._executor = executor
+    
+    async def _run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: fn(*args, **kwargs))
+    
+    async def store_fact(self, *args, **kwargs):
+        return await self._run(self.system.store_fact, *args, **kwargs)
+    
+    async def retrieve_memories(self, *args, **kwargs) -> List[Dict]:
+        return await self._run(self.system.retrieve_memories, *args, **kwargs)
+    
+    async def retrieve_entity_context(self, entity: str) -> Dict:
+        return await self._run(self.system.retrieve_entity_context, entity)
+    
+    async def consolidate(self, budget_ms: Optional[float] = None) -> Dict[str, int]:
+        return await self._run(self.system.consolidate, budget_ms)
+    
+    async def save(self, path: str):
+        return await self._run(self.system.save, path)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Degradation Detector Benchmarks
+
+Times the simulated attention analysis on contexts of increasing length:
+the per-position records from ``measure_attention_distribution``, the
+arrays from ``attention_profile`` and the lost-in-middle check over them.
+A second table times the poisoning checks, which scan for every error,
+conflict and hedge marker in one pass, on plain and marker-heavy text.
+The last table compares a full ``analyze`` after every agent turn with an
+incremental session that only processes the appended turn.
+
+Usage:
+    python benchmark_degradation_detector.py
+    python benchmark_degradation_detector.py --tokens 10000 200000 1000000 --chars 500000
+    python benchmark_degradation_detector.py --turns 2000
+"""
+
+import argparse
+import time
+from typing import Dict
+
+import numpy as np
+
+from degradation_detector import (
+    ContextHealthAnalyzer,
+    PoisoningDetector,
+    attention_profile,
+    detect_lost_in_middle,
+    measure_attention_distribution,
+)
+
+PLAIN = "The agent reviewed the retrieved documents and summarized the findings. "
+MARKED = ("The tool call failed with an error, however the retry possibly worked "
+          "but the file was not found. ")
+TURN = ("## Turn {turn}\nThe agent called the search tool. The result was not found, "
+        "so it retried with a broader query and summarized the documents.\n")
+
+
+def time_ms(fn, repeat: int) -> float:
+    begin = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - begin) * 1000 / repeat
+
+
+def run_attention(tokens: int, repeat: int) -> Dict:
+    context_tokens = ["token"] * tokens
+    critical = np.linspace(0, tokens - 1, num=50, dtype=np.int64).tolist()
+    rng = np.random.default_rng(0)
+    profile = attention_profile(tokens, rng)
+
+    row = {
+        "records_ms": time_ms(lambda: measure_attention_distribution(context_tokens, "task", rng), 1),
+        "profile_ms": time_ms(lambda: attention_profile(tokens, rng), repeat),
+        "lost_in_middle_ms": time_ms(lambda: detect_lost_in_middle(critical, profile), repeat),
+    }
+    print(f"{tokens:>10,}  {row['records_ms']:12.2f}  {row['profile_ms']:12.3f}  "
+          f"{row['lost_in_middle_ms']:15.3f}", flush=True)
+    return row
+
+
+def run_poisoning(chars: int, repeat: int) -> Dict:
+    row = {}
+    for name, sentence in (("plain", PLAIN), ("marker-heavy", MARKED)):
+        text = (sentence * (chars // len(sentence) + 1))[:chars]
+        detector = PoisoningDetector()
+        row[name] = {
+            "detect_ms": time_ms(lambda: detector.detect_poisoning(text), repeat),
+            "claims_ms": time_ms(lambda: detector.extract_claims(text), repeat),
+        }
+        detector.claims.clear()
+        print(f"{chars:>10,}  {name:>13}  {row[name]['detect_ms']:10.2f}  "
+              f"{row[name]['claims_ms']:10.2f}", flush=True)
+    return row
+
+
+def run_turns(turns: int, every: int = 100) -> Dict:
+    """Per-turn analysis cost as the context grows, full vs incremental."""
+    full = ContextHealthAnalyzer(seed=0)
+    session = ContextHealthAnalyzer(seed=0).session()
+    context = ""
+    row = {"full_ms": [], "session_ms": []}
+    for turn in range(1, turns + 1):
+        chunk = TURN.format(turn=turn)
+        context += chunk
+        begin = time.perf_counter()
+        session.append(chunk)
+        session_ms = (time.perf_counter() - begin) * 1000
+        if turn % every:
+            continue
+        full_ms = time_ms(lambda: full.analyze(context), 1)
+        row["full_ms"].append(full_ms)
+        row["session_ms"].append(session_ms)
+        print(f"{turn:>10,}  {len(context):>12,}  {full_ms:10.2f}  {session_ms:12.3f}", flush=True)
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark context degradation analysis")
+    parser.add_argument("--tokens", type=int, nargs="+", default=[1_000, 20_000, 200_000])
+    parser.add_argument("--chars", type=int, nargs="+", default=[50_000, 500_000])
+    parser.add_argument("--turns", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'tokens':>10}  {'records ms':>12}  {'profile ms':>12}  {'lost-in-middle':>15}")
+    for tokens in args.tokens:
+        run_attention(tokens, args.repeat)
+
+    print(f"\n{'chars':>10}  {'text':>13}  {'detect ms':>10}  {'claims ms':>10}")
+    for chars in args.chars:
+        run_poisoning(chars, args.repeat)
+
+    print(f"\n{'turn':>10}  {'chars':>12}  {'full ms':>10}  {'session ms':>12}")
+    run_turns(args.turns, every=max(1, args.turns // 5))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Context Builder Benchmarks
+
+Packs a system prompt, a task and hundreds of retrieved documents of
+random size and priority into a budget with each ContextBuilder packing
+strategy. Reports build latency, how much of the budget and of the total
+section value each strategy used, and how many sections it dropped or
+trimmed. A second table times a per-turn rebuild where only a low
+priority history section changes. Before timing, it checks that
+``truncate_message_stream`` keeps the same messages as
+``truncate_messages``, including for budgets of zero or less.
+
+Usage:
+    python benchmark_context_builder.py
+    python benchmark_context_builder.py --documents 200 500 1000 --limit 80000
+"""
+
+import argparse
+import random
+import time
+from typing import Dict, List
+
+from context_manager import (
+    PACKING_STRATEGIES,
+    ContextBuilder,
+    truncate_message_stream,
+    truncate_messages,
+)
+
+
+def make_builder(documents: int, limit: int, seed: int = 0) -> ContextBuilder:
+    rng = random.Random(seed)
+    builder = ContextBuilder(context_limit=limit)
+    builder.add_section("system", "You are a careful agent. " * 200, priority=10,
+                        category="system")
+    builder.add_section("task", "Summarize the findings. " * 40, priority=9,
+                        category="task")
+    for i in range(documents):
+        words = int(rng.lognormvariate(5.5, 0.8))
+        builder.add_section(f"document_{i}", f"doc{i} " * words,
+                            priority=rng.choice([3, 4, 5, 6]), category="retrieved")
+    return builder
+
+
+def check_truncation_parity(trials: int = 200, seed: int = 0):
+    """Streaming and in-memory truncation agree, down to negative budgets."""
+    rng = random.Random(seed)
+    for _ in range(trials):
+        messages = [{"role": rng.choice(["user", "assistant"]),
+                     "content": "word " * rng.randrange(0, 40)}
+                    for _ in range(rng.randrange(0, 30))]
+        if rng.random() < 0.5:
+            messages.insert(0, {"role": "system", "content": "Be brief. " * 5})
+        if rng.random() < 0.3:
+            messages.insert(1, {"role": "assistant", "content": "Summary so far.",
+                                "is_summary": True})
+        for max_tokens in (-50, -1, 0, 1, 25, rng.randrange(0, 600)):
+            assert (list(truncate_message_stream(iter(messages), max_tokens))
+                    == truncate_messages(messages, max_tokens)), max_tokens
+
+
+def time_build(builder: ContextBuilder, strategy: str, repeat: int) -> float:
+    begin = time.perf_counter()
+    for _ in range(repeat):
+        builder._invalidate(0)  # time a full build, not the cached result
+        builder.build(strategy=strategy)
+    return (time.perf_counter() - begin) * 1000 / repeat
+
+
+def run(documents: int, limit: int, repeat: int) -> List[Dict]:
+    builder = make_builder(documents, limit)
+    total_value = sum(builder.section_values().values())
+    print(f"{documents:,} documents, {builder.get_usage_report()['total_tokens']:,} "
+          f"tokens offered for a {limit:,} token budget", flush=True)
+
+    rows = []
+    for strategy in PACKING_STRATEGIES:
+        build_ms = time_build(builder, strategy, repeat)
+        report = builder.get_build_report()
+        row = {"strategy": strategy, "build_ms": build_ms,
+               "utilization": report["utilization"],
+               "value_share": report["value"] / total_value,
+               "dropped": len(report["dropped"]), "trimmed": len(report["trimmed"])}
+        print(f"{strategy:>10}  {build_ms:9.2f}  {row['utilization']:>11.1%}  "
+              f"{row['value_share']:>11.1%}  {row['dropped']:>8}  {row['trimmed']:>8}",
+              flush=True)
+        rows.append(row)
+
+    builder.build(strategy="greedy")
+    begin = time.perf_counter()
+    for turn in range(repeat):
+        builder.add_section("history", f"turn {turn} " * 50, priority=1)
+        builder.build(strategy="greedy")
+    print(f"{'per-turn':>10}  {(time.perf_counter() - begin) * 1000 / repeat:9.2f}  "
+          f"(greedy, only the history section changed)\n", flush=True)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ContextBuilder packing strategies")
+    parser.add_argument("--documents", type=int, nargs="+", default=[100, 300, 1000])
+    parser.add_argument("--limit", type=int, default=80_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    check_truncation_parity()
+    print(f"{'strategy':>10}  {'build ms':>9}  {'utilization':>11}  "
+          f"{'value kept':>11}  {'dropped':>8}  {'trimmed':>8}")
+    for documents in args.documents:
+        run(documents, args.limit, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
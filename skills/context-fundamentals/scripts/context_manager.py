@@ -3,43 +3,46 @@ Context Management Utilities
 
 This module provides utilities for managing context in agent systems.
 
-Note: This module uses simplified estimation functions for demonstration.
-Production systems should use actual tokenizers (tiktoken for OpenAI,
-model-specific tokenizers for other providers) for accurate token counts.
+Token counts come from the shared tokenizer in tokenizer.py: a BPE
+tokenizer when a vocabulary file is configured (see ``VOCAB_ENV``), the
+~4 characters per token heuristic otherwise. Counts are memoized by content
+hash, so rebuilding context from unchanged sections is cheap.
 """
 
-from typing import Dict, List
+from bisect import bisect_left
+from collections import deque
+from itertools import accumulate, count
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 import hashlib
+import json
+
+from tokenizer import count_tokens, get_tokenizer
 
 
 def estimate_token_count(text: str) -> int:
     """
     Estimate token count for text.
     
-    Uses approximation: ~4 characters per token for English.
-    
-    WARNING: This is a rough estimate for demonstration purposes.
-    Production systems should use actual tokenizers:
-    - OpenAI: tiktoken library
-    - Anthropic: Model-specific tokenizers
-    - Other: Provider-specific tokenization
+    Uses the shared tokenizer: BPE when ``CONTEXT_TOKENIZER_VOCAB`` names a
+    vocabulary file (e.g. tiktoken's cl100k_base), otherwise ~4 characters
+    per token. Repeated texts are counted once.
     
-    Actual tokenization varies by:
+    Heuristic counts still vary by:
     - Model architecture
     - Content type (code vs prose)
     - Language (non-English typically has higher token/char ratio)
     """
-    return len(text) // 4
+    return count_tokens(text)
 
 
 def estimate_message_tokens(messages: list) -> int:
     """Estimate token count for message list."""
-    total = 0
-    for msg in messages:
-        content = msg.get("content", "")
-        total += estimate_token_count(content)
-        total += 10  # Overhead for role/formatting
-    return total
+    return sum(_message_cost(msg) for msg in messages)
+
+
+def _message_cost(msg: Dict) -> int:
+    """Tokens for one message, including role/formatting overhead."""
+    return estimate_token_count(msg.get("content", "")) + 10
 
 
 def count_tokens_by_type(context: Dict) -> Dict:
@@ -76,55 +79,186 @@ def count_tokens_by_type(context: Dict) -> Dict:
 
 # Context Builder
 
+PACKING_STRATEGIES = ("greedy", "knapsack", "truncate")
+MAX_VALUE_LEVEL = 64  # default section values stop doubling past this rank
+
+
 class ContextBuilder:
-    """Build context with budget management."""
+    """Build context with budget management.
+    
+    Sections are kept in priority order as they are added, with a running
+    token total. ``build`` caches the assembled context and a checkpoint
+    per section, so after a change it resumes from the first affected
+    section and reuses the assembled prefix before it.
+    
+    When sections do not all fit, ``strategy`` picks how the budget is
+    packed (see ``build``) and ``get_build_report`` lists what was left out.
+    """
     
-    def __init__(self, context_limit: int = 100000):
+    def __init__(self, context_limit: int = 100000, strategy: str = "greedy",
+                 knapsack_resolution: int = 512, knapsack_core: int = 32):
+        if strategy not in PACKING_STRATEGIES:
+            raise ValueError(f"Unknown packing strategy: {strategy}")
         self.context_limit = context_limit
-        self.sections: Dict[str, str] = {}
+        self.strategy = strategy
+        self.knapsack_resolution = knapsack_resolution
+        self.knapsack_core = knapsack_core
+        self.sections: Dict[str, Dict] = {}
         self.order: List[str] = []
+        
+        # Sections sorted by (-priority, insertion position)
+        self._keys: List[Tuple[int, int]] = []
+        self._ranked: List[str] = []
+        self._positions: Dict[str, int] = {}  # name -> insertion position
+        self._next_position = count()
+        self._total_tokens = 0
+        
+        # Last build: limit, assembled text, and for each ranked position
+        # the (tokens, characters, parts) assembled before it; knapsack and
+        # truncate builds record their selection instead
+        self._built_limit: Optional[int] = None
+        self._built_strategy: Optional[str] = None
+        self._selected: List[str] = []
+        self._trimmed: Dict[str, Tuple[str, int]] = {}  # name -> (kept content, tokens)
+        self._assembled = ""
+        self._checkpoints: List[Tuple[int, int, int]] = [(0, 0, 0)]
+        self._dirty_from: Optional[int] = 0
     
     def add_section(self, name: str, content: str, 
-                    priority: int = 0, category: str = "other"):
-        """Add section to context."""
+                    priority: int = 0, category: str = "other",
+                    value: Optional[float] = None):
+        """Add section to context.
+        
+        ``value`` weighs the section for knapsack packing; without one it
+        is derived from ``priority`` when packing (see ``section_values``).
+        """
         if name not in self.sections:
             self.order.append(name)
+            self._positions[name] = next(self._next_position)
+        else:
+            self._unrank(name)
         
         self.sections[name] = {
             "content": content,
             "priority": priority,
             "category": category,
-            "tokens": estimate_token_count(content)
+            "tokens": estimate_token_count(content),
+            "value": value
         }
-    
-    def build(self, max_tokens: int = None) -> str:
-        """Build context within token limit."""
+        self._total_tokens += self.sections[name]["tokens"]
+        
+        key = (-priority, self._positions[name])
+        rank = bisect_left(self._keys, key)
+        self._keys.insert(rank, key)
+        self._ranked.insert(rank, name)
+        self._invalidate(rank)
+    
+    def remove_section(self, name: str):
+        """Remove a section from the context."""
+        self._unrank(name)
+        del self.sections[name]
+        del self._positions[name]
+        self.order.remove(name)
+    
+    def build(self, max_tokens: int = None, strategy: str = None) -> str:
+        """Build context within token limit.
+        
+        ``strategy`` (default ``self.strategy``) decides what happens when
+        the sections do not all fit:
+        
+        - ``"greedy"``: take sections in priority order, skipping any that
+          no longer fit
+        - ``"knapsack"``: take the set with the highest total value (see
+          ``section_values``; approximately, see ``_pack_knapsack``), then
+          fill what is left greedily
+        - ``"truncate"``: take sections in priority order and cut the first
+          one that does not fit down to the remaining budget
+        
+        Included sections always appear in priority order.
+        """
         limit = max_tokens or self.context_limit
+        strategy = strategy or self.strategy
+        if strategy not in PACKING_STRATEGIES:
+            raise ValueError(f"Unknown packing strategy: {strategy}")
+        if (limit, strategy) != (self._built_limit, self._built_strategy):
+            self._invalidate(0)
+        if self._dirty_from is None:
+            return self._assembled
         
-        # Sort by priority (higher first)
-        sorted_sections = sorted(
-            self.order,
-            key=lambda n: self.sections[n]["priority"],
-            reverse=True
-        )
+        if strategy == "greedy":
+            self._build_greedy(limit)
+        else:
+            if strategy == "knapsack":
+                self._selected, self._trimmed = self._pack_knapsack(limit), {}
+            else:
+                self._selected, self._trimmed = self._pack_truncate(limit)
+            self._assembled = "\n\n".join(
+                self._trimmed[name][0] if name in self._trimmed
+                else self.sections[name]["content"]
+                for name in self._selected
+            )
+            del self._checkpoints[1:]
         
-        # Build context
-        context_parts = []
-        current_tokens = 0
+        self._built_limit, self._built_strategy = limit, strategy
+        self._dirty_from = None
+        return self._assembled
+    
+    def section_values(self) -> Dict[str, float]:
+        """Knapsack value of each section.
         
-        for name in sorted_sections:
+        Sections without an explicit ``value`` are worth twice one at the
+        next lower priority in use: ``2 ** level``, where ``level`` counts
+        the distinct priorities below theirs, capped at ``MAX_VALUE_LEVEL``
+        so that any priority gives a finite value.
+        """
+        values, level, previous = {}, -1, None
+        for name in reversed(self._ranked):
             section = self.sections[name]
-            section_tokens = section["tokens"]
-            
-            if current_tokens + section_tokens <= limit:
-                context_parts.append(section["content"])
-                current_tokens += section_tokens
+            if section["priority"] != previous:
+                level, previous = level + 1, section["priority"]
+            values[name] = (2.0 ** min(level, MAX_VALUE_LEVEL)
+                            if section["value"] is None else section["value"])
+        return values
+    
+    def get_build_report(self) -> Dict:
+        """What the last ``build`` included, dropped and trimmed.
+        
+        If sections changed since, the build is redone with the same
+        limit and strategy first.
+        """
+        if self._built_strategy is None:
+            raise ValueError("build() has not been called yet")
+        if self._dirty_from is not None:
+            self.build(self._built_limit, self._built_strategy)
+        
+        if self._built_strategy == "greedy":
+            included = [name for name, before, after in zip(
+                self._ranked, self._checkpoints, self._checkpoints[1:]
+            ) if after[2] > before[2]]
+        else:
+            included = self._selected
+        chosen = set(included)
+        values = self.section_values()
         
-        return "\n\n".join(context_parts)
+        used = sum(self._trimmed[name][1] if name in self._trimmed
+                   else self.sections[name]["tokens"] for name in included)
+        return {
+            "strategy": self._built_strategy,
+            "limit": self._built_limit,
+            "used_tokens": used,
+            "utilization": used / self._built_limit,
+            "value": sum(values[name] for name in included),
+            "included": included,
+            "dropped": [name for name in self._ranked if name not in chosen],
+            "trimmed": {
+                name: {"tokens": self.sections[name]["tokens"], "kept_tokens": tokens}
+                for name, (_, tokens) in self._trimmed.items()
+            }
+        }
     
     def get_usage_report(self) -> Dict:
         """Get current context usage report."""
-        total = sum(s["tokens"] for s in self.sections.values())
+        total = self._total_tokens
         return {
             "total_tokens": total,
             "limit": self.context_limit,
@@ -136,6 +270,127 @@ class ContextBuilder:
             "status": self._get_status(total)
         }
     
+    def _build_greedy(self, limit: int):
+        """Greedy fill, resumed from the first changed section."""
+        start = self._dirty_from
+        current_tokens, length, included = self._checkpoints[start]
+        del self._checkpoints[start + 1:]
+        context_parts = [self._assembled[:length]] if included else []
+        
+        for name in self._ranked[start:]:
+            section = self.sections[name]
+            section_tokens = section["tokens"]
+            
+            if current_tokens + section_tokens <= limit:
+                length += len(section["content"]) + (2 if included else 0)
+                context_parts.append(section["content"])
+                current_tokens += section_tokens
+                included += 1
+            self._checkpoints.append((current_tokens, length, included))
+        
+        self._assembled = "\n\n".join(context_parts)
+        self._selected, self._trimmed = [], {}
+    
+    def _pack_knapsack(self, limit: int) -> List[str]:
+        """0/1 knapsack over section values, returned in ranked order.
+        
+        Sections are ranked by value per token. Those well inside the
+        budget on that ranking are taken outright, and an exact DP runs only
+        over the ``knapsack_core`` sections either side of where the budget
+        runs out, the only ones an optimal choice normally swaps. Token
+        counts are rounded up to budget units of ``1 / knapsack_resolution``
+        of what is left, so the choice always fits; the budget lost to
+        rounding is then filled greedily.
+        """
+        names = self._ranked
+        if self._total_tokens <= limit:
+            return list(names)
+        
+        sections, values = self.sections, self.section_values()
+        by_density = sorted(
+            (name for name in names if values[name] > 0),
+            key=lambda name: values[name] / max(sections[name]["tokens"], 1),
+            reverse=True
+        )
+        used, split = 0, len(by_density)
+        for i, name in enumerate(by_density):
+            if used + sections[name]["tokens"] > limit:
+                split = i
+                break
+            used += sections[name]["tokens"]
+        
+        first = max(split - self.knapsack_core, 0)
+        chosen = set(by_density[:first])
+        core = by_density[first:split + self.knapsack_core]
+        budget = limit - sum(sections[name]["tokens"] for name in chosen)
+        
+        unit = max(1, -(-budget // self.knapsack_resolution))
+        capacity = budget // unit
+        best = [0.0] * (capacity + 1)  # best value per capacity so far
+        choices = []  # per core section: (units, took-it flags by capacity) or None
+        for name in core:
+            weight, value = -(-sections[name]["tokens"] // unit), values[name]
+            if weight > capacity:
+                choices.append(None)
+                continue
+            if weight == 0:
+                best = [b + value for b in best]
+                choices.append((0, None))
+                continue
+            candidate = [b + value for b in best[:capacity + 1 - weight]]
+            took = [c > b for b, c in zip(best[weight:], candidate)]
+            best[weight:] = [c if t else b for b, c, t in zip(best[weight:], candidate, took)]
+            choices.append((weight, took))
+        
+        remaining = capacity
+        for name, choice in zip(reversed(core), reversed(choices)):
+            if choice is None:
+                continue
+            weight, took = choice
+            if weight == 0 or (remaining >= weight and took[remaining - weight]):
+                chosen.add(name)
+                remaining -= weight
+        
+        used = sum(sections[name]["tokens"] for name in chosen)
+        for name in names:
+            if name not in chosen and used + sections[name]["tokens"] <= limit:
+                chosen.add(name)
+                used += sections[name]["tokens"]
+        return [name for name in names if name in chosen]
+    
+    def _pack_truncate(self, limit: int) -> Tuple[List[str], Dict[str, Tuple[str, int]]]:
+        """Priority order until the budget runs out, trimming the overflow."""
+        selected, trimmed = [], {}
+        current_tokens = 0
+        for name in self._ranked:
+            section = self.sections[name]
+            if current_tokens + section["tokens"] <= limit:
+                selected.append(name)
+                current_tokens += section["tokens"]
+                continue
+            
+            kept = get_tokenizer().truncate(section["content"], limit - current_tokens)
+            if kept:
+                selected.append(name)
+                trimmed[name] = (kept, estimate_token_count(kept))
+            break
+        return selected, trimmed
+    
+    def _unrank(self, name: str):
+        """Take a section out of the priority order and the running total."""
+        section = self.sections[name]
+        key = (-section["priority"], self._positions[name])
+        rank = bisect_left(self._keys, key)
+        del self._keys[rank]
+        del self._ranked[rank]
+        self._total_tokens -= section["tokens"]
+        self._invalidate(rank)
+    
+    def _invalidate(self, rank: int):
+        """Mark the build stale from ranked position ``rank`` onwards."""
+        if self._dirty_from is None or rank < self._dirty_from:
+            self._dirty_from = rank
+    
     def _get_status(self, total: int) -> str:
         """Get status based on utilization."""
         ratio = total / self.context_limit
@@ -160,22 +415,12 @@ def truncate_context(context: str, max_tokens: int,
         preserve_start: If True, preserve beginning; otherwise preserve end
     
     Returns:
-        Truncated context
+        Truncated context, measured with the same tokenizer as the budgets
     """
-    tokens = context.split()
-    current_tokens = len(tokens)
-    
-    if current_tokens <= max_tokens:
+    if estimate_token_count(context) <= max_tokens:
         return context
     
-    if preserve_start:
-        # Keep beginning, truncate end
-        kept = tokens[:max_tokens]
-    else:
-        # Keep end, truncate beginning
-        kept = tokens[-max_tokens:]
-    
-    return " ".join(kept)
+    return get_tokenizer().truncate(context, max_tokens, preserve_start)
 
 
 def truncate_messages(messages: list, max_tokens: int) -> list:
@@ -184,8 +429,13 @@ def truncate_messages(messages: list, max_tokens: int) -> list:
     
     Strategy:
     1. Always keep system prompt
-    2. Keep recent messages
-    3. Summarize older messages if needed
+    2. Keep the latest summary
+    3. Keep the longest run of recent messages that fits the rest
+    
+    The window is found by walking back from the newest message and
+    stops at the first one that does not fit, so only the kept messages
+    (plus one) are costed and they are always a contiguous tail of the
+    conversation.
     """
     system_prompt = None
     recent_messages = []
@@ -201,24 +451,16 @@ def truncate_messages(messages: list, max_tokens: int) -> list:
     
     # Calculate token usage
     tokens_for_system = estimate_token_count(system_prompt["content"]) if system_prompt else 0
-    tokens_for_recent = estimate_message_tokens(recent_messages)
     tokens_for_summary = estimate_token_count(summary["content"]) if summary else 0
-    
     available = max_tokens - tokens_for_system - tokens_for_summary
     
-    # Truncate recent if needed
-    if tokens_for_recent > available:
-        # Keep most recent messages
-        truncated_recent = []
-        current_tokens = 0
-        
-        for msg in reversed(recent_messages):
-            msg_tokens = estimate_token_count(msg.get("content", ""))
-            if current_tokens + msg_tokens <= available:
-                truncated_recent.insert(0, msg)
-                current_tokens += msg_tokens
-        
-        recent_messages = truncated_recent
+    # Longest suffix whose cost fits in the available budget
+    kept = 0
+    for total in accumulate(_message_cost(msg) for msg in reversed(recent_messages)):
+        if total > available:
+            break
+        kept += 1
+    recent_messages = recent_messages[len(recent_messages) - kept:]
     
     result = []
     if system_prompt:
@@ -230,6 +472,55 @@ def truncate_messages(messages: list, max_tokens: int) -> list:
     return result
 
 
+def truncate_message_stream(messages: Iterable[Dict], max_tokens: int) -> Iterator[Dict]:
+    """
+    Streaming variant of ``truncate_messages`` for histories too large to load.
+    
+    Consumes ``messages`` once (e.g. ``iter_jsonl_messages(path)``) and
+    holds only a window of at most ``max_tokens`` recent messages, then
+    yields the same messages ``truncate_messages`` would return.
+    """
+    system_prompt = None
+    summary = None
+    window: deque = deque()  # (message, cost), oldest first
+    window_tokens = 0
+    
+    for msg in messages:
+        if msg["role"] == "system":
+            system_prompt = msg
+        elif msg.get("is_summary"):
+            summary = msg
+        else:
+            cost = _message_cost(msg)
+            window.append((msg, cost))
+            window_tokens += cost
+            while window and window_tokens > max_tokens:
+                window_tokens -= window.popleft()[1]
+    
+    available = max_tokens
+    if system_prompt:
+        available -= estimate_token_count(system_prompt["content"])
+    if summary:
+        available -= estimate_token_count(summary["content"])
+    while window and window_tokens > available:
+        window_tokens -= window.popleft()[1]
+    
+    if system_prompt:
+        yield system_prompt
+    if summary:
+        yield summary
+    for msg, _ in window:
+        yield msg
+
+
+def iter_jsonl_messages(path: str) -> Iterator[Dict]:
+    """Read a history stored as one JSON message per line, lazily."""
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
 # Context Validation
 
 def validate_context_structure(context: Dict) -> Dict:
@@ -4,11 +4,10 @@ Context Optimization Utilities
 This module provides utilities for context compaction, observation masking, and budget management.
 
 PRODUCTION NOTES:
-- Token estimation uses simplified heuristics (~4 chars/token for English).
-  Production systems should use model-specific tokenizers:
-  - OpenAI: tiktoken library
-  - Anthropic: anthropic tokenizer
-  - Local models: HuggingFace tokenizers
+- Token estimation goes through the shared tokenizer in tokenizer.py: BPE
+  from a vocabulary file named by CONTEXT_TOKENIZER_VOCAB (for example
+  tiktoken's cl100k_base), or ~4 chars/token when none is configured.
+  Counts are memoized by content hash.
   
 - Summarization functions use simple heuristics for demonstration.
   Production systems should use:
@@ -16,32 +15,36 @@ PRODUCTION NOTES:
   - Domain-specific summarization models
   - Schema-based summarization for structured outputs
   
-- Cache metrics are illustrative. Production systems should integrate
-  with actual inference infrastructure metrics.
+- Cache metrics come from PrefixCacheSimulator, a block-level model of
+  prompt/KV prefix caching. Real hit rates still depend on the provider's
+  block size, TTL and eviction; calibrate against inference metrics.
 """
 
-from typing import List, Dict
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from itertools import repeat
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple
 import hashlib
+import json
+import os
+import re
 import time
 
+from tokenizer import count_tokens, get_tokenizer
+
 
 def estimate_token_count(text: str) -> int:
     """
     Estimate token count for text.
     
-    Uses approximation: ~4 characters per token for English.
-    
-    WARNING: This is a rough estimate. Actual tokenization varies by:
-    - Model (GPT-5.2, Claude 4.5, Gemini 3 have different tokenizers)
-    - Content type (code typically has higher token density)
-    - Language (non-English may have 2-3x higher token/char ratio)
+    Uses the shared tokenizer: BPE when a vocabulary file is configured,
+    otherwise ~4 characters per token. Repeated texts are counted once.
     
-    Production usage:
-        import tiktoken
-        enc = tiktoken.encoding_for_model("gpt-4")  # Use appropriate model
-        token_count = len(enc.encode(text))
+    Vocabularies are model specific (GPT-5.2, Claude 4.5, Gemini 3 all
+    tokenize differently); point CONTEXT_TOKENIZER_VOCAB at the one that
+    matches the target model, e.g. tiktoken's cl100k_base.tiktoken.
     """
-    return len(text) // 4
+    return count_tokens(text)
 
 
 def estimate_message_tokens(messages: list) -> int:
@@ -60,6 +63,29 @@ def estimate_message_tokens(messages: list) -> int:
 
 # Compaction Functions
 
+# Patterns used by the summarizers, compiled once
+_METRIC_PATTERN = re.compile(r'(\w+):\s*([\d.,]+)')
+_DECISION_PATTERN = re.compile(r'(?i)(?:decided|decision|chose|chosen)[:\s]+([^.]+)')
+_QUESTION_PATTERN = re.compile(r'(?:\?|question)[:\s]+([^.]+)')
+_FINDING_KEYWORDS = ("result", "found", "total", "success", "error", "value")
+
+
+def classify_message(msg: dict) -> str:
+    """Compaction category of a single message."""
+    role = msg.get("role", "user")
+    
+    if role == "system":
+        return "system_prompt"
+    elif "tool_use" in msg.get("type", ""):
+        return "tool_output"
+    elif role == "user":
+        return "conversation"
+    elif "retrieved" in msg.get("tags", []):
+        return "retrieved_document"
+    else:
+        return "other"
+
+
 def categorize_messages(messages: list) -> dict:
     """
     Categorize messages for selective compaction.
@@ -76,19 +102,8 @@ def categorize_messages(messages: list) -> dict:
     }
     
     for msg in messages:
-        role = msg.get("role", "user")
-        content = msg.get("content", "")
-        
-        if role == "system":
-            categories["system_prompt"].append({**msg, "category": "system_prompt"})
-        elif "tool_use" in msg.get("type", ""):
-            categories["tool_output"].append({**msg, "category": "tool_output"})
-        elif role == "user":
-            categories["conversation"].append({**msg, "category": "conversation"})
-        elif "retrieved" in msg.get("tags", []):
-            categories["retrieved_document"].append({**msg, "category": "retrieved_document"})
-        else:
-            categories["other"].append({**msg, "category": "other"})
+        category = classify_message(msg)
+        categories[category].append({**msg, "category": category})
     
     return categories
 
@@ -112,16 +127,15 @@ def summarize_content(content: str, category: str, max_length: int = 500) -> str
 def summarize_tool_output(content: str, max_length: int = 500) -> str:
     """Summarize tool output."""
     # Extract key metrics and findings
-    import re
     
     # Look for metrics (numbers with context)
-    metrics = re.findall(r'(\w+):\s*([\d.,]+)', content)
+    metrics = _METRIC_PATTERN.findall(content)
     
     # Look for key findings (lines with important keywords)
-    keywords = ["result", "found", "total", "success", "error", "value"]
     findings = []
     for line in content.split('\n'):
-        if any(kw in line.lower() for kw in keywords):
+        lowered = line.lower()
+        if any(kw in lowered for kw in _FINDING_KEYWORDS):
             findings.append(line.strip())
     
     summary_parts = []
@@ -137,10 +151,8 @@ def summarize_tool_output(content: str, max_length: int = 500) -> str:
 def summarize_conversation(content: str, max_length: int = 500) -> str:
     """Summarize conversational content."""
     # Identify key decisions and questions
-    import re
-    
-    decisions = re.findall(r'(?i)(?:decided|decision|chose|chosen)[:\s]+([^.]+)', content)
-    questions = re.findall(r'(?:\?|question)[:\s]+([^.]+)', content)
+    decisions = _DECISION_PATTERN.findall(content)
+    questions = _QUESTION_PATTERN.findall(content)
     
     summary_parts = []
     if decisions:
@@ -171,30 +183,107 @@ def summarize_general(content: str, max_length: int = 500) -> str:
     return content[:max_length] + "..." if len(content) > max_length else content
 
 
+def summarize_batch(items: Iterable[Tuple[str, str]], max_length: int = 500,
+                    workers: Optional[int] = None, chunk_size: int = 64,
+                    executor: Optional[Executor] = None) -> List[str]:
+    """
+    Summarize many ``(content, category)`` pairs across a process pool.
+    
+    Items go to the workers in chunks of ``chunk_size`` and the summaries
+    come back in input order, exactly as ``summarize_content`` would produce
+    them one at a time. Pass an ``executor`` to reuse one pool across
+    batches; ``workers=1`` (or a batch smaller than one chunk) runs inline.
+    """
+    items = list(items)
+    if executor is None and (workers == 1 or len(items) <= chunk_size):
+        return _summarize_chunk(items, max_length)
+    
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return summarize_batch(items, max_length, chunk_size=chunk_size, executor=pool)
+    
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    results = executor.map(_summarize_chunk, chunks, repeat(max_length))
+    return [summary for chunk in results for summary in chunk]
+
+
+def _summarize_chunk(chunk: List[Tuple[str, str]], max_length: int) -> List[str]:
+    return [summarize_content(content, category, max_length) for content, category in chunk]
+
+
 # Observation Masking
 
 class ObservationStore:
-    def __init__(self, max_size=1000):
-        self.observations = {}
-        self.order = []
+    """
+    Content-addressed store for masked observations.
+    
+    Reference IDs are a hash of the full content, so storing the same tool
+    output twice keeps one copy and returns the same reference. Entries sit
+    in an ordered map in least-recently-used order and are evicted from
+    the front once there are more than ``max_size`` of them or their
+    content exceeds ``max_bytes``.
+    
+    With ``spill_dir`` set, evicted observations, and any observation
+    larger than ``spill_threshold`` bytes, are written there instead of
+    being dropped, so they leave the heap but stay retrievable by ID. A new
+    store pointed at an existing ``spill_dir`` can retrieve what an earlier
+    one spilled there. Without one, an observation larger than
+    ``max_bytes`` cannot be kept and ``store`` raises ``ValueError``.
+    """
+    
+    def __init__(self, max_size: int = 1000, max_bytes: int = 64 * 1024 * 1024,
+                 spill_dir: Optional[str] = None,
+                 spill_threshold: Optional[int] = None):
+        self.observations: "OrderedDict[str, Dict]" = OrderedDict()
         self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.spill_threshold = spill_threshold
+        self.spilled: Dict[str, Dict] = {}  # ref_id -> entry without content
+        self.total_bytes = 0
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
     
     def store(self, content: str, metadata: dict = None) -> str:
         """Store observation and return reference ID."""
-        ref_id = self._generate_ref_id(content)
+        data = content.encode("utf-8")
+        ref_id = self._generate_ref_id(data)
+        now = time.time()
+        
+        if ref_id in self.observations:
+            self.observations[ref_id]["last_accessed"] = now
+            self.observations.move_to_end(ref_id)
+            return ref_id
+        if ref_id in self.spilled or self._load_spilled(ref_id):
+            self.spilled[ref_id]["last_accessed"] = now
+            return ref_id
+        if not self.spill_dir and len(data) > self.max_bytes:
+            raise ValueError(
+                f"Observation of {len(data)} bytes exceeds max_bytes={self.max_bytes}; "
+                f"set spill_dir to keep it on disk"
+            )
         
-        self.observations[ref_id] = {
-            "content": content,
+        entry = {
             "metadata": metadata or {},
-            "stored_at": time.time(),
-            "last_accessed": time.time()
+            "stored_at": now,
+            "last_accessed": now,
+            "bytes": len(data)
         }
-        self.order.append(ref_id)
+        if self.spill_dir and self.spill_threshold is not None and len(data) > self.spill_threshold:
+            self._spill(ref_id, entry, data)
+            return ref_id
         
-        # Evict oldest if over limit
-        if len(self.order) > self.max_size:
-            oldest = self.order.pop(0)
-            del self.observations[oldest]
+        entry["content"] = content
+        self.observations[ref_id] = entry
+        self.total_bytes += len(data)
+        
+        # Evict least recently used while over either limit
+        while self.observations and (len(self.observations) > self.max_size
+                                     or self.total_bytes > self.max_bytes):
+            oldest, evicted = self.observations.popitem(last=False)
+            self.total_bytes -= evicted["bytes"]
+            if self.spill_dir:
+                self._spill(oldest, evicted, evicted.pop("content").encode("utf-8"))
         
         return ref_id
     
@@ -202,9 +291,23 @@ class ObservationStore:
         """Retrieve observation by reference ID."""
         if ref_id in self.observations:
             self.observations[ref_id]["last_accessed"] = time.time()
+            self.observations.move_to_end(ref_id)
             return self.observations[ref_id]["content"]
+        if ref_id in self.spilled or self._load_spilled(ref_id):
+            self.spilled[ref_id]["last_accessed"] = time.time()
+            with open(self._spill_path(ref_id), "rb") as f:
+                return f.read().decode("utf-8")
         return None
     
+    def stats(self) -> dict:
+        """Entry counts and bytes held in memory and on disk."""
+        return {
+            "entries": len(self.observations),
+            "bytes": self.total_bytes,
+            "spilled_entries": len(self.spilled),
+            "spilled_bytes": sum(e["bytes"] for e in self.spilled.values())
+        }
+    
     def mask(self, content: str, max_length: int = 200) -> tuple:
         """
         Mask observation if longer than max_length.
@@ -222,10 +325,34 @@ class ObservationStore:
         masked = f"[Obs:{ref_id} elided. Key: {key_point}. Full content retrievable.]"
         return masked, ref_id
     
-    def _generate_ref_id(self, content: str) -> str:
-        """Generate unique reference ID."""
-        hash_input = f"{content[:100]}{time.time()}"
-        return hashlib.md5(hash_input.encode()).hexdigest()[:8]
+    def _generate_ref_id(self, data: bytes) -> str:
+        """Reference ID derived from the full content."""
+        return hashlib.blake2b(data, digest_size=8).hexdigest()
+    
+    def _spill(self, ref_id: str, entry: dict, data: bytes):
+        """Move an observation's content to the disk tier."""
+        with open(self._spill_path(ref_id), "wb") as f:
+            f.write(data)
+        self.spilled[ref_id] = entry
+    
+    def _spill_path(self, ref_id: str) -> str:
+        return os.path.join(self.spill_dir, f"{ref_id}.obs")
+    
+    def _load_spilled(self, ref_id: str) -> bool:
+        """Register an observation another store spilled to ``spill_dir``."""
+        if not self.spill_dir or os.path.basename(ref_id) != ref_id:
+            return False
+        path = self._spill_path(ref_id)
+        if not os.path.isfile(path):
+            return False
+        stat = os.stat(path)
+        self.spilled[ref_id] = {
+            "metadata": {},
+            "stored_at": stat.st_mtime,
+            "last_accessed": stat.st_mtime,
+            "bytes": stat.st_size
+        }
+        return True
     
     def _extract_key_point(self, content: str) -> str:
         """Extract key point from observation."""
@@ -239,6 +366,107 @@ class ObservationStore:
         return content[:50] + "..."
 
 
+# Streaming Compaction
+
+def classify_stream(messages: Iterable[dict]) -> Iterator[Tuple[str, dict]]:
+    """Pair each message with its category, without copying it."""
+    for msg in messages:
+        yield classify_message(msg), msg
+
+
+def hold_recent(stream: Iterable[Tuple[str, dict]],
+                keep_recent: int) -> Iterator[Tuple[str, dict, bool]]:
+    """Flag messages older than the last ``keep_recent`` for compaction.
+    
+    Holds at most ``keep_recent`` messages, delaying each until it is known
+    whether it falls inside that recent window.
+    """
+    window: deque = deque()
+    for category, msg in stream:
+        window.append((category, msg))
+        if len(window) > keep_recent:
+            yield (*window.popleft(), True)
+    for category, msg in window:
+        yield category, msg, False
+
+
+def mask_stream(stream: Iterable[Tuple[str, dict, bool]], store: ObservationStore,
+                max_length: int = 2000) -> Iterator[Tuple[str, dict, bool]]:
+    """Move old tool outputs longer than ``max_length`` into ``store``."""
+    for category, msg, old in stream:
+        content = msg.get("content", "")
+        if old and category == "tool_output" and isinstance(content, str) and len(content) > max_length:
+            masked, ref_id = store.mask(content, max_length)
+            msg = {**msg, "content": masked, "observation_ref": ref_id, "compacted": True}
+        yield category, msg, old
+
+
+def summarize_stream(stream: Iterable[Tuple[str, dict, bool]],
+                     max_length: int = 500) -> Iterator[Tuple[str, dict, bool]]:
+    """Summarize old messages longer than ``max_length``, except system prompts."""
+    for category, msg, old in stream:
+        content = msg.get("content", "")
+        if (old and category != "system_prompt" and not msg.get("compacted")
+                and isinstance(content, str) and len(content) > max_length):
+            msg = {**msg, "content": summarize_content(content, category, max_length),
+                   "compacted": True}
+        yield category, msg, old
+
+
+def compact_stream(messages: Iterable[dict], store: Optional[ObservationStore] = None,
+                   keep_recent: int = 20, mask_length: int = 2000,
+                   summary_length: int = 500) -> Iterator[dict]:
+    """
+    Lazily compact a message history.
+    
+    Pipeline: classify, hold back the ``keep_recent`` newest messages,
+    mask large old tool outputs into ``store``, summarize other long old
+    messages, then emit in the original order. Only the recent window is
+    held in memory, and unchanged messages are passed through as-is;
+    compacted ones are copies marked ``"compacted": True``.
+    """
+    store = store if store is not None else ObservationStore()
+    stream = hold_recent(classify_stream(messages), keep_recent)
+    stream = mask_stream(stream, store, mask_length)
+    for _, msg, _ in summarize_stream(stream, summary_length):
+        yield msg
+
+
+def iter_jsonl(path: str) -> Iterator[dict]:
+    """Read one JSON message per line, lazily."""
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def compact_jsonl(source: str, destination: str,
+                  store: Optional[ObservationStore] = None, **options) -> dict:
+    """
+    Compact a JSONL transcript into another without loading it.
+    
+    Masked observations spill to ``<destination>.observations/`` unless a
+    ``store`` is given; ``ObservationStore(spill_dir=...)`` on that
+    directory retrieves them by each message's ``observation_ref``.
+    ``options`` are passed to ``compact_stream``. Returns message and byte
+    counts before and after.
+    """
+    if store is None:
+        store = ObservationStore(spill_dir=f"{destination}.observations", spill_threshold=0)
+    
+    stats = {"messages": 0, "compacted": 0,
+             "bytes_in": os.path.getsize(source), "bytes_out": 0}
+    with open(destination, "w") as out:
+        for msg in compact_stream(iter_jsonl(source), store, **options):
+            line = json.dumps(msg) + "\n"
+            out.write(line)
+            stats["messages"] += 1
+            stats["compacted"] += bool(msg.get("compacted"))
+            stats["bytes_out"] += len(line)
+    
+    return stats
+
+
 # Context Budget Management
 
 class ContextBudget:
@@ -312,6 +540,14 @@ class ContextBudget:
 
 # Cache Optimization
 
+# Dynamic values that change between otherwise identical prompts
+_DYNAMIC_PATTERNS = [
+    ("date", re.compile(r'\d{4}-\d{2}-\d{2}'), '[DATE_STABLE]'),
+    ("session", re.compile(r'Session \d+'), 'Session [STABLE]'),
+    ("counter", re.compile(r'\d+/\d+'), '[COUNTER_STABLE]'),
+]
+
+
 def design_stable_prompt(template: str, dynamic_values: dict) -> str:
     """
     Design prompt to maximize KV-cache stability.
@@ -320,26 +556,151 @@ def design_stable_prompt(template: str, dynamic_values: dict) -> str:
     """
     result = template
     
-    # Replace timestamps
-    import re
-    date_pattern = r'\d{4}-\d{2}-\d{2}'
-    result = re.sub(date_pattern, '[DATE_STABLE]', result)
+    # Replace timestamps, session IDs and counters
+    for _, pattern, placeholder in _DYNAMIC_PATTERNS:
+        result = pattern.sub(placeholder, result)
+    
+    return result
+
+
+def find_dynamic_spans(prompt: str) -> List[Dict]:
+    """
+    Locate the dynamic values ``design_stable_prompt`` would replace.
+    
+    Returns spans sorted by position, each with its kind, offsets and text.
+    """
+    spans = []
+    for kind, pattern, _ in _DYNAMIC_PATTERNS:
+        for match in pattern.finditer(prompt):
+            spans.append({"kind": kind, "start": match.start(),
+                          "end": match.end(), "text": match.group()})
+    return sorted(spans, key=lambda span: span["start"])
+
+
+class PrefixCacheSimulator:
+    """
+    Block-level simulation of a prompt/KV prefix cache.
+    
+    Prompts are tokenized with the shared tokenizer (or given as token
+    lists) and cut into ``block_size`` token blocks. Each block is keyed by
+    a hash chained through every block before it, as in paged KV caches,
+    so a block can only be reused when the whole prefix up to it matches.
+    A request reuses its leading run of cached blocks; blocks expire
+    ``ttl`` seconds after their last use and the least recently used are
+    evicted beyond ``capacity_blocks``.
+    
+    Cached tokens are billed at ``cached_token_price`` of the normal
+    price when reporting savings.
+    """
     
-    # Replace session IDs
-    session_pattern = r'Session \d+'
-    result = re.sub(session_pattern, 'Session [STABLE]', result)
+    def __init__(self, block_size: int = 16, ttl: float = 300.0,
+                 capacity_blocks: int = 100_000, cached_token_price: float = 0.1):
+        self.block_size = block_size
+        self.ttl = ttl
+        self.capacity_blocks = capacity_blocks
+        self.cached_token_price = cached_token_price
+        self._blocks: "OrderedDict[bytes, float]" = OrderedDict()  # key -> last use
+        self._clock = 0.0
+    
+    def process(self, prompt, timestamp: Optional[float] = None) -> Dict:
+        """
+        Send one request through the cache and report what it reused.
+        
+        ``prompt`` is a string or a token list. Requests without a
+        ``timestamp`` are taken to arrive one second after the previous.
+        """
+        now = self._clock + 1.0 if timestamp is None else timestamp
+        self._clock = now
+        tokens = get_tokenizer().encode(prompt) if isinstance(prompt, str) else list(prompt)
+        
+        keys, digest = [], b""
+        for start in range(0, len(tokens) - self.block_size + 1, self.block_size):
+            block = tokens[start:start + self.block_size]
+            digest = hashlib.blake2b(digest + repr(block).encode(), digest_size=16).digest()
+            keys.append(digest)
+        
+        reused_blocks = 0
+        for key in keys:
+            last_used = self._blocks.get(key)
+            if last_used is None or now - last_used > self.ttl:
+                break
+            reused_blocks += 1
+        
+        for key in keys:
+            self._blocks[key] = now
+            self._blocks.move_to_end(key)
+        self._evict(now)
+        
+        reused = reused_blocks * self.block_size
+        report = {"tokens": len(tokens), "reused_tokens": reused,
+                  "new_tokens": len(tokens) - reused, "break": None}
+        if reused_blocks < len(keys) and isinstance(prompt, str):
+            report["break"] = self._describe_break(prompt, tokens, reused)
+        return report
+    
+    def simulate(self, requests: Iterable) -> Dict:
+        """
+        Run a request sequence and summarize reuse across it.
+        
+        Each request is a prompt string, a token list, or a dict with
+        ``prompt`` or ``tokens`` and an optional ``timestamp``.
+        """
+        reports = []
+        for request in requests:
+            if isinstance(request, dict):
+                prompt = request["prompt"] if "prompt" in request else request["tokens"]
+                reports.append(self.process(prompt, request.get("timestamp")))
+            else:
+                reports.append(self.process(request))
+        
+        total = sum(r["tokens"] for r in reports)
+        reused = sum(r["reused_tokens"] for r in reports)
+        breaks = Counter(r["break"]["span"]["kind"] for r in reports
+                         if r["break"] and r["break"]["span"])
+        return {
+            "requests": reports,
+            "total_tokens": total,
+            "reused_tokens": reused,
+            "hit_rate": reused / total if total else 0,
+            "cost_savings": reused * (1 - self.cached_token_price) / total if total else 0,
+            "breaks_by_kind": dict(breaks),
+            "recommendations": generate_cache_recommendations(reused, total - reused)
+        }
     
-    # Replace counters
-    counter_pattern = r'\d+/\d+'
-    result = re.sub(counter_pattern, '[COUNTER_STABLE]', result)
+    def _evict(self, now: float):
+        """Drop expired blocks, then least recently used ones over capacity."""
+        while self._blocks:
+            key, last_used = next(iter(self._blocks.items()))
+            if now - last_used <= self.ttl and len(self._blocks) <= self.capacity_blocks:
+                break
+            del self._blocks[key]
     
-    return result
+    def _describe_break(self, prompt: str, tokens: List[bytes], reused: int) -> Dict:
+        """Where the cached prefix ends, and the dynamic span that broke it."""
+        offset = len(b"".join(tokens[:reused]).decode("utf-8", errors="ignore"))
+        block_end = len(b"".join(tokens[:reused + self.block_size]).decode("utf-8", errors="ignore"))
+        span = next((span for span in find_dynamic_spans(prompt)
+                     if span["start"] < block_end and span["end"] > offset), None)
+        return {"offset": offset, "text": prompt[offset:block_end], "span": span}
 
 
-def calculate_cache_metrics(requests: list, cache: dict) -> dict:
+def calculate_cache_metrics(requests: list, cache: dict = None) -> dict:
     """
     Calculate KV-cache hit metrics for request sequence.
+    
+    Requests carrying a ``prompt`` or ``tokens`` are replayed through a
+    ``PrefixCacheSimulator`` (``cache`` may be one to continue from). Older
+    callers passing ``prefix_hash``/``token_count`` requests and a dict of
+    ``hit_ratio`` entries get the previous lookup-based estimate.
     """
+    if requests and all("prompt" in req or "tokens" in req for req in requests):
+        simulator = cache if isinstance(cache, PrefixCacheSimulator) else PrefixCacheSimulator()
+        result = simulator.simulate(requests)
+        result["cache_hits"] = result["reused_tokens"]
+        result["cache_misses"] = result["total_tokens"] - result["reused_tokens"]
+        return result
+    
+    cache = cache or {}
     hits = 0
     misses = 0
     
@@ -0,0 +1,272 @@
+"""
+Tokenizer Utilities
+
+Shared token counting for context management and compaction.
+
+``count_tokens`` uses a byte-level BPE tokenizer when a vocabulary file is
+configured through ``CONTEXT_TOKENIZER_VOCAB`` (a tiktoken-style file with
+one base64 token and its merge rank per line, e.g. ``cl100k_base.tiktoken``)
+and falls back to the ~4 characters per token heuristic otherwise. Counts
+are memoized by content hash, so unchanged sections and messages are never
+re-tokenized.
+
+The same file ships with context-fundamentals and context-optimization so
+each skill's scripts stay self-contained.
+"""
+
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+import base64
+import hashlib
+import heapq
+import os
+import re
+
+VOCAB_ENV = "CONTEXT_TOKENIZER_VOCAB"
+
+# cl100k-style pre-tokenization, with \p{L} and \p{N} spelled in terms of
+# the re module's \w and \d classes
+_WORDS = re.compile(
+    r"(?i:'s|'t|'re|'ve|'m|'ll|'d)"
+    r"|(?:[^\r\n\w]|_)?[^\W\d_]+"
+    r"|\d{1,3}"
+    r"| ?(?:[^\s\w]|_)+[\r\n]*"
+    r"|\s*[\r\n]+"
+    r"|\s+(?!\S)"
+    r"|\s+"
+)
+
+
+class Tokenizer(ABC):
+    """Splits text into tokens; subclasses implement ``encode``."""
+
+    name = "tokenizer"
+    memoize = True  # whether counts are worth caching by content hash
+
+    @abstractmethod
+    def encode(self, text: str) -> List[bytes]:
+        """Tokens of ``text`` as UTF-8 byte strings."""
+
+    def count(self, text: str) -> int:
+        return len(self.encode(text))
+
+    def truncate(self, text: str, max_tokens: int, preserve_start: bool = True) -> str:
+        """Longest prefix (or suffix) of ``text`` that fits in ``max_tokens``."""
+        if max_tokens <= 0:
+            return ""
+        tokens = self.encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        kept = tokens[:max_tokens] if preserve_start else tokens[-max_tokens:]
+        return b"".join(kept).decode("utf-8", errors="ignore")
+
+
+class HeuristicTokenizer(Tokenizer):
+    """About four characters per token; the fallback without a vocabulary."""
+
+    name = "heuristic"
+    memoize = False  # counting is already O(1)
+
+    def __init__(self, chars_per_token: int = 4):
+        self.chars_per_token = chars_per_token
+
+    def encode(self, text: str) -> List[bytes]:
+        step = self.chars_per_token
+        return [text[i:i + step].encode("utf-8")
+                for i in range(0, self.count(text) * step, step)]
+
+    def count(self, text: str) -> int:
+        return len(text) // self.chars_per_token
+
+    def truncate(self, text: str, max_tokens: int, preserve_start: bool = True) -> str:
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        chars = max_tokens * self.chars_per_token
+        return text[:chars] if preserve_start else text[-chars:]
+
+
+class BPETokenizer(Tokenizer):
+    """Byte-level BPE over merge ranks, as in tiktoken vocabularies.
+
+    Text is split into words with a cl100k-style pattern and each distinct
+    word is merged once, then served from a word cache, so long transcripts
+    mostly cost a regex scan and dictionary lookups.
+    """
+
+    name = "bpe"
+
+    def __init__(self, ranks: Dict[bytes, int], cache_size: int = 200_000):
+        self.ranks = ranks
+        self.cache_size = cache_size
+        self._words: Dict[str, Tuple[bytes, ...]] = {}
+
+    @classmethod
+    def from_file(cls, path: str) -> "BPETokenizer":
+        """Load a vocabulary of ``<base64 token> <rank>`` lines."""
+        ranks = {}
+        with open(path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    token, rank = line.split()
+                    ranks[base64.b64decode(token)] = int(rank)
+        return cls(ranks)
+
+    def save(self, path: str):
+        """Write the vocabulary in the format ``from_file`` reads."""
+        with open(path, "wb") as f:
+            for token, rank in sorted(self.ranks.items(), key=lambda item: item[1]):
+                f.write(base64.b64encode(token) + b" " + str(rank).encode() + b"\n")
+
+    @classmethod
+    def train(cls, texts: Iterable[str], vocab_size: int = 8192) -> "BPETokenizer":
+        """Learn merges from sample text, for offline use without a vocabulary.
+
+        Pair counts are updated only for words touched by each merge, and
+        the most frequent pair comes off a heap with stale entries skipped.
+        """
+        words = Counter(word.encode("utf-8") for text in texts
+                        for word in _WORDS.findall(text))
+        ranks = {bytes([b]): b for b in range(256)}
+        splits = {word: [bytes([b]) for b in word] for word in words}
+
+        pairs: Counter = Counter()
+        where: Dict[Tuple[bytes, bytes], set] = {}
+        for word, parts in splits.items():
+            for pair in zip(parts, parts[1:]):
+                pairs[pair] += words[word]
+                where.setdefault(pair, set()).add(word)
+        heap = [(-n, pair) for pair, n in pairs.items()]
+        heapq.heapify(heap)
+
+        while len(ranks) < vocab_size and heap:
+            negative, pair = heapq.heappop(heap)
+            if pairs.get(pair, 0) != -negative or -negative < 2:
+                continue  # stale entry, or nothing left worth merging
+            merged = pair[0] + pair[1]
+            ranks.setdefault(merged, len(ranks))
+
+            changed = set()
+            for word in where.pop(pair, ()):
+                parts, freq = splits[word], words[word]
+                for old in zip(parts, parts[1:]):
+                    pairs[old] -= freq
+                    changed.add(old)
+                splits[word] = parts = cls._apply_merge(parts, pair, merged)
+                for new in zip(parts, parts[1:]):
+                    pairs[new] += freq
+                    where.setdefault(new, set()).add(word)
+                    changed.add(new)
+            for changed_pair in changed:
+                if pairs[changed_pair] > 0:
+                    heapq.heappush(heap, (-pairs[changed_pair], changed_pair))
+                else:
+                    del pairs[changed_pair]
+
+        return cls(ranks)
+
+    def encode(self, text: str) -> List[bytes]:
+        tokens = []
+        for word in _WORDS.findall(text):
+            tokens.extend(self._word_tokens(word))
+        return tokens
+
+    def count(self, text: str) -> int:
+        return sum(len(self._word_tokens(word)) for word in _WORDS.findall(text))
+
+    def _word_tokens(self, word: str) -> Tuple[bytes, ...]:
+        tokens = self._words.get(word)
+        if tokens is None:
+            tokens = self._merge(word.encode("utf-8"))
+            if len(self._words) >= self.cache_size:
+                self._words.clear()
+            self._words[word] = tokens
+        return tokens
+
+    def _merge(self, piece: bytes) -> Tuple[bytes, ...]:
+        """Apply merges to one word, lowest rank first."""
+        if piece in self.ranks:
+            return (piece,)
+        parts = [piece[i:i + 1] for i in range(len(piece))]
+        while len(parts) > 1:
+            best, best_rank = -1, None
+            for i in range(len(parts) - 1):
+                rank = self.ranks.get(parts[i] + parts[i + 1])
+                if rank is not None and (best_rank is None or rank < best_rank):
+                    best, best_rank = i, rank
+            if best_rank is None:
+                break
+            parts[best:best + 2] = [parts[best] + parts[best + 1]]
+        return tuple(parts)
+
+    @staticmethod
+    def _apply_merge(parts: List[bytes], pair: Tuple[bytes, bytes],
+                     merged: bytes) -> List[bytes]:
+        result, i = [], 0
+        while i < len(parts):
+            if i + 1 < len(parts) and parts[i] == pair[0] and parts[i + 1] == pair[1]:
+                result.append(merged)
+                i += 2
+            else:
+                result.append(parts[i])
+                i += 1
+        return result
+
+
+class TokenCounter:
+    """Bounded memo of token counts keyed by a hash of the full content."""
+
+    def __init__(self, tokenizer: Tokenizer, max_entries: int = 50_000):
+        self.tokenizer = tokenizer
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._counts: "OrderedDict[bytes, int]" = OrderedDict()
+
+    def count(self, text: str) -> int:
+        if not self.tokenizer.memoize:
+            return self.tokenizer.count(text)
+
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        tokens = self._counts.get(key)
+        if tokens is not None:
+            self._counts.move_to_end(key)
+            self.hits += 1
+            return tokens
+
+        self.misses += 1
+        tokens = self._counts[key] = self.tokenizer.count(text)
+        if len(self._counts) > self.max_entries:
+            self._counts.popitem(last=False)
+        return tokens
+
+
+_counter: Optional[TokenCounter] = None
+
+
+def get_tokenizer() -> Tokenizer:
+    """The shared tokenizer: BPE from ``$CONTEXT_TOKENIZER_VOCAB`` or the heuristic."""
+    return _shared_counter().tokenizer
+
+
+def set_tokenizer(tokenizer: Tokenizer, max_entries: int = 50_000):
+    """Replace the shared tokenizer (and start a fresh count memo)."""
+    global _counter
+    _counter = TokenCounter(tokenizer, max_entries)
+
+
+def count_tokens(text: str) -> int:
+    """Token count of ``text`` with the shared tokenizer, memoized by content."""
+    return _shared_counter().count(text)
+
+
+def _shared_counter() -> TokenCounter:
+    if _counter is None:
+        path = os.environ.get(VOCAB_ENV)
+        if path and os.path.exists(path):
+            set_tokenizer(BPETokenizer.from_file(path))
+        else:
+            set_tokenizer(HeuristicTokenizer())
+    return _counter
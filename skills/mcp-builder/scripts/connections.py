@@ -1,8 +1,13 @@
 """Lightweight connection handling for MCP servers."""
 
+import asyncio
+import itertools
+import json
+import time
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 from contextlib import AsyncExitStack
-from typing import Any
+from typing import Any, Callable, Iterable
 
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.sse import sse_client
@@ -66,9 +71,22 @@ class MCPConnection(ABC):
 
     async def call_tool(self, tool_name: str, arguments: dict[str, Any]) -> Any:
         """Call a tool on the MCP server with provided arguments."""
-        result = await self.session.call_tool(tool_name, arguments=arguments)
+        result = await self.call_tool_result(tool_name, arguments)
         return result.content
 
+    async def call_tool_result(self, tool_name: str, arguments: dict[str, Any]) -> Any:
+        """Call a tool and return the full result, including its isError flag."""
+        return await self.session.call_tool(tool_name, arguments=arguments)
+
+    async def tool_annotations(self) -> dict[str, dict[str, Any]]:
+        """Retrieve tool annotations (readOnlyHint, idempotentHint, ...) by tool name."""
+        response = await self.session.list_tools()
+        return {
+            tool.name: tool.annotations.model_dump(exclude_none=True)
+            if getattr(tool, "annotations", None) else {}
+            for tool in response.tools
+        }
+
 
 class MCPConnectionStdio(MCPConnection):
     """MCP connection using standard input/output."""
@@ -149,3 +167,376 @@ def create_connection(
 
     else:
         raise ValueError(f"Unsupported transport type: {transport}. Use 'stdio', 'sse', or 'http'")
+
+
+class _PoolSlot:
+    """One pooled connection, entered and exited by its own owner task.
+
+    The MCP client transports run in anyio task groups that must be exited
+    by the task that entered them, so each connection lives inside a task
+    that holds it open until asked to stop.
+    """
+
+    def __init__(self, factory: Callable[[], MCPConnection]):
+        self.factory = factory
+        self.connection = None
+        self.in_flight = 0
+        self.calls = 0
+        self.restarts = 0
+        self.healthy = False
+        self.lock = asyncio.Lock()
+        self._task = None
+        self._stop = None
+
+    async def start(self):
+        """Open a fresh connection and wait until its session is initialized."""
+        self.connection = self.factory()
+        ready = asyncio.get_running_loop().create_future()
+        self._stop = asyncio.Event()
+        self._task = asyncio.create_task(self._hold(self.connection, ready, self._stop))
+        await ready
+        self.healthy = True
+
+    async def stop(self):
+        """Close the connection, waiting for its owner task to exit."""
+        self.healthy = False
+        if self._task:
+            self._stop.set()
+            try:
+                await self._task
+            except Exception:
+                pass  # the connection was already broken
+        self._task = None
+
+    async def restart(self):
+        await self.stop()
+        self.restarts += 1
+        await self.start()
+
+    async def ping(self, timeout: float) -> bool:
+        """Whether the server still answers on this connection."""
+        if not self.healthy or self._task.done():
+            return False
+        try:
+            await asyncio.wait_for(self.connection.session.send_ping(), timeout)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    async def _hold(connection: MCPConnection, ready: asyncio.Future, stop: asyncio.Event):
+        try:
+            async with connection:
+                ready.set_result(None)
+                await stop.wait()
+        except BaseException as e:
+            if not ready.done():
+                if isinstance(e, asyncio.CancelledError):
+                    ready.cancel()
+                else:
+                    ready.set_exception(e)
+            raise
+
+
+class MCPConnectionPool:
+    """Pool of connections to one MCP server for concurrent tool calls.
+
+    Each connection is its own session (a separate stdio subprocess or
+    HTTP/SSE stream), so calls on different connections do not serialize.
+    Calls go to the healthy connection with the fewest calls in flight.
+    A connection whose call fails and then misses a ping is restarted in
+    the background, as are any that fail the periodic health check.
+
+    Exposes ``list_tools`` and ``call_tool`` like ``MCPConnection``.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], MCPConnection],
+        size: int = 4,
+        health_check_interval: float = 30.0,
+        ping_timeout: float = 5.0,
+    ):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.factory = factory
+        self.size = size
+        self.health_check_interval = health_check_interval
+        self.ping_timeout = ping_timeout
+        self._slots = []
+        self._rotation = itertools.count()
+        self._background = set()
+        self._health_task = None
+
+    async def __aenter__(self):
+        """Start all connections concurrently."""
+        self._slots = [_PoolSlot(self.factory) for _ in range(self.size)]
+        results = await asyncio.gather(
+            *(slot.start() for slot in self._slots), return_exceptions=True
+        )
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            await self._close_slots()
+            raise errors[0]
+        if self.health_check_interval:
+            self._health_task = asyncio.create_task(self._health_loop())
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Stop health checks and close every connection."""
+        tasks = list(self._background)
+        if self._health_task:
+            tasks.append(self._health_task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._health_task = None
+        await self._close_slots()
+
+    async def list_tools(self) -> list[dict[str, Any]]:
+        """Retrieve available tools from the MCP server."""
+        return await self._run(lambda connection: connection.list_tools())
+
+    async def call_tool(self, tool_name: str, arguments: dict[str, Any]) -> Any:
+        """Call a tool on the MCP server with provided arguments."""
+        return await self._run(lambda connection: connection.call_tool(tool_name, arguments))
+
+    async def call_tool_result(self, tool_name: str, arguments: dict[str, Any]) -> Any:
+        """Call a tool and return the full result, including its isError flag."""
+        return await self._run(lambda connection: connection.call_tool_result(tool_name, arguments))
+
+    async def tool_annotations(self) -> dict[str, dict[str, Any]]:
+        """Retrieve tool annotations (readOnlyHint, idempotentHint, ...) by tool name."""
+        return await self._run(lambda connection: connection.tool_annotations())
+
+    async def health_check(self) -> int:
+        """Ping every connection and restart those that do not answer.
+
+        Returns the number of connections restarted.
+        """
+        alive = await asyncio.gather(*(slot.ping(self.ping_timeout) for slot in self._slots))
+        dead = [slot for slot, ok in zip(self._slots, alive) if not ok]
+        results = await asyncio.gather(*(self._restart(slot) for slot in dead), return_exceptions=True)
+        return sum(1 for result in results if not isinstance(result, BaseException))
+
+    def stats(self) -> dict[str, Any]:
+        """Per-connection load and restart counts."""
+        return {
+            "size": self.size,
+            "healthy": sum(slot.healthy for slot in self._slots),
+            "in_flight": [slot.in_flight for slot in self._slots],
+            "calls": [slot.calls for slot in self._slots],
+            "restarts": sum(slot.restarts for slot in self._slots),
+        }
+
+    async def _run(self, request: Callable[[MCPConnection], Any]) -> Any:
+        slot = await self._acquire()
+        slot.in_flight += 1
+        slot.calls += 1
+        try:
+            return await request(slot.connection)
+        except Exception:
+            self._spawn(self._check(slot))
+            raise
+        finally:
+            slot.in_flight -= 1
+
+    async def _acquire(self) -> _PoolSlot:
+        """Least-busy healthy connection, rotating between ties."""
+        healthy = [slot for slot in self._slots if slot.healthy]
+        if not healthy:
+            await self.health_check()  # also waits for restarts in progress
+            healthy = [slot for slot in self._slots if slot.healthy]
+            if not healthy:
+                raise ConnectionError("No healthy MCP connections in pool")
+        offset = next(self._rotation) % len(healthy)
+        rotated = healthy[offset:] + healthy[:offset]
+        return min(rotated, key=lambda slot: slot.in_flight)
+
+    async def _check(self, slot: _PoolSlot):
+        """After a failed call, restart the connection if it stopped answering."""
+        if not await slot.ping(self.ping_timeout):
+            await self._restart(slot)
+
+    async def _restart(self, slot: _PoolSlot):
+        """Restart a connection, or wait for a restart already under way."""
+        if slot.lock.locked():
+            async with slot.lock:
+                return
+        async with slot.lock:
+            await slot.restart()
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            await self.health_check()
+
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _close_slots(self):
+        await asyncio.gather(*(slot.stop() for slot in self._slots), return_exceptions=True)
+
+
+class CachedConnection:
+    """Caching wrapper around an MCPConnection or MCPConnectionPool.
+
+    Caches the tool list, and the results of tools marked cacheable, keyed
+    by tool name and canonical JSON arguments. Entries expire after ``ttl``
+    seconds and the least recently used are evicted beyond ``max_entries``.
+    Concurrent identical calls share one request to the server. Tool errors
+    are never cached.
+
+    A tool is cacheable if it is named in ``cacheable_tools`` or, with
+    ``cache_read_only``, if the server annotates it with ``readOnlyHint``.
+    Only cache tools whose results do not depend on when they are called.
+    """
+
+    def __init__(
+        self,
+        connection: Any,
+        cacheable_tools: Iterable[str] = None,
+        cache_read_only: bool = False,
+        ttl: float = 300.0,
+        max_entries: int = 1024,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.connection = connection
+        self.cacheable_tools = set(cacheable_tools or ())
+        self.cache_read_only = cache_read_only
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.tool_list_hits = 0
+        self.tool_list_misses = 0
+        self._results: OrderedDict = OrderedDict()
+        self._pending: dict[tuple[str, str], asyncio.Future] = {}
+        self._tools = None
+        self._read_only = None
+
+    async def __aenter__(self):
+        await self.connection.__aenter__()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return await self.connection.__aexit__(exc_type, exc_val, exc_tb)
+
+    async def list_tools(self) -> list[dict[str, Any]]:
+        """Retrieve available tools, from the cache while it is fresh."""
+        now = self.clock()
+        if self._tools is not None and now - self._tools[0] < self.ttl:
+            self.tool_list_hits += 1
+            return self._tools[1]
+        self.tool_list_misses += 1
+        tools = await self.connection.list_tools()
+        self._tools = (now, tools)
+        return tools
+
+    async def call_tool(self, tool_name: str, arguments: dict[str, Any]) -> Any:
+        """Call a tool, serving cacheable tools from the cache when possible."""
+        if not await self.is_cacheable(tool_name):
+            return await self.connection.call_tool(tool_name, arguments)
+
+        key = (tool_name, json.dumps(arguments, sort_keys=True, separators=(",", ":"), default=str))
+        entry = self._results.get(key)
+        if entry is not None:
+            if self.clock() - entry[0] < self.ttl:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._results[key]
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            result = await self.connection.call_tool_result(tool_name, arguments)
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()  # waiters re-raise it; not an unretrieved error
+            raise
+        finally:
+            del self._pending[key]
+
+        future.set_result(result.content)
+        if not result.isError:
+            self._results[key] = (self.clock(), result.content)
+            if len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+                self.evictions += 1
+        return result.content
+
+    async def is_cacheable(self, tool_name: str) -> bool:
+        """Whether results of ``tool_name`` may be served from the cache."""
+        if tool_name in self.cacheable_tools:
+            return True
+        if not self.cache_read_only:
+            return False
+        if self._read_only is None:
+            annotations = await self.connection.tool_annotations()
+            self._read_only = {
+                name for name, hints in annotations.items() if hints.get("readOnlyHint")
+            }
+        return tool_name in self._read_only
+
+    def clear(self):
+        """Drop every cached tool list and result."""
+        self._results.clear()
+        self._tools = None
+
+    def cache_stats(self) -> dict[str, Any]:
+        """Hit/miss counts for tool results and the tool list."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._results),
+            "evictions": self.evictions,
+            "tool_list_hits": self.tool_list_hits,
+            "tool_list_misses": self.tool_list_misses,
+        }
+
+
+def create_connection_pool(
+    transport: str,
+    size: int = 4,
+    command: str = None,
+    args: list[str] = None,
+    env: dict[str, str] = None,
+    url: str = None,
+    headers: dict[str, str] = None,
+    health_check_interval: float = 30.0,
+) -> MCPConnectionPool:
+    """Factory function to create a pool of MCP connections.
+
+    Args:
+        transport: Connection type ("stdio", "sse", or "http")
+        size: Number of concurrent sessions to open
+        command, args, env, url, headers: As for ``create_connection``
+        health_check_interval: Seconds between pings of every session (0 disables)
+
+    Returns:
+        MCPConnectionPool instance
+    """
+
+    def factory() -> MCPConnection:
+        return create_connection(
+            transport=transport, command=command, args=args, env=env, url=url, headers=headers
+        )
+
+    factory()  # validate the options before any session starts
+    return MCPConnectionPool(factory, size=size, health_check_interval=health_check_interval)
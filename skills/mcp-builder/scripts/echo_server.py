@@ -0,0 +1,37 @@
+"""Minimal local MCP server for exercising the connection helpers.
+
+Run over stdio with ``python echo_server.py``; ``check_pool.py`` starts it
+this way.
+"""
+
+import asyncio
+import os
+import time
+
+from mcp.server.fastmcp import FastMCP
+
+mcp = FastMCP("echo")
+
+
+@mcp.tool()
+async def echo(text: str, delay: float = 0.0) -> str:
+    """Return text after waiting delay seconds, without blocking the server."""
+    await asyncio.sleep(delay)
+    return text
+
+
+@mcp.tool()
+def block(text: str, delay: float = 0.0) -> str:
+    """Return text after blocking the whole server for delay seconds."""
+    time.sleep(delay)
+    return text
+
+
+@mcp.tool()
+def pid() -> int:
+    """Process ID of this server."""
+    return os.getpid()
+
+
+if __name__ == "__main__":
+    mcp.run()
@@ -11,12 +11,14 @@ import sys
 import time
 import traceback
 import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 from typing import Any
 
 from anthropic import Anthropic
 
-from connections import create_connection
+from connections import CachedConnection, create_connection, create_connection_pool
 
 EVALUATION_PROMPT = """You are an AI assistant with access to tools.
 
@@ -83,18 +85,28 @@ def extract_xml_content(text: str, tag: str) -> str | None:
     return matches[-1].strip() if matches else None
 
 
+async def create_message(client: Anthropic, executor: ThreadPoolExecutor | None, **kwargs: Any) -> Any:
+    """Call the blocking Messages API off the event loop, on ``executor`` if given."""
+    if executor is None:
+        return await asyncio.to_thread(client.messages.create, **kwargs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(client.messages.create, **kwargs))
+
+
 async def agent_loop(
     client: Anthropic,
     model: str,
     question: str,
     tools: list[dict[str, Any]],
     connection: Any,
+    executor: ThreadPoolExecutor | None = None,
 ) -> tuple[str, dict[str, Any]]:
     """Run the agent loop with MCP tools."""
     messages = [{"role": "user", "content": question}]
 
-    response = await asyncio.to_thread(
-        client.messages.create,
+    response = await create_message(
+        client,
+        executor,
         model=model,
         max_tokens=4096,
         system=EVALUATION_PROMPT,
@@ -134,8 +146,9 @@ async def agent_loop(
             }]
         })
 
-        response = await asyncio.to_thread(
-            client.messages.create,
+        response = await create_message(
+            client,
+            executor,
             model=model,
             max_tokens=4096,
             system=EVALUATION_PROMPT,
@@ -158,12 +171,13 @@ async def evaluate_single_task(
     tools: list[dict[str, Any]],
     connection: Any,
     task_index: int,
+    executor: ThreadPoolExecutor | None = None,
 ) -> dict[str, Any]:
     """Evaluate a single QA pair with the given tools."""
     start_time = time.time()
 
     print(f"Task {task_index + 1}: Running task with question: {qa_pair['question']}")
-    response, tool_metrics = await agent_loop(client, model, qa_pair["question"], tools, connection)
+    response, tool_metrics = await agent_loop(client, model, qa_pair["question"], tools, connection, executor)
 
     response_value = extract_xml_content(response, "response")
     summary = extract_xml_content(response, "summary")
@@ -190,21 +204,35 @@ REPORT_HEADER = """
 ## Summary
 
 - **Accuracy**: {correct}/{total} ({accuracy:.1f}%)
+- **Failed Tasks**: {failed}
+- **Wall Time**: {wall_time_s:.2f}s ({concurrency} concurrent tasks)
 - **Average Task Duration**: {average_duration_s:.2f}s
+- **Average Queue Wait**: {average_queue_wait_s:.2f}s
 - **Average Tool Calls per Task**: {average_tool_calls:.2f}
 - **Total Tool Calls**: {total_tool_calls}
 
 ---
 """
 
+CACHE_TEMPLATE = """
+## Tool Cache
+
+- **Result Hits**: {hits}/{lookups} ({hit_rate:.1f}%)
+- **Cached Entries**: {entries} ({evictions} evicted)
+- **Tool List Hits**: {tool_list_hits}/{tool_list_lookups}
+
+---
+"""
+
 TASK_TEMPLATE = """
 ### Task {task_num}
 
 **Question**: {question}
 **Ground Truth Answer**: `{expected_answer}`
 **Actual Answer**: `{actual_answer}`
-**Correct**: {correct_indicator}
+**Correct**: {correct_indicator}{error}
 **Duration**: {total_duration:.2f}s
+**Queue Wait**: {queue_wait:.2f}s
 **Tool Calls**: {tool_calls}
 
 **Summary**
@@ -221,8 +249,19 @@ async def run_evaluation(
     eval_path: Path,
     connection: Any,
     model: str = "claude-3-7-sonnet-20250219",
+    concurrency: int = 1,
 ) -> str:
-    """Run evaluation with MCP server tools."""
+    """Run evaluation with MCP server tools.
+
+    Up to ``concurrency`` tasks run at once over the shared connection.
+    Results keep the order of the evaluation file; each records its wall
+    time (``total_duration``) and how long it waited for a free slot
+    (``queue_wait``). A task that raises is scored as failed, with the
+    error in its ``error`` field, and the other tasks carry on.
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+
     print("🚀 Starting Evaluation")
 
     client = Anthropic()
@@ -233,15 +272,43 @@ async def run_evaluation(
     qa_pairs = parse_evaluation_file(eval_path)
     print(f"📋 Loaded {len(qa_pairs)} evaluation tasks")
 
-    results = []
-    for i, qa_pair in enumerate(qa_pairs):
-        print(f"Processing task {i + 1}/{len(qa_pairs)}")
-        result = await evaluate_single_task(client, model, qa_pair, tools, connection, i)
-        results.append(result)
+    semaphore = asyncio.Semaphore(concurrency)
+    start_time = time.time()
+
+    async def run_task(i: int, qa_pair: dict[str, Any], executor: ThreadPoolExecutor) -> dict[str, Any]:
+        async with semaphore:
+            queue_wait = time.time() - start_time
+            print(f"Processing task {i + 1}/{len(qa_pairs)}")
+            task_start = time.time()
+            try:
+                result = await evaluate_single_task(client, model, qa_pair, tools, connection, i, executor)
+            except Exception as e:
+                print(f"Task {i + 1} failed: {type(e).__name__}: {e}")
+                result = {
+                    "question": qa_pair["question"],
+                    "expected": qa_pair["answer"],
+                    "actual": None,
+                    "score": 0,
+                    "total_duration": time.time() - task_start,
+                    "tool_calls": {},
+                    "num_tool_calls": 0,
+                    "summary": None,
+                    "feedback": None,
+                    "error": f"{type(e).__name__}: {e}",
+                }
+        result["queue_wait"] = queue_wait
+        return result
+
+    # One worker thread per concurrent task for the blocking API calls
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = await asyncio.gather(*(run_task(i, qa_pair, executor) for i, qa_pair in enumerate(qa_pairs)))
+    wall_time_s = time.time() - start_time
 
     correct = sum(r["score"] for r in results)
+    failed = sum(1 for r in results if r.get("error"))
     accuracy = (correct / len(results)) * 100 if results else 0
     average_duration_s = sum(r["total_duration"] for r in results) / len(results) if results else 0
+    average_queue_wait_s = sum(r["queue_wait"] for r in results) / len(results) if results else 0
     average_tool_calls = sum(r["num_tool_calls"] for r in results) / len(results) if results else 0
     total_tool_calls = sum(r["num_tool_calls"] for r in results)
 
@@ -249,11 +316,27 @@ async def run_evaluation(
         correct=correct,
         total=len(results),
         accuracy=accuracy,
+        failed=failed,
+        wall_time_s=wall_time_s,
+        concurrency=concurrency,
         average_duration_s=average_duration_s,
+        average_queue_wait_s=average_queue_wait_s,
         average_tool_calls=average_tool_calls,
         total_tool_calls=total_tool_calls,
     )
 
+    if isinstance(connection, CachedConnection):
+        cache = connection.cache_stats()
+        report += CACHE_TEMPLATE.format(
+            hits=cache["hits"],
+            lookups=cache["hits"] + cache["misses"],
+            hit_rate=cache["hit_rate"] * 100,
+            entries=cache["entries"],
+            evictions=cache["evictions"],
+            tool_list_hits=cache["tool_list_hits"],
+            tool_list_lookups=cache["tool_list_hits"] + cache["tool_list_misses"],
+        )
+
     report += "".join([
         TASK_TEMPLATE.format(
             task_num=i + 1,
@@ -261,7 +344,9 @@ async def run_evaluation(
             expected_answer=qa_pair["answer"],
             actual_answer=result["actual"] or "N/A",
             correct_indicator="✅" if result["score"] else "❌",
+            error=f"\n**Error**: {result['error']}" if result.get("error") else "",
             total_duration=result["total_duration"],
+            queue_wait=result["queue_wait"],
             tool_calls=json.dumps(result["tool_calls"], indent=2),
             summary=result["summary"] or "N/A",
             feedback=result["feedback"] or "N/A",
@@ -316,12 +401,23 @@ Examples:
 
   # Evaluate an HTTP MCP server with custom model
   python evaluation.py -t http -u https://example.com/mcp -m claude-3-5-sonnet-20241022 eval.xml
+
+  # Run up to 8 tasks at once
+  python evaluation.py -t stdio -c python -a my_server.py -j 8 eval.xml
+
+  # Run 8 tasks at once over 4 server sessions
+  python evaluation.py -t stdio -c python -a my_server.py -j 8 -p 4 eval.xml
+
+  # Cache results of read-only tools and of search_issues for 10 minutes
+  python evaluation.py -t stdio -c python -a my_server.py --cache-read-only --cache-tools search_issues --cache-ttl 600 eval.xml
         """,
     )
 
     parser.add_argument("eval_file", type=Path, help="Path to evaluation XML file")
     parser.add_argument("-t", "--transport", choices=["stdio", "sse", "http"], default="stdio", help="Transport type (default: stdio)")
     parser.add_argument("-m", "--model", default="claude-3-7-sonnet-20250219", help="Claude model to use (default: claude-3-7-sonnet-20250219)")
+    parser.add_argument("-j", "--concurrency", type=int, default=1, help="Number of tasks to run concurrently (default: 1)")
+    parser.add_argument("-p", "--pool-size", type=int, default=1, help="Number of MCP server sessions to spread tool calls over (default: 1)")
 
     stdio_group = parser.add_argument_group("stdio options")
     stdio_group.add_argument("-c", "--command", help="Command to run MCP server (stdio only)")
@@ -332,6 +428,12 @@ Examples:
     remote_group.add_argument("-u", "--url", help="MCP server URL (sse/http only)")
     remote_group.add_argument("-H", "--header", nargs="+", dest="headers", help="HTTP headers in 'Key: Value' format (sse/http only)")
 
+    cache_group = parser.add_argument_group("cache options")
+    cache_group.add_argument("--cache-tools", nargs="+", default=[], help="Tools whose results may be cached across tasks")
+    cache_group.add_argument("--cache-read-only", action="store_true", help="Also cache tools annotated with readOnlyHint")
+    cache_group.add_argument("--cache-ttl", type=float, default=300.0, help="Seconds a cached result stays valid (default: 300)")
+    cache_group.add_argument("--cache-size", type=int, default=1024, help="Maximum number of cached results (default: 1024)")
+
     parser.add_argument("-o", "--output", type=Path, help="Output file for evaluation report (default: stdout)")
 
     args = parser.parse_args()
@@ -340,27 +442,54 @@ Examples:
         print(f"Error: Evaluation file not found: {args.eval_file}")
         sys.exit(1)
 
+    if args.concurrency < 1:
+        print("Error: --concurrency must be at least 1")
+        sys.exit(1)
+    if args.pool_size < 1:
+        print("Error: --pool-size must be at least 1")
+        sys.exit(1)
+
     headers = parse_headers(args.headers) if args.headers else None
     env_vars = parse_env_vars(args.env) if args.env else None
 
     try:
-        connection = create_connection(
-            transport=args.transport,
-            command=args.command,
-            args=args.args,
-            env=env_vars,
-            url=args.url,
-            headers=headers,
-        )
+        if args.pool_size > 1:
+            connection = create_connection_pool(
+                transport=args.transport,
+                size=args.pool_size,
+                command=args.command,
+                args=args.args,
+                env=env_vars,
+                url=args.url,
+                headers=headers,
+            )
+        else:
+            connection = create_connection(
+                transport=args.transport,
+                command=args.command,
+                args=args.args,
+                env=env_vars,
+                url=args.url,
+                headers=headers,
+            )
     except ValueError as e:
         print(f"Error: {e}")
         sys.exit(1)
 
+    if args.cache_tools or args.cache_read_only:
+        connection = CachedConnection(
+            connection,
+            cacheable_tools=args.cache_tools,
+            cache_read_only=args.cache_read_only,
+            ttl=args.cache_ttl,
+            max_entries=args.cache_size,
+        )
+
     print(f"🔗 Connecting to MCP server via {args.transport}...")
 
     async with connection:
         print("✅ Connected successfully")
-        report = await run_evaluation(args.eval_file, connection, args.model)
+        report = await run_evaluation(args.eval_file, connection, args.model, args.concurrency)
 
         if args.output:
             args.output.write_text(report)
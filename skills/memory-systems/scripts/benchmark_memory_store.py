@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""
+Memory Store Benchmarks
+
+Measures retrieval latency of memory_store.VectorStore at growing corpus
+sizes and checks that the vectorized search returns the same ordering as
+the original per-row scoring loop. Filtered search is timed with an entity
+filter that matches roughly ``size / entities`` rows.
+
+With ``--ann`` it instead sweeps ``nprobe`` on an IVFIndex over clustered
+data and reports recall@limit against the exact path next to latency.
+With ``--cold-start`` it saves each store to a temporary directory and
+times ``VectorStore.load`` together with the heap it allocates. With
+``--graph`` it builds a TemporalKnowledgeGraph with ``--edges`` random
+relationships and times entity-context lookups, traversals, pattern
+matches and point-in-time queries. With ``--concurrency`` it runs a
+mixed read/write load against a concurrent IntegratedMemorySystem from a
+growing number of threads and reports throughput.
+
+Usage:
+    python benchmark_memory_store.py
+    python benchmark_memory_store.py --sizes 10000 100000 1000000 --dimension 128
+    python benchmark_memory_store.py --ann --sizes 1000000 --nlist 1024 --nprobe 1 4 16 64
+    python benchmark_memory_store.py --cold-start --sizes 1000000 --dimension 768
+    python benchmark_memory_store.py --graph --edges 1000000
+    python benchmark_memory_store.py --concurrency --sizes 100000 --threads 1 2 4 8
+"""
+
+import argparse
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Dict, List
+
+import numpy as np
+
+from memory_store import (IntegratedMemorySystem, IVFIndex, TemporalKnowledgeGraph,
+                          VectorStore)
+
+
+def build_store(size: int, dimension: int, entities: int = 1000,
+                seed: int = 0) -> VectorStore:
+    """Fill a store with random embeddings without re-embedding."""
+    rng = np.random.default_rng(seed)
+    store = VectorStore(dimension=dimension, initial_capacity=size)
+    batch = 100_000
+    for start in range(0, size, batch):
+        count = min(batch, size - start)
+        store._append_rows(rng.standard_normal((count, dimension), dtype=np.float32))
+        for i in range(start, start + count):
+            metadata = {"text": f"doc-{i}", "entity": f"entity-{i % entities}",
+                        "session_id": "bench"}
+            store.metadata.append(metadata)
+            store._index_metadata(i, metadata)
+    return store
+
+
+def build_clustered_store(size: int, dimension: int, index: IVFIndex,
+                          clusters: int = 2000, seed: int = 0):
+    """Fill an indexed store with Gaussian clusters, returning the store and centres."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dimension), dtype=np.float32)
+    store = VectorStore(dimension=dimension, initial_capacity=size, index=index)
+    batch = 100_000
+    for start in range(0, size, batch):
+        count = min(batch, size - start)
+        noise = 0.5 * rng.standard_normal((count, dimension), dtype=np.float32)
+        store._append_rows(centres[rng.integers(0, clusters, count)] + noise)
+        store.metadata.extend({"text": f"doc-{i}"} for i in range(start, start + count))
+    return store, centres
+
+
+def loop_search(store: VectorStore, query_embedding: np.ndarray,
+                limit: int) -> List[int]:
+    """Reference implementation: per-row cosine loop plus full sort."""
+    scores = []
+    for i, vec in enumerate(store.vectors):
+        score = np.dot(query_embedding, vec) / (
+            np.linalg.norm(query_embedding) * np.linalg.norm(vec) + 1e-8
+        )
+        scores.append((i, score))
+    scores.sort(key=lambda x: x[1], reverse=True)
+    return [i for i, score in scores[:limit] if score > 0]
+
+
+def matrix_search(store: VectorStore, query_embedding: np.ndarray,
+                  limit: int) -> List[int]:
+    """Vectorized path used by VectorStore.search."""
+    scores = store._cosine_scores(query_embedding)
+    return [int(i) for i in store._top_k(scores, limit) if scores[i] > 0]
+
+
+def ann_search(store: VectorStore, query_embedding: np.ndarray, limit: int,
+               nprobe: int) -> List[int]:
+    """IVF path used by VectorStore.search when an index is trained."""
+    query = query_embedding / (np.linalg.norm(query_embedding) + 1e-8)
+    rows = store.index.candidates(query, nprobe)
+    scores = store._cosine_scores(query_embedding, rows)
+    return [int(rows[j]) for j in store._top_k(scores, limit) if scores[j] > 0]
+
+
+def time_queries(fn, store: VectorStore, queries: np.ndarray,
+                 limit: int) -> float:
+    """Mean latency of ``fn`` over the queries, in milliseconds."""
+    start = time.perf_counter()
+    for query in queries:
+        fn(store, query, limit)
+    return (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def time_filtered(store: VectorStore, queries: int, limit: int,
+                  entities: int) -> float:
+    """Mean latency of entity + session filtered searches, in milliseconds."""
+    start = time.perf_counter()
+    for q in range(queries):
+        store.search(f"query-{q}", limit=limit,
+                     filters={"session_id": "bench", "entity": f"entity-{q % entities}"})
+    return (time.perf_counter() - start) * 1000 / queries
+
+
+def run(sizes: List[int], dimension: int, queries: int, limit: int,
+        loop_max: int, entities: int = 1000) -> List[Dict]:
+    rng = np.random.default_rng(1)
+    query_set = rng.standard_normal((queries, dimension), dtype=np.float32)
+    rows = []
+
+    for size in sizes:
+        store = build_store(size, dimension, entities)
+        row = {
+            "rows": size,
+            "matrix_ms": time_queries(matrix_search, store, query_set, limit),
+            "filtered_ms": time_filtered(store, queries, limit, entities),
+            "loop_ms": None,
+            "same_order": None,
+        }
+
+        if size <= loop_max:
+            row["loop_ms"] = time_queries(loop_search, store, query_set[:3], limit)
+            row["same_order"] = all(
+                loop_search(store, q, limit) == matrix_search(store, q, limit)
+                for q in query_set[:3]
+            )
+
+        rows.append(row)
+        print(_format_row(row), flush=True)
+
+    return rows
+
+
+def run_ann(size: int, dimension: int, queries: int, limit: int, nlist: int,
+            nprobes: List[int]) -> List[Dict]:
+    start = time.perf_counter()
+    store, centres = build_clustered_store(size, dimension, IVFIndex(nlist=nlist))
+    print(f"built {size:,} rows with nlist={nlist} in "
+          f"{time.perf_counter() - start:.1f}s", flush=True)
+
+    rng = np.random.default_rng(1)
+    query_set = centres[rng.integers(0, len(centres), queries)] + \
+        0.5 * rng.standard_normal((queries, dimension), dtype=np.float32)
+    exact = [set(matrix_search(store, q, limit)) for q in query_set]
+    exact_ms = time_queries(matrix_search, store, query_set, limit)
+    print(f"{'nprobe':>8}  {'recall':>8}  {'ms':>8}  {'speedup':>8}")
+    print(f"{'exact':>8}  {1.0:8.3f}  {exact_ms:8.2f}  {1.0:8.1f}")
+
+    rows = []
+    for nprobe in nprobes:
+        found = [set(ann_search(store, q, limit, nprobe)) for q in query_set]
+        recall = np.mean([len(f & e) / max(len(e), 1) for f, e in zip(found, exact)])
+        begin = time.perf_counter()
+        for q in query_set:
+            ann_search(store, q, limit, nprobe)
+        ms = (time.perf_counter() - begin) * 1000 / queries
+        rows.append({"nprobe": nprobe, "recall": float(recall), "ms": ms})
+        print(f"{nprobe:>8}  {recall:8.3f}  {ms:8.2f}  {exact_ms / ms:8.1f}", flush=True)
+    return rows
+
+
+def run_cold_start(size: int, dimension: int, queries: int, limit: int) -> Dict:
+    store = build_store(size, dimension)
+    with tempfile.TemporaryDirectory() as path:
+        start = time.perf_counter()
+        store.save(path)
+        save_s = time.perf_counter() - start
+        del store
+
+        start = time.perf_counter()
+        loaded = VectorStore.load(path)
+        load_s = time.perf_counter() - start
+        del loaded
+
+        # Measured on a second load: tracing slows allocation down
+        tracemalloc.start()
+        loaded = VectorStore.load(path)
+        heap_mb = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+
+        rng = np.random.default_rng(1)
+        query_set = rng.standard_normal((queries, dimension), dtype=np.float32)
+        first_ms = time_queries(matrix_search, loaded, query_set[:1], limit)
+        del loaded
+
+    vectors_mb = size * dimension * 4 / 2**20
+    print(f"{size:>10,}  {vectors_mb:10.0f}  {save_s:8.2f}  {load_s:8.2f}  "
+          f"{heap_mb:8.0f}  {first_ms:10.2f}", flush=True)
+    return {"rows": size, "save_s": save_s, "load_s": load_s,
+            "heap_mb": heap_mb, "first_query_ms": first_ms}
+
+
+EPOCH = datetime(2015, 1, 1)
+
+
+def build_graph(edges: int, nodes: int, seed: int = 0) -> TemporalKnowledgeGraph:
+    """Random graph with a few relationship types, node labels and
+    validity windows of up to 30 days spread over ten years."""
+    rng = np.random.default_rng(seed)
+    graph = TemporalKnowledgeGraph()
+    node_ids = [graph.create_node(f"Label{i % 5}", {"n": i}) for i in range(nodes)]
+    sources = rng.integers(0, nodes, edges).tolist()
+    targets = rng.integers(0, nodes, edges).tolist()
+    starts = rng.integers(0, 3650, edges).tolist()
+    lengths = rng.integers(1, 30, edges).tolist()
+    for i, (source, target) in enumerate(zip(sources, targets)):
+        valid_from = EPOCH + timedelta(days=starts[i])
+        graph.create_temporal_relationship(
+            node_ids[source], f"REL{i % 8}", node_ids[target],
+            valid_from, valid_from + timedelta(days=lengths[i])
+        )
+    return graph
+
+
+def check_inverted_validity():
+    """An inverted edge never matches; a zero-length one meets ranges only."""
+    graph = TemporalKnowledgeGraph()
+    a, b = graph.create_node("Person", {}), graph.create_node("Person", {})
+    graph.create_temporal_relationship(a, "KNOWS", b, datetime(2024, 5, 1), datetime(2024, 1, 1))
+    point = graph.create_temporal_relationship(a, "KNOWS", b, datetime(2024, 1, 1), datetime(2024, 1, 1))
+    assert graph.query_at_time({"type": "KNOWS"}, datetime(2024, 3, 1)) == []
+    assert graph.query_at_time({"type": "KNOWS"}, datetime(2024, 1, 1)) == []
+    found = graph.query_time_range({"type": "KNOWS"}, datetime(2023, 1, 1), datetime(2025, 1, 1))
+    assert [result["edge"]["id"] for result in found] == [point]
+    assert graph.query_time_range({"type": "KNOWS"}, datetime(2024, 2, 1), datetime(2025, 1, 1)) == []
+    assert list(graph.iter_snapshots()) == []
+
+
+def check_graph_consolidation():
+    """Consolidation drops repeated relationships and those of expired facts."""
+    system = IntegratedMemorySystem()
+    for i in range(20):
+        system.store_fact(f"alice knows bob {i}", "alice",
+                          relationships=[{"type": "KNOWS", "target": "bob"}])
+    system.store_fact("alice worked at acme", "alice",
+                      relationships=[{"type": "WORKS_AT", "target": "acme"}],
+                      valid_until=datetime.now() - timedelta(days=1))
+    system.consolidate(budget_ms=1000)
+    graph = system.graph
+    assert [rel["edge"]["type"] for rel in graph.get_relationships("alice")] == ["KNOWS"]
+    assert len(graph.query({"type": "KNOWS"})) == 1
+    assert graph.query({"type": "WORKS_AT"}) == []
+    assert sum(len(ids) for ids in graph.edge_index.values()) <= 2
+
+
+def run_graph(edges: int, nodes: int, lookups: int) -> Dict:
+    check_inverted_validity()
+    check_graph_consolidation()
+    start = time.perf_counter()
+    graph = build_graph(edges, nodes)
+    print(f"built {nodes:,} nodes / {edges:,} edges in "
+          f"{time.perf_counter() - start:.1f}s", flush=True)
+
+    graph.create_property_index("n")
+    rng = np.random.default_rng(1)
+    node_ids = list(graph.nodes)
+    picks = [node_ids[i] for i in rng.integers(0, len(node_ids), lookups)]
+
+    def mean_ms(fn) -> float:
+        fn(picks[0], picks[-1])  # warm up lazily built indexes
+        begin = time.perf_counter()
+        for i, node_id in enumerate(picks):
+            fn(node_id, picks[-1 - i])
+        return (time.perf_counter() - begin) * 1000 / len(picks)
+
+    timings = {
+        "get_relationships": mean_ms(lambda a, b: graph.get_relationships(a)),
+        "get_relationships_many": mean_ms(
+            lambda a, b: graph.get_relationships_many([a, b] * 5, limit=20, depth=2)),
+        "neighborhood(2 hops)": mean_ms(lambda a, b: graph.neighborhood(a, 2, "outgoing")),
+        "bfs(REL0, 3 hops)": mean_ms(
+            lambda a, b: list(graph.bfs(a, 3, rel_types=["REL0"]))),
+        "shortest_path": mean_ms(
+            lambda a, b: graph.shortest_path(a, b, max_depth=4)),
+        "match(2 hops, first 10)": mean_ms(
+            lambda a, b: list(islice(graph.match({
+                "nodes": [{"where": {"n": graph.nodes[a]["properties"]["n"]}}, {},
+                          {"label": "Label1"}],
+                "edges": [{"type": "REL0"}, {"type": "REL1", "direction": "both"}],
+            }), 10))),
+        "query_at_time(REL0)": mean_ms(
+            lambda a, b: graph.query_at_time(
+                {"type": "REL0"}, EPOCH + timedelta(days=int(a, 16) % 3650))),
+        "query_time_range(7d)": mean_ms(
+            lambda a, b: graph.query_time_range(
+                {"type": "REL0"}, EPOCH + timedelta(days=int(b, 16) % 3650),
+                EPOCH + timedelta(days=int(b, 16) % 3650 + 7))),
+    }
+    for name, ms in timings.items():
+        print(f"{name:>24}  {ms:10.3f} ms", flush=True)
+    return timings
+
+
+def run_concurrency(size: int, dimension: int, entities: int, limit: int,
+                    threads: List[int], write_ratio: float, duration: float) -> List[Dict]:
+    """Throughput of retrieve_memories/store_fact as the thread count grows."""
+    system = IntegratedMemorySystem(concurrent=True)
+    system.vector_store = VectorStore(dimension=dimension, initial_capacity=size)
+    system.vector_store.add_many(
+        [f"fact {i} about entity{i % entities}" for i in range(size)],
+        [{"entity": f"entity{i % entities}", "session_id": ""} for i in range(size)],
+    )
+    system.retrieve_memories("warm up", limit=limit)
+
+    rows = []
+    for count in threads:
+        ops = [0] * count
+        writes = [0] * count
+        stop = threading.Event()
+
+        def worker(slot: int):
+            rng = np.random.default_rng(slot)
+            while not stop.is_set():
+                n = int(rng.integers(0, 1 << 30))
+                if rng.random() < write_ratio:
+                    system.store_fact(f"new fact {n}", f"entity{n % entities}",
+                                      relationships=[{"type": "RELATED_TO",
+                                                      "target": f"entity{(n + 1) % entities}"}])
+                    writes[slot] += 1
+                else:
+                    system.retrieve_memories(f"query {n} entity{n % entities}", limit=limit)
+                ops[slot] += 1
+
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+        begin = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        time.sleep(duration)
+        stop.set()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - begin
+
+        row = {"threads": count, "ops_per_s": sum(ops) / elapsed,
+               "writes": sum(writes), "rows": len(system.vector_store)}
+        print(f"{count:>8}  {row['ops_per_s']:10.1f}  {row['writes']:>8,}  "
+              f"{row['rows']:>10,}", flush=True)
+        rows.append(row)
+    return rows
+
+
+def _format_row(row: Dict) -> str:
+    loop = f"{row['loop_ms']:10.2f}" if row["loop_ms"] is not None else f"{'skipped':>10}"
+    same = "-" if row["same_order"] is None else str(row["same_order"])
+    return (f"{row['rows']:>10,}  {row['matrix_ms']:10.2f}  "
+            f"{row['filtered_ms']:11.2f}  {loop}  {same:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark VectorStore search latency")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dimension", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--entities", type=int, default=1000,
+                        help="Distinct entities used by the filtered search")
+    parser.add_argument("--ann", action="store_true",
+                        help="Run the IVF recall-versus-latency sweep instead")
+    parser.add_argument("--cold-start", action="store_true",
+                        help="Time save/load of each store instead")
+    parser.add_argument("--graph", action="store_true",
+                        help="Time PropertyGraph lookups and traversals instead")
+    parser.add_argument("--concurrency", action="store_true",
+                        help="Measure throughput against thread count instead")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--write-ratio", type=float, default=0.1,
+                        help="Fraction of store_fact calls in the concurrent load")
+    parser.add_argument("--duration", type=float, default=5.0,
+                        help="Seconds to run each thread count")
+    parser.add_argument("--edges", type=int, default=1_000_000)
+    parser.add_argument("--nodes", type=int, default=100_000)
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--loop-max", type=int, default=100_000,
+                        help="Largest store size to also time with the per-row loop")
+    args = parser.parse_args()
+
+    if args.ann:
+        for size in args.sizes:
+            run_ann(size, args.dimension, args.queries, args.limit, args.nlist,
+                    args.nprobe)
+        return
+
+    if args.graph:
+        run_graph(args.edges, args.nodes, args.queries)
+        return
+
+    if args.concurrency:
+        print(f"{'threads':>8}  {'ops/s':>10}  {'writes':>8}  {'rows':>10}")
+        for size in args.sizes:
+            run_concurrency(size, args.dimension, args.entities, args.limit,
+                            args.threads, args.write_ratio, args.duration)
+        return
+
+    if args.cold_start:
+        print(f"{'rows':>10}  {'vectors MB':>10}  {'save s':>8}  {'load s':>8}  "
+              f"{'heap MB':>8}  {'1st query ms':>10}")
+        for size in args.sizes:
+            run_cold_start(size, args.dimension, args.queries, args.limit)
+        return
+
+    print(f"{'rows':>10}  {'matrix ms':>10}  {'filtered ms':>11}  "
+          f"{'loop ms':>10}  {'same order':>10}")
+    run(args.sizes, args.dimension, args.queries, args.limit, args.loop_max,
+        args.entities)
+
+
+if __name__ == "__main__":
+    main()